@@ -5,17 +5,51 @@ import json
 
 # from ixhardware import get_chassis_hardware, parse_dmi
 
+from .dialog import use_tui
 from .installer import Installer
 from .installer_menu import InstallerMenu
+from .tui import start_tui
+
+from .logger import enable_json_log, logger
+
+
+async def run_menu(installer, ui):
+    if ui == "curses":
+        tui = start_tui()
+        if tui is None:
+            # 失败时（非终端、不支持的 TERM）回退到 dialog
+            ui = "dialog"
+        use_tui(tui)
+
+    logger.info(f"Using {ui} interface")
+    await InstallerMenu(installer).run()
 
-from .logger import logger
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--doc", action="store_true")
+    parser.add_argument("--ui", choices=["curses", "dialog"], default="curses",
+                        help="curses: in-process interface, dialog: run dialog(1) for every screen")
+    parser.add_argument("--verify-image", choices=["before", "overlap", "off"], default="before",
+                        help="Check the installation image before preparing the disks, while preparing them, or never")
+    parser.add_argument("--install-engine", choices=["files", "golden"], default="files",
+                        help="files: truenas_install copies the system, golden: receive the zfs send stream shipped "
+                             "on the media")
+    parser.add_argument("--json-log", action="store_true",
+                        help="Also write the log as JSON lines to /var/log/onenas-installer.jsonl")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print the import time of every module loaded before the main menu and exit")
 
     args = parser.parse_args()
 
+    if args.profile_startup:
+        from .startup import print_import_profile
+        print_import_profile()
+        return
+
+    if args.json_log:
+        enable_json_log()
+
     vendor  = "OneNAS"
     version = None
     try:
@@ -32,7 +66,7 @@ def main():
     # dmi = parse_dmi()
     # tn_model = get_chassis_hardware(dmi)
 
-    installer = Installer(version, None, vendor, None)
+    installer = Installer(version, None, vendor, None, args.verify_image, args.install_engine)
 
     if args.doc:
         print(
@@ -42,7 +76,7 @@ def main():
     else:
         logger.info("Starting installer menu")
         loop = asyncio.get_event_loop()
-        loop.create_task(InstallerMenu(installer).run())
+        loop.create_task(run_menu(installer, args.ui))
         loop.run_forever()
 
 
@@ -0,0 +1,208 @@
+"""
+Installer phase benchmark.
+
+Runs `list_disks()`, `get_partitions()` and the full `install()` against fake disks: block devices are
+regular files, sysfs is a temporary directory and every external tool (`sgdisk`, `wipefs`, `zpool`, `lsblk`,
+`udevadm`, ...) is replaced with a shim that sleeps for `--latency` seconds. Usage:
+
+    python3 -m truenas_installer.benchmark --disks 1 2 4 16 --latency 0.05 --output bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+from dataclasses import dataclass
+import json
+import os
+import platform
+import tempfile
+import textwrap
+import time
+
+from . import disks, image, tracing, utils, verify
+from .disks import Disk, ZFSMember, list_disks
+from .install import install
+from .utils import get_partitions
+
+__all__ = ["run_benchmark"]
+
+DISK_SIZE = 16 * 1024 ** 3
+IMAGE_SIZE = 64 * 1024 ** 2
+DEFAULT_DISK_COUNTS = [1, 2, 4, 16]
+
+SHIMS = {
+    "sgdisk": """\
+        for dev; do :; done
+        name=$(basename "$dev")
+        for arg; do
+            case "$arg" in
+                -Z) rm -rf "$BENCH_SYS_BLOCK/$name/$name"[0-9]* ;;
+                -n*) n=${arg#-n}; n=${n%%:*}
+                     mkdir -p "$BENCH_SYS_BLOCK/$name/$name$n"
+                     echo "$n" > "$BENCH_SYS_BLOCK/$name/$name$n/partition"
+                     echo $((n * 4096)) > "$BENCH_SYS_BLOCK/$name/$name$n/start"
+                     echo 4096 > "$BENCH_SYS_BLOCK/$name/$name$n/size" ;;
+            esac
+        done
+    """,
+    "sfdisk": """\
+        name=$(basename "$1")
+        n=0
+        while read -r line; do
+            case "$line" in
+                start=*|size=*) n=$((n + 1))
+                                mkdir -p "$BENCH_SYS_BLOCK/$name/$name$n"
+                                echo "$n" > "$BENCH_SYS_BLOCK/$name/$name$n/partition"
+                                echo $((n * 4096)) > "$BENCH_SYS_BLOCK/$name/$name$n/start"
+                                echo 4096 > "$BENCH_SYS_BLOCK/$name/$name$n/size" ;;
+            esac
+        done
+    """,
+    "lsblk": """\
+        cat "$BENCH_ROOT/lsblk.json"
+    """,
+    "losetup": """\
+        for image; do :; done
+        echo "$image"
+    """,
+    "python3": """\
+        cat > /dev/null
+        for progress in 0.25 0.5 0.75 1; do
+            echo "{\\"progress\\": $progress, \\"message\\": \\"Installing\\"}"
+        done
+    """,
+}
+NOOP_SHIMS = ["mount", "udevadm", "umount", "wipefs", "zfs", "zgenhostid", "zpool"]
+
+
+@dataclass
+class BenchmarkDisk(Disk):
+    root: str = "/nonexistent"
+
+    @property
+    def device(self):
+        return os.path.join(self.root, self.name)
+
+
+def write_shims(bin_dir):
+    os.makedirs(bin_dir)
+    for name in NOOP_SHIMS + list(SHIMS):
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write("#!/bin/sh\nsleep \"$BENCH_LATENCY\"\n" + textwrap.dedent(SHIMS.get(name, "")))
+        os.chmod(path, 0o755)
+
+
+def create_disks(root, sys_block, count):
+    result = []
+    lsblk = []
+    for i in range(count):
+        name = f"benchdisk{i}"
+        with open(os.path.join(root, name), "w") as f:
+            f.truncate(DISK_SIZE)
+
+        os.makedirs(os.path.join(sys_block, name, "device"))
+        for attr, value in [("dev", f"240:{i * 16}"), ("size", DISK_SIZE // 512), ("removable", 0),
+                            ("device/model", "Benchmark Disk")]:
+            with open(os.path.join(sys_block, name, attr), "w") as f:
+                f.write(f"{value}\n")
+
+        result.append(BenchmarkDisk(name, DISK_SIZE, "Benchmark Disk", "", [ZFSMember(f"{name}3", "one-pool")],
+                                    False, root))
+        lsblk.append({"name": name, "fstype": None, "label": None, "rm": False, "size": DISK_SIZE,
+                      "model": "Benchmark Disk"})
+
+    with open(os.path.join(root, "lsblk.json"), "w") as f:
+        json.dump({"blockdevices": lsblk}, f)
+
+    return result
+
+
+@contextlib.contextmanager
+def benchmark_environment(root, latency):
+    sys_block = os.path.join(root, "sys", "block")
+    os.makedirs(sys_block)
+    write_shims(os.path.join(root, "bin"))
+
+    saved_env = dict(os.environ)
+    saved = utils.SYS_BLOCK, disks.UDEV_DATA, tracing.TRACE_FILE, image.IMAGE_PATH
+    os.environ.update(
+        PATH=os.path.join(root, "bin") + os.pathsep + os.environ.get("PATH", ""),
+        BENCH_ROOT=root,
+        BENCH_SYS_BLOCK=sys_block,
+        BENCH_LATENCY=str(latency),
+    )
+    utils.SYS_BLOCK = sys_block
+    disks.UDEV_DATA = os.path.join(root, "udev")
+    tracing.TRACE_FILE = os.path.join(root, "trace.json")
+    image.IMAGE_PATH = os.path.join(root, "TrueNAS-SCALE.update")
+    with open(image.IMAGE_PATH, "wb") as f:
+        f.write(os.urandom(IMAGE_SIZE))
+    with open(verify.manifest_path(image.IMAGE_PATH), "w") as f:
+        json.dump(verify.build_manifest(image.IMAGE_PATH), f)
+    try:
+        yield sys_block
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_env)
+        utils.SYS_BLOCK, disks.UDEV_DATA, tracing.TRACE_FILE, image.IMAGE_PATH = saved
+
+
+async def timed(coro):
+    start = time.monotonic()
+    await coro
+    return time.monotonic() - start
+
+
+async def benchmark_disk_count(count, latency):
+    with tempfile.TemporaryDirectory() as root, benchmark_environment(root, latency) as sys_block:
+        bench_disks = create_disks(root, sys_block, count)
+        phases = {
+            "list_disks_sysfs": await timed(list_disks("sysfs")),
+            "list_disks_lsblk": await timed(list_disks("lsblk")),
+            "install": await timed(install(bench_disks, [], 50, 8 * 1024 ** 3, lambda progress, message: None)),
+        }
+
+        for event in tracing.tracer.events:
+            if event.category == "span" and event.name != "install":
+                phases[f"install.{event.name}"] = phases.get(f"install.{event.name}", 0) + event.duration
+
+        phases["get_partitions"] = await timed(
+            asyncio.gather(*[get_partitions(disk.device, [1, 2, 3], tries=30) for disk in bench_disks])
+        )
+
+    return {"disks": count, "phases": {k: round(v, 6) for k, v in phases.items()}}
+
+
+async def run_benchmark(disk_counts=None, latency=0.01):
+    results = []
+    for count in disk_counts or DEFAULT_DISK_COUNTS:
+        results.append(await benchmark_disk_count(count, latency))
+
+    return {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "latency": latency,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark installer phases against fake disks and tools")
+    parser.add_argument("--disks", type=int, nargs="+", default=DEFAULT_DISK_COUNTS)
+    parser.add_argument("--latency", type=float, default=0.01, help="Latency of each fake tool, in seconds")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args.disks, args.latency))
+    for result in report["results"]:
+        print(f"{result['disks']} disk(s):")
+        for phase, elapsed in result["phases"].items():
+            print(f"  {phase:<35} {elapsed:>10.3f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
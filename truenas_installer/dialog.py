@@ -3,12 +3,48 @@ import os
 import textwrap
 
 import asyncio
+import contextlib
 import subprocess
 import tempfile
+import time
 
 from .i18n import _
+from .tracing import tracer
 
-__all__ = ["dialog", "dialog_checklist", "dialog_menu", "dialog_msgbox", "dialog_yesno", "dialog_password", "dialog_inputbox", "dialog_radiolist"]
+__all__ = ["dialog", "dialog_checklist", "dialog_menu", "dialog_msgbox", "dialog_yesno", "dialog_password",
+           "dialog_inputbox", "dialog_radiolist", "close_ui", "suspended_ui", "use_tui"]
+
+# 启动时选择的进程内界面（`tui.CursesTUI`），为 None 时每个界面都启动一个 dialog 进程
+_tui = None
+
+
+def use_tui(tui):
+    global _tui
+    _tui = tui
+
+
+@contextlib.contextmanager
+def suspended_ui():
+    """
+    Give the terminal back to plain output (install progress, child processes) for the duration of the block.
+    """
+    if _tui is None:
+        yield
+    else:
+        with _tui.suspended():
+            yield
+
+
+def close_ui():
+    global _tui
+    if _tui is not None:
+        _tui.close()
+        _tui = None
+
+
+async def _tui_screen(name, coro):
+    with tracer.span(name, category="dialog"):
+        return await coro
 
 
 async def dialog(args, check=False):
@@ -18,8 +54,10 @@ async def dialog(args, check=False):
     cancel_label = _("cancel")
     args = ["dialog", "--ok-label", ok_label, "--cancel-label", cancel_label] + args
 
+    start = time.monotonic()
     process = await asyncio.create_subprocess_exec(*args, stderr=subprocess.PIPE)
     _, stderr = await process.communicate()
+    tracer.record_command(args, start, time.monotonic(), process.returncode, 0, len(stderr), category="dialog")
 
     stderr = stderr.decode("utf-8", "ignore")
 
@@ -30,7 +68,20 @@ async def dialog(args, check=False):
     return subprocess.CompletedProcess(args, process.returncode, stderr=stderr)
 
 
+def _tagged(items):
+    """与 dialog(1) 一样在每一项前显示其标识（例如磁盘名）"""
+    width = max(map(len, items), default=0)
+    return [f"{key:<{width}}  {label}" for key, label in items.items()]
+
+
 async def dialog_checklist(title, text, items):
+    if _tui is not None:
+        keys = list(items.keys())
+        selected = await _tui_screen(
+            "checklist", _tui.checklist(title, text, [(label, False) for label in _tagged(items)]),
+        )
+        return None if selected is None else [keys[i] for i in selected]
+
     result = await dialog(
         [
             "--clear",
@@ -53,6 +104,14 @@ async def dialog_checklist(title, text, items):
 
 
 async def dialog_menu(title, items):
+    handlers = list(items.values())
+    if _tui is not None:
+        selected_index = await _tui_screen("menu", _tui.menu(title, list(items.keys())))
+        if selected_index is None:
+            return None
+
+        return await handlers[selected_index]()
+
     result = await dialog(
         [
             "--clear",
@@ -70,15 +129,17 @@ async def dialog_menu(title, items):
 
     if result.returncode == 0:
         selected_index = int(result.stderr) - 1
-        handlers = list(items.values())
         return await handlers[selected_index]()
     else:
         return None
 
 
 async def dialog_msgbox(title, text):
-    # 计算合适的窗口高度
-    lines = text.rstrip().splitlines()
+    if _tui is not None:
+        return await _tui_screen("msgbox", _tui.msgbox(title, text))
+
+    # 计算合适的窗口高度（翻译文本使用字面的 "\\n" 换行，dialog 显示时才展开）
+    lines = text.replace("\\n", "\n").rstrip().splitlines()
     height = min(20, max(8, 4 + len(lines)))
     # 计算合适的窗口宽度（考虑中文字符）
     max_line_len = max(len(line) for line in lines) if lines else 0
@@ -104,7 +165,23 @@ async def dialog_password(title, password_label=None, confirm_label=None):
     # 使用翻译的默认值
     password_label = password_label or _("password")
     confirm_label = confirm_label or _("confirm_password")
-    
+
+    if _tui is not None:
+        while True:
+            passwords = await _tui_screen(
+                "passwordform",
+                _tui.form(title, "", [(password_label + ":", ""), (confirm_label + ":", "")], secret=True),
+            )
+            if passwords is None:
+                return None
+
+            if not passwords[0].strip() or not passwords[1].strip():
+                await dialog_msgbox(_("error"), _("empty_password"))
+            elif passwords[0].strip() != passwords[1].strip():
+                await dialog_msgbox(_("error"), _("password_mismatch"))
+            else:
+                return passwords[0].strip()
+
     with tempfile.NamedTemporaryFile("w") as dialogrc:
         dialogrc.write(textwrap.dedent("""\
             bindkey formfield TAB FORM_NEXT
@@ -153,6 +230,9 @@ async def dialog_password(title, password_label=None, confirm_label=None):
 
 
 async def dialog_yesno(title, text) -> bool:
+    if _tui is not None:
+        return await _tui_screen("yesno", _tui.yesno(title, text))
+
     result = await dialog([
         "--clear",
         "--title", title,
@@ -174,6 +254,10 @@ async def dialog_inputbox(title, text, init=""):
     Returns:
         用户输入的字符串，如果取消则返回 None
     """
+    if _tui is not None:
+        value = await _tui_screen("inputbox", _tui.inputbox(title, text, init))
+        return None if value is None else value.strip()
+
     result = await dialog([
         "--clear",
         "--title", title,
@@ -199,6 +283,13 @@ async def dialog_radiolist(title, text, items):
     Returns:
         选中的键，如果取消则返回 None
     """
+    if _tui is not None:
+        keys = list(items.keys())
+        labels = _tagged({key: label for key, (label, default) in items.items()})
+        defaults = [default for label, default in items.values()]
+        selected = await _tui_screen("radiolist", _tui.radiolist(title, text, list(zip(labels, defaults))))
+        return None if selected is None else keys[selected]
+
     args = [
         "--clear",
         "--title", title,
@@ -1,13 +1,19 @@
 from dataclasses import dataclass
 import json
+import os
 import re
 
 from .logger import logger
+from .mounts import MountIndex
+from . import utils
 from .utils import run
 
 __all__ = ["list_disks"]
 
 MIN_DISK_SIZE = 2_000_000_000
+# Block devices that are never installation targets
+IGNORED_DISK_PREFIXES = ("dm", "loop", "md", "sr", "st")
+UDEV_DATA = "/run/udev/data"
 
 
 @dataclass
@@ -30,56 +36,31 @@ class Disk:
         return f"/dev/{self.name}"
 
 
-async def list_disks():
-    # need to settle so that lsblk output is stable
+async def list_disks(backend: str = "sysfs"):
+    """
+    `backend`: "sysfs" to read block devices straight from sysfs and the udev
+        database (falls back to lsblk if that fails) or "lsblk".
+    """
+    if backend not in ("sysfs", "lsblk"):
+        raise ValueError(f"Invalid disk enumeration backend: {backend!r}")
+
+    # need to settle so that lsblk output (and the udev database) is stable
     logger.debug("Running udevadm settle...")
     await run(["udevadm", "settle"])
 
-    with open("/etc/mtab") as f:
-        mtab = f.read()
+    if backend == "sysfs":
+        try:
+            blockdevices = read_sysfs_blockdevices()
+        except OSError as e:
+            logger.warning(f"Unable to enumerate block devices from sysfs, falling back to lsblk: {e}")
+            backend = "lsblk"
 
-    disks = []
-    logger.debug("Running lsblk to list block devices...")
-    for disk in json.loads(
-        (await run(["lsblk", "-b", "-fJ", "-o", "name,fstype,label,rm,size,model"])).stdout
-    )["blockdevices"]:
-        if disk["name"].startswith(("dm", "loop", "md", "sr", "st")):
-            continue
-        elif disk["size"] < MIN_DISK_SIZE:
-            continue
-        elif re.search(fr"/dev/{disk['name']}p?[0-9]+", mtab):
-            continue
+    if backend == "lsblk":
+        logger.debug("Running lsblk to list block devices...")
+        blockdevices = await read_lsblk_blockdevices()
 
-        zfs_members = []
-        if disk["fstype"] is not None:
-            label = disk["fstype"]
-        else:
-            children = disk.get("children", [])
-            if zfs_members := [ZFSMember(child["name"], child["label"])
-                               for child in children
-                               if child["fstype"] == "zfs_member"]:
-                label = ", ".join([f"zfs-\"{zfs_member.pool}\"" for zfs_member in zfs_members])
-            else:
-                for fstype in ["ext4", "xfs"]:
-                    if labels := [child for child in children if child["fstype"] == fstype]:
-                        label = f"{fstype}-{labels[0]['label']}"
-                        break
-                else:
-                    if labels := [child for child in children if child["fstype"] is not None]:
-                        label = "-".join(filter(None, [labels[0]["fstype"], labels[0]["label"]]))
-                    else:
-                        label = ""
-
-        disks.append(
-            Disk(
-                disk["name"],
-                disk["size"],
-                disk["model"] or "Unknown Model",
-                label,
-                zfs_members,
-                disk["rm"]
-            )
-        )
+    mount_index = MountIndex.build()
+    disks = list(filter(None, [disk_from_blockdevice(disk, mount_index) for disk in blockdevices]))
 
     # we sort the disks by name because `nvme` comes before `sd*`
     # and our appliances have nvme boot drives so by putting nvme
@@ -88,3 +69,134 @@ async def list_disks():
     sorted_disks = sorted(disks, key=lambda x: x.name)
     logger.debug(f"Found {len(sorted_disks)} disk(s): {[d.name for d in sorted_disks]}")
     return sorted_disks
+
+
+async def read_lsblk_blockdevices():
+    return json.loads(
+        (await run(["lsblk", "-b", "-fJ", "-o", "name,fstype,label,rm,size,model"])).stdout
+    )["blockdevices"]
+
+
+def read_sysfs_blockdevices(sys_block: str | None = None, udev_data: str | None = None, names: list[str] | None = None):
+    """
+    Returns the same structure as `lsblk -b -fJ -o name,fstype,label,rm,size,model` (only whole disks and
+    their partitions), built from sysfs and the udev database without forking any process.
+
+    `names`: only read these block devices (missing ones are skipped).
+    """
+    sys_block = sys_block or utils.SYS_BLOCK
+    udev_data = udev_data or UDEV_DATA
+    blockdevices = []
+    for name in sorted(os.listdir(sys_block) if names is None else names):
+        path = os.path.join(sys_block, name)
+        try:
+            blockdevice = _read_sysfs_blockdevice(path, name, udev_data)
+            blockdevice["rm"] = _read_sysfs_attr(path, "removable") == "1"
+            model = _udev_property(blockdevice.pop("udev"), "ID_MODEL_ENC") or _read_sysfs_attr(path, "device/model")
+            # ATA/SCSI models are padded with spaces, lsblk strips them and collapses the repeated ones
+            blockdevice["model"] = " ".join((model or "").split()) or None
+
+            children = []
+            for partdir in os.scandir(path):
+                if partdir.is_dir() and os.path.exists(os.path.join(partdir.path, "partition")):
+                    child = _read_sysfs_blockdevice(partdir.path, partdir.name, udev_data)
+                    child["partition"] = int(_read_sysfs_attr(partdir.path, "partition"))
+                    children.append(child)
+        except FileNotFoundError:
+            # Device was removed while we were enumerating it
+            continue
+
+        if children:
+            blockdevice["children"] = []
+            for child in sorted(children, key=lambda x: x.pop("partition")):
+                child.pop("udev")
+                child.update(rm=blockdevice["rm"], model=None)
+                blockdevice["children"].append(child)
+
+        blockdevices.append(blockdevice)
+
+    return blockdevices
+
+
+def _read_sysfs_blockdevice(path, name, udev_data):
+    udev = _read_udev_data(udev_data, _read_sysfs_attr(path, "dev"))
+    return {
+        "name": name,
+        "fstype": _udev_property(udev, "ID_FS_TYPE"),
+        "label": _udev_property(udev, "ID_FS_LABEL_ENC"),
+        "size": int(_read_sysfs_attr(path, "size")) * 512,
+        "udev": udev,
+    }
+
+
+def _read_sysfs_attr(path, attr):
+    try:
+        with open(os.path.join(path, attr)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        if attr in ("dev", "size"):
+            raise
+
+        return None
+
+
+def _read_udev_data(udev_data, dev):
+    properties = {}
+    try:
+        with open(os.path.join(udev_data, f"b{dev}")) as f:
+            for line in f:
+                if line.startswith("E:") and "=" in line:
+                    key, value = line[2:].rstrip("\n").split("=", 1)
+                    properties[key] = value
+    except FileNotFoundError:
+        pass
+
+    return properties
+
+
+def _udev_property(properties, key):
+    # `*_ENC` properties have unsafe characters (including spaces) encoded as `\xNN`
+    if value := properties.get(key):
+        return re.sub(rb"\\x([0-9a-fA-F]{2})", lambda m: bytes([int(m[1], 16)]), value.encode()).decode(
+            "utf-8", "replace"
+        )
+
+    return None
+
+
+def disk_from_blockdevice(disk: dict, mount_index: MountIndex):
+    if disk["name"].startswith(IGNORED_DISK_PREFIXES):
+        return None
+    elif disk["size"] < MIN_DISK_SIZE:
+        return None
+    elif mount_index.is_mounted(disk["name"]):
+        return None
+
+    zfs_members = []
+    if disk["fstype"] is not None:
+        label = disk["fstype"]
+    else:
+        children = disk.get("children", [])
+        if zfs_members := [ZFSMember(child["name"], child["label"])
+                           for child in children
+                           if child["fstype"] == "zfs_member"]:
+            label = ", ".join([f"zfs-\"{zfs_member.pool}\"" for zfs_member in zfs_members])
+        else:
+            for fstype in ["ext4", "xfs"]:
+                if labels := [child for child in children if child["fstype"] == fstype]:
+                    label = f"{fstype}-{labels[0]['label']}"
+                    break
+            else:
+                if labels := [child for child in children if child["fstype"] is not None]:
+                    label = "-".join(filter(None, [labels[0]["fstype"], labels[0]["label"]]))
+                else:
+                    label = ""
+
+    return Disk(
+        disk["name"],
+        disk["size"],
+        disk["model"] or "Unknown Model",
+        label,
+        zfs_members,
+        disk["rm"]
+    )
@@ -0,0 +1,144 @@
+"""
+"golden" install engine: the boot dataset is received from a prebuilt `zfs send` stream shipped on the installation
+media instead of being copied file by file by `truenas_install`.
+"""
+import asyncio
+from dataclasses import dataclass
+import json
+import os
+import subprocess
+import time
+from typing import Callable
+
+from .i18n import _
+from .logger import logger
+from .tracing import tracer
+from .utils import OutputTail
+
+__all__ = ["GOLDEN_STREAM", "ReceiveResult", "golden_stream_path", "receive_golden_stream",
+           "supports_golden_dataset"]
+
+GOLDEN_STREAM = "/cdrom/TrueNAS-SCALE.zfs"
+# Declared by the `truenas_install` of the installation image, relative to the mounted image:
+# `{"capabilities": ["golden_dataset", ...]}`
+CAPABILITIES_FILE = "truenas_install/capabilities.json"
+GOLDEN_DATASET_CAPABILITY = "golden_dataset"
+# How often the position of `zfs receive` in the stream is polled
+POLL_INTERVAL = 0.5
+
+
+@dataclass
+class ReceiveResult:
+    dataset: str
+    size: int
+    # Seconds
+    elapsed: float
+
+    @property
+    def throughput(self):
+        return self.size / self.elapsed if self.elapsed > 0 else 0
+
+
+def golden_stream_path():
+    """
+    Returns `None` if the media does not ship a golden stream.
+    """
+    return GOLDEN_STREAM if os.path.exists(GOLDEN_STREAM) else None
+
+
+def supports_golden_dataset(image_path: str):
+    """
+    Whether the `truenas_install` of the image mounted on `image_path` can configure a boot dataset that has already
+    been received (the `golden_dataset` parameter). Versions that do not declare it would copy the system again or
+    fail on the existing dataset.
+    """
+    path = os.path.join(image_path, CAPABILITIES_FILE)
+    try:
+        with open(path) as f:
+            capabilities = json.load(f)["capabilities"]
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Invalid {path}: {e!r}")
+        return False
+
+    return GOLDEN_DATASET_CAPABILITY in capabilities
+
+
+async def receive_golden_stream(dataset: str, callback: Callable, stream: str | None = None, weight: float = 1.0):
+    """
+    `zfs receive` the stream into `dataset` (which must not exist). The stream file is `zfs receive`'s stdin, so the
+    data goes straight from the media to the pool in one sequential read; progress and throughput are computed from
+    the position of that stdin, read from `/proc/<pid>/fdinfo/0`.
+
+    `weight`: share of the whole installation progress that the stream accounts for.
+    """
+    stream = stream or GOLDEN_STREAM
+    size = os.path.getsize(stream)
+    args = ["zfs", "receive", "-u", "-o", "canmount=noauto", "-o", "mountpoint=/", dataset]
+    logger.debug(" ".join(args) + f" < {stream}")
+
+    with tracer.span("receive_stream", dataset=dataset, size=size), open(stream, "rb") as f:
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        start = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            *args, stdin=f, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        stderr = OutputTail()
+        stderr_task = asyncio.create_task(_read(process.stderr, stderr))
+        try:
+            reported = None
+            last = (start, 0)
+            while True:
+                try:
+                    await asyncio.wait_for(asyncio.shield(process.wait()), POLL_INTERVAL)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+
+                if (position := _stdin_position(process.pid)) is None:
+                    continue
+
+                now = time.monotonic()
+                throughput = (position - last[1]) / (now - last[0])
+                last = (now, position)
+                percent = position * 100 // size if size else 100
+                if percent != reported:
+                    reported = percent
+                    callback(weight * position / size if size else 0,
+                             _("receiving_system", percent=percent, throughput=f"{throughput / 1024 ** 2:.0f}"))
+
+            await stderr_task
+        finally:
+            # On error or cancellation, do not leave `zfs receive` running (and holding the pool)
+            stderr_task.cancel()
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        elapsed = time.monotonic() - start
+
+    tracer.record_command(args, start, start + elapsed, process.returncode, 0, stderr.total)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args, stderr=stderr.getvalue())
+
+    result = ReceiveResult(dataset, size, elapsed)
+    logger.info(f"Received {stream} into {dataset}: {size} bytes in {elapsed:.1f}s "
+                f"({result.throughput / 1024 ** 2:.1f} MiB/s)")
+    return result
+
+
+async def _read(reader, tail):
+    while chunk := await reader.read(65536):
+        tail.write(chunk)
+
+
+def _stdin_position(pid):
+    try:
+        with open(f"/proc/{pid}/fdinfo/0") as f:
+            for line in f:
+                if line.startswith("pos:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+
+    return None
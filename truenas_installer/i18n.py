@@ -3,11 +3,18 @@ Internationalization (i18n) module for OneNAS Installer
 支持多语言切换，目前支持英语和中文
 """
 
+import string
+import sys
 from typing import Dict, Callable
 
 # 当前语言设置
 _current_language = "en"
 
+# 参考语言：其它语言必须与它有相同的键和相同的占位符
+REFERENCE_LANGUAGE = "en"
+# `TRANSLATIONS` 中各语言名称所在的键
+LANGUAGE_NAME_KEYS = {"en": "lang_english", "zh": "lang_chinese"}
+
 # 翻译字典
 TRANSLATIONS: Dict[str, Dict[str, str]] = {
     "en": {
@@ -31,6 +38,7 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "no_drives": "No drives available",
         "install_to_drive": "Install {vendor} to a drive. If desired, select multiple drives to provide redundancy. {vendor} installation drive(s) are not available for use in storage pools. Use arrow keys to navigate options. Press spacebar to select.",
         "select_at_least_one_disk": "Select at least one disk to proceed with the installation.",
+        "disks_changed": "Disks were added or removed while the installation was being configured. Please select the destination media again.",
         "installation": "{vendor} Installation",
         "installation_error": "Installation Error",
         "installation_succeeded": "Installation Succeeded",
@@ -75,11 +83,23 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "percentage_range_error": "Percentage must be between 1 and 100.",
         "percentage_invalid_error": "Please enter a valid number.",
         "confirm_partition_size": "Confirm Partition Size",
+        "discard_title": "Discard Disks",
+        "discard_prompt": "{disks} support TRIM/discard. Discard all blocks before installing?\nThis speeds up writes on reused SSDs but takes longer to start.",
         "partition_size_preview": "Total capacity: {total_size}\n\nSystem partition: {percentage}% = {system_size}\nRemaining space: {remaining_size}\n\nSmallest disk: {min_disk_name} ({min_disk_size})\nSystem partition on smallest disk: {min_disk_system_size}\n\nIs this correct?",
         
         # 安装进度 (callback 消息)
+        "discarding_disk": "Discarding disk {disk}: {percent}%",
+        "staging_image": "Copying the installation image to memory: {percent}%",
+        "verifying_image": "Verifying the installation image: {percent}%",
+        "receiving_system": "Writing the system: {percent}% ({throughput} MiB/s)",
+        "fast_mirror_title": "Fast Mirror Installation",
+        "fast_mirror_prompt": "Install the system to {disk} first and mirror it to {disks} afterwards?\nThe system can be booted as soon as {disk} is installed, the other disks are synchronized (resilvered) in the background.",
+        "resilvering": "Resilvering the mirror disks: {percent}%",
+        "resilver_in_progress": "\\n\\nThe mirror disks {disks} are being resilvered, this continues after the reboot.",
+        "resilver_watch_hint": "Press Enter to return to the menu, resilvering continues in the background.",
         "wiping_disk": "Wiping disk {disk}",
         "formatting_disk": "Formatting disk {disk}",
+        "disk_prepared": "Disk {disk} is ready ({done}/{total})",
         "creating_boot_pool": "Creating boot pool",
         "warning_wipe_zfs_label": "Warning: unable to wipe ZFS label from {device}: {error}",
         "warning_wipe_partition_table": "Warning: unable to wipe partition table for {disk}: {error}",
@@ -113,6 +133,7 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "no_drives": "没有可用的驱动器",
         "install_to_drive": "安装 {vendor} 到驱动器。如需冗余，可选择多个驱动器。{vendor} 安装驱动器不能用于存储池。使用方向键导航，按空格键选择。",
         "select_at_least_one_disk": "请至少选择一个磁盘以继续安装。",
+        "disks_changed": "配置安装期间有磁盘被添加或移除。请重新选择目标设备。",
         "installation": "{vendor} 安装",
         "installation_error": "安装错误",
         "installation_succeeded": "安装成功",
@@ -157,11 +178,23 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
         "percentage_range_error": "百分比必须在 1 到 100 之间。",
         "percentage_invalid_error": "请输入有效的数字。",
         "confirm_partition_size": "确认分区大小",
+        "discard_title": "TRIM 磁盘",
+        "discard_prompt": "{disks} 支持 TRIM/discard。是否在安装前对所有块执行 TRIM？\n这可以提升重复使用的 SSD 的写入性能，但会延长安装准备时间。",
         "partition_size_preview": "总容量: {total_size}\n\n系统分区: {percentage}% = {system_size}\n剩余空间: {remaining_size}\n\n最小硬盘: {min_disk_name} ({min_disk_size})\n该硬盘系统分区: {min_disk_system_size}\n\n是否正确?",
         
         # 安装进度 (callback 消息)
+        "discarding_disk": "正在对磁盘 {disk} 执行 TRIM: {percent}%",
+        "staging_image": "正在将安装映像复制到内存: {percent}%",
+        "verifying_image": "正在校验安装映像: {percent}%",
+        "receiving_system": "正在写入系统: {percent}% ({throughput} MiB/s)",
+        "fast_mirror_title": "快速镜像安装",
+        "fast_mirror_prompt": "是否先将系统安装到 {disk}，之后再镜像到 {disks}？\n{disk} 安装完成后即可启动系统，其他磁盘在后台同步（resilver）。",
+        "resilvering": "正在同步镜像磁盘: {percent}%",
+        "resilver_in_progress": "\\n\\n镜像磁盘 {disks} 正在同步，重启后会继续同步。",
+        "resilver_watch_hint": "按 Enter 返回菜单，同步会在后台继续进行。",
         "wiping_disk": "正在擦除磁盘 {disk}",
         "formatting_disk": "正在格式化磁盘 {disk}",
+        "disk_prepared": "磁盘 {disk} 已就绪 ({done}/{total})",
         "creating_boot_pool": "正在创建启动池",
         "warning_wipe_zfs_label": "警告: 无法擦除 {device} 上的 ZFS 标签: {error}",
         "warning_wipe_partition_table": "警告: 无法擦除 {disk} 的分区表: {error}",
@@ -177,19 +210,120 @@ TRANSLATIONS: Dict[str, Dict[str, str]] = {
 }
 
 
+class CatalogError(ValueError):
+    pass
+
+
+class Message:
+    """
+    预先解析的翻译文本：`string.Formatter.parse` 只在编译时调用一次，没有占位符的文本直接返回常量。
+    """
+
+    __slots__ = ("text", "parts", "fields")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts = tuple(string.Formatter().parse(text))
+        self.fields = frozenset(field for _literal, field, _spec, _conversion in self.parts if field is not None)
+
+    def format(self, kwargs) -> str:
+        if not self.fields or not kwargs:
+            return self.text
+
+        result = []
+        try:
+            for literal, field, spec, conversion in self.parts:
+                result.append(literal)
+                if field is not None:
+                    value = kwargs[field]
+                    if conversion is not None:
+                        value = {"r": repr, "s": str, "a": ascii}[conversion](value)
+                    result.append(format(value, spec))
+        except KeyError:
+            # 如果格式化失败，返回原始文本
+            return self.text
+
+        return "".join(result)
+
+
+class Catalog:
+    def __init__(self, language: str, name: str, messages: Dict[str, Message]):
+        self.language = language
+        self.name = name
+        self.messages = messages
+
+
+def compile_catalog(language: str, translations: Dict[str, str], reference: Dict[str, str] | None = None) -> Catalog:
+    """
+    编译一种语言。与 `reference` 相比缺少或多出的键、不同的占位符都会引发 `CatalogError`。
+    """
+    messages = {key: Message(text) for key, text in translations.items()}
+
+    errors = []
+    for key, message in messages.items():
+        if any(not field.isidentifier() for field in message.fields) or any(
+            spec and "{" in spec for _literal, _field, spec, _conversion in message.parts
+        ):
+            errors.append(f"{key}: only named placeholders are supported")
+
+    if reference is not None:
+        reference_messages = {key: Message(text) for key, text in reference.items()}
+        if missing := sorted(reference_messages.keys() - messages.keys()):
+            errors.append(f"missing keys: {', '.join(missing)}")
+        if extra := sorted(messages.keys() - reference_messages.keys()):
+            errors.append(f"unknown keys: {', '.join(extra)}")
+        for key in sorted(messages.keys() & reference_messages.keys()):
+            if messages[key].fields != reference_messages[key].fields:
+                errors.append(f"{key}: placeholders {sorted(messages[key].fields)} do not match "
+                              f"{sorted(reference_messages[key].fields)}")
+
+    if errors:
+        raise CatalogError(f"Invalid {language!r} translations: " + "; ".join(errors))
+
+    return Catalog(language, translations.get(LANGUAGE_NAME_KEYS.get(language), language), messages)
+
+
+def compile_catalogs(translations: Dict[str, Dict[str, str]] = TRANSLATIONS) -> Dict[str, Catalog]:
+    reference = translations[REFERENCE_LANGUAGE]
+    return {
+        language: compile_catalog(language, texts, None if language == REFERENCE_LANGUAGE else reference)
+        for language, texts in translations.items()
+    }
+
+
+# 已编译的语言目录：每种语言在第一次使用时才编译
+_catalogs: Dict[str, Catalog] = {}
+
+
+def _get_catalog(lang: str) -> Catalog | None:
+    if (catalog := _catalogs.get(lang)) is not None:
+        return catalog
+
+    if lang not in TRANSLATIONS:
+        return None
+
+    reference = None if lang == REFERENCE_LANGUAGE else TRANSLATIONS[REFERENCE_LANGUAGE]
+    catalog = _catalogs[lang] = compile_catalog(lang, TRANSLATIONS[lang], reference)
+    return catalog
+
+
+_current_catalog = _get_catalog(_current_language)
+
+
 def set_language(lang: str) -> bool:
     """
     设置当前语言
-    
+
     Args:
         lang: 语言代码，如 "en", "zh"
-    
+
     Returns:
         是否设置成功
     """
-    global _current_language
-    if lang in TRANSLATIONS:
+    global _current_language, _current_catalog
+    if (catalog := _get_catalog(lang)) is not None:
         _current_language = lang
+        _current_catalog = catalog
         return True
     return False
 
@@ -201,38 +335,26 @@ def get_language() -> str:
 
 def get_available_languages() -> Dict[str, str]:
     """获取可用语言列表"""
-    return {
-        "en": TRANSLATIONS["en"]["lang_english"],
-        "zh": TRANSLATIONS["zh"]["lang_chinese"],
-    }
+    return {lang: translations.get(LANGUAGE_NAME_KEYS.get(lang), lang) for lang, translations in TRANSLATIONS.items()}
 
 
 def _(key: str, **kwargs) -> str:
     """
     翻译函数
-    
+
     Args:
         key: 翻译键
         **kwargs: 格式化参数
-    
+
     Returns:
         翻译后的字符串
     """
-    # 获取当前语言的翻译
-    translation = TRANSLATIONS.get(_current_language, TRANSLATIONS["en"])
-    
-    # 获取翻译文本，如果不存在则返回键名
-    text = translation.get(key, TRANSLATIONS["en"].get(key, key))
-    
-    # 格式化参数
-    if kwargs:
-        try:
-            text = text.format(**kwargs)
-        except KeyError:
-            # 如果格式化失败，返回原始文本
-            pass
-    
-    return text
+    message = _current_catalog.messages.get(key)
+    if message is None:
+        # 所有语言的键都相同（构建时由 `python3 -m truenas_installer.i18n` 检查），不存在则返回键名
+        return key
+
+    return message.format(kwargs)
 
 
 # 便捷函数，用于创建带翻译的菜单项
@@ -248,3 +370,23 @@ def get_menu_items() -> Dict[str, Callable]:
         "shutdown_system": None,
         "select_language": None,
     }
+
+
+def main():
+    """
+    检查所有翻译（构建时运行）：缺少或多出的键、不同的占位符会使命令失败
+    """
+    try:
+        catalogs = compile_catalogs()
+    except CatalogError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    for language, catalog in catalogs.items():
+        print(f"{language}: {len(catalog.messages)} messages")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
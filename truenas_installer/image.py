@@ -0,0 +1,223 @@
+import asyncio
+import contextlib
+from dataclasses import dataclass
+import os
+import subprocess
+import tempfile
+import time
+from typing import Callable
+
+from . import utils
+from .i18n import _
+from .logger import logger
+from .tracing import tracer
+from .utils import run
+
+__all__ = ["MountedImage", "choose_strategy", "mount_image"]
+
+IMAGE_PATH = "/cdrom/TrueNAS-SCALE.update"
+MEMINFO = "/proc/meminfo"
+
+# Memory that must remain available after the image is staged in RAM (`truenas_install`, ZFS ARC, page cache)
+MIN_FREE_MEMORY = 2 * 1024 ** 3
+# A source this fast (local SSD, image already cached) is not worth staging
+FAST_SOURCE_THROUGHPUT = 300 * 1024 ** 2
+# Source throughput is measured by reading at most this much, for at most `PROBE_TIME` seconds
+PROBE_SIZE = 64 * 1024 ** 2
+PROBE_TIME = 1.0
+# Sequential read size used to copy the image to tmpfs
+STAGING_CHUNK_SIZE = 8 * 1024 ** 2
+# Loop device read-ahead when the image is read from the boot medium
+READ_AHEAD_KB = 4096
+
+STRATEGY_TMPFS = "tmpfs"
+STRATEGY_LOOP = "loop"
+
+
+@dataclass
+class MountedImage:
+    path: str
+    strategy: str
+    loop_device: str
+    # Seconds
+    staging_time: float = 0
+    # Bytes per second, `None` if not measured
+    source_throughput: float | None = None
+    mount_throughput: float | None = None
+    # Installation image and the file the loop device reads: the image itself or its copy in tmpfs
+    source: str | None = None
+    backing: str | None = None
+
+
+def mem_available(meminfo: str | None = None):
+    try:
+        with open(meminfo or MEMINFO) as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    return 0
+
+
+def choose_strategy(image_size: int, available_memory: int, source_throughput: float | None):
+    """
+    Stage the image in RAM when the source is slow and enough memory remains available afterwards, otherwise read
+    it from the boot medium through a direct I/O loop device.
+    """
+    if source_throughput is not None and source_throughput >= FAST_SOURCE_THROUGHPUT:
+        return STRATEGY_LOOP
+
+    if available_memory - image_size < MIN_FREE_MEMORY:
+        return STRATEGY_LOOP
+
+    return STRATEGY_TMPFS
+
+
+def measure_throughput(path: str, size: int = PROBE_SIZE, max_time: float = PROBE_TIME):
+    """
+    Sequential read throughput of `path` in bytes per second, `None` if it can't be read.
+    """
+    buffer = bytearray(1024 ** 2)
+    done = 0
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError as e:
+        logger.debug(f"Unable to measure the read throughput of {path}: {e}")
+        return None
+
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        start = time.monotonic()
+        while done < size and time.monotonic() - start < max_time:
+            if not (read := os.readv(fd, [buffer])):
+                break
+            done += read
+        elapsed = time.monotonic() - start
+    except OSError as e:
+        logger.debug(f"Unable to measure the read throughput of {path}: {e}")
+        return None
+    finally:
+        os.close(fd)
+
+    return done / elapsed if elapsed > 0 else None
+
+
+def copy_image(source: str, destination: str, on_progress: Callable | None = None):
+    """
+    Copy `source` with large sequential reads. `on_progress` is called with `(done_bytes, total_bytes)`.
+    """
+    src = os.open(source, os.O_RDONLY)
+    try:
+        total = os.fstat(src).st_size
+        os.posix_fadvise(src, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        dst = os.open(destination, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            done = 0
+            while done < total:
+                if not (copied := os.sendfile(dst, src, done, min(STAGING_CHUNK_SIZE, total - done))):
+                    raise OSError(f"Unexpected end of {source} at {done}")
+                done += copied
+                if on_progress is not None:
+                    on_progress(done, total)
+        finally:
+            os.close(dst)
+
+        # The pages of the boot medium are not needed anymore
+        os.posix_fadvise(src, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(src)
+
+
+def set_read_ahead(loop_device: str, read_ahead_kb: int):
+    path = os.path.join(utils.SYS_BLOCK, os.path.basename(loop_device), "queue", "read_ahead_kb")
+    try:
+        with open(path, "w") as f:
+            f.write(str(read_ahead_kb))
+    except OSError as e:
+        logger.debug(f"Unable to set {path}: {e}")
+
+
+@contextlib.asynccontextmanager
+async def mount_image(callback: Callable, image: str | None = None):
+    """
+    Mount the installation squashfs image read-only and yield a `MountedImage`. The image is staged in tmpfs or
+    read from the boot medium as decided by `choose_strategy`.
+    """
+    image = image or IMAGE_PATH
+    loop = asyncio.get_running_loop()
+    async with contextlib.AsyncExitStack() as stack:
+        with tracer.span("stage_image"):
+            image_size = os.path.getsize(image)
+            source_throughput = await loop.run_in_executor(None, measure_throughput, image)
+            strategy = choose_strategy(image_size, mem_available(), source_throughput)
+
+            start = time.monotonic()
+            backing = image
+            if strategy == STRATEGY_TMPFS:
+                staging = contextlib.AsyncExitStack()
+                try:
+                    backing = await _stage(staging, image, image_size, callback)
+                except (OSError, subprocess.CalledProcessError) as e:
+                    logger.warning(f"Unable to stage {image} in memory, reading it from the boot medium: {e}")
+                    await staging.aclose()
+                    backing = image
+                    strategy = STRATEGY_LOOP
+                else:
+                    stack.push_async_exit(staging)
+            staging_time = time.monotonic() - start
+
+            losetup = ["losetup", "--find", "--show", "--read-only"]
+            if strategy == STRATEGY_LOOP:
+                losetup.append("--direct-io=on")
+            loop_device = (await run(losetup + [backing])).stdout.strip()
+            stack.push_async_callback(run, ["losetup", "-d", loop_device])
+            set_read_ahead(loop_device, READ_AHEAD_KB)
+
+            path = stack.enter_context(tempfile.TemporaryDirectory())
+            await run(["mount", "-t", "squashfs", "-o", "ro", loop_device, path])
+            stack.push_async_callback(run, ["umount", "-f", path])
+
+            mount_throughput = await loop.run_in_executor(None, measure_throughput, loop_device)
+
+        mounted = MountedImage(path, strategy, loop_device, staging_time, source_throughput, mount_throughput, image,
+                               backing)
+        logger.info(
+            f"Installation image {image} ({image_size} bytes) mounted on {path} from {strategy}: "
+            f"staging took {staging_time:.1f}s, source {_format_throughput(source_throughput)}, "
+            f"mount {_format_throughput(mount_throughput)}"
+        )
+        yield mounted
+
+
+async def _stage(stack: contextlib.AsyncExitStack, image: str, image_size: int, callback: Callable):
+    loop = asyncio.get_running_loop()
+    reported = -1
+
+    def report(percent):
+        nonlocal reported
+        # Only report every 10%
+        if percent // 10 > reported:
+            reported = percent // 10
+            callback(0, _("staging_image", percent=percent))
+
+    def on_progress(done, total):
+        loop.call_soon_threadsafe(report, done * 100 // total)
+
+    staging_dir = stack.enter_context(tempfile.TemporaryDirectory())
+    # Room for the image only, a copy that does not fit fails with ENOSPC instead of exhausting memory
+    await run(["mount", "-t", "tmpfs", "-o", f"size={image_size + 1024 ** 2},mode=0700", "tmpfs", staging_dir])
+    stack.push_async_callback(run, ["umount", "-f", staging_dir])
+
+    staged = os.path.join(staging_dir, os.path.basename(image))
+    report(0)
+    await loop.run_in_executor(None, copy_image, image, staged, on_progress)
+    return staged
+
+
+def _format_throughput(throughput):
+    if throughput is None:
+        return "unknown"
+
+    return f"{throughput / 1024 ** 2:.1f} MiB/s"
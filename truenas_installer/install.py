@@ -1,24 +1,79 @@
 import asyncio
+import contextlib
 import json
 import os
 import subprocess
-import tempfile
-from typing import Callable
+from typing import TYPE_CHECKING, Callable
 
 from .disks import Disk
 from .exception import InstallError
+from .golden import golden_stream_path, receive_golden_stream, supports_golden_dataset
 from .i18n import _
+from .image import MountedImage, mount_image
 from .lock import installation_lock
 from .logger import logger
-from .utils import get_partitions, run
+from .partition import Partition, PartitionLayout, apply_layout, bios_layout, uefi_layout
+from .progress import ProgressReader
+from .resilver import ResilverMonitor
+from .tracing import tracer
+from .utils import get_partitions, run, run_streaming
+from .verify import VERIFY_BEFORE, VERIFY_OFF, VERIFY_OVERLAP, verify_image_async
+from .wipe import discard_disk, discard_max_bytes, fast_wipe
+
+if TYPE_CHECKING:
+    from .prepare import BackgroundPreparation
 
 __all__ = ["InstallError", "install"]
 
 ONE_POOL = "one-pool"
-
-
-async def install(destination_disks: list[Disk], wipe_disks: list[Disk], system_pct: int, min_system_size: int, callback: Callable, version: str | None = None, language: str | None = None):
-    boot_mode = check_boot_mode()
+# How many destination disks are wiped and partitioned at the same time
+DISK_CONCURRENCY = 4
+# `truenas_install` copies the system file by file, "golden" receives a prebuilt `zfs send` stream of it
+INSTALL_ENGINE_FILES = "files"
+INSTALL_ENGINE_GOLDEN = "golden"
+# Share of the installation progress accounted for by receiving the golden stream
+GOLDEN_STREAM_WEIGHT = 0.9
+
+
+async def install(destination_disks: list[Disk], wipe_disks: list[Disk], system_pct: int, min_system_size: int,
+                  callback: Callable, version: str | None = None, language: str | None = None,
+                  concurrency: int = DISK_CONCURRENCY, discard: bool = False,
+                  prepared: "BackgroundPreparation | None" = None, verify: str = VERIFY_BEFORE,
+                  engine: str = INSTALL_ENGINE_FILES, fast_mirror: bool = False) -> ResilverMonitor | None:
+    """
+    `prepared`: work started in the background while the installation was being configured. It is only waited for
+    once it is needed, and it is closed by the caller.
+
+    `verify`: check the installation image against its manifest before touching the disks (`VERIFY_BEFORE`), while
+    the disks are being prepared (`VERIFY_OVERLAP`) or not at all (`VERIFY_OFF`).
+
+    `engine`: `INSTALL_ENGINE_GOLDEN` falls back to `INSTALL_ENGINE_FILES` if the media has no golden stream.
+
+    `fast_mirror`: with several destination disks, install the system to the first one only and attach the others
+    afterwards. The installation succeeds as soon as the first disk is bootable; the returned `ResilverMonitor` owns
+    the still imported boot pool while the other disks resilver, the caller must close it.
+    """
+    # Keep what the background preparation has already done
+    tracer.reset(prepared.started_at if prepared is not None else None)
+    try:
+        with tracer.span("install", disks=[disk.name for disk in destination_disks]):
+            return await _install(
+                destination_disks, wipe_disks, system_pct, min_system_size, callback, version, language, concurrency,
+                discard, prepared, verify, engine, fast_mirror,
+            )
+    finally:
+        write_trace()
+
+
+async def _install(destination_disks: list[Disk], wipe_disks: list[Disk], system_pct: int, min_system_size: int,
+                   callback: Callable, version: str | None, language: str | None,
+                   concurrency: int, discard: bool, prepared: "BackgroundPreparation | None", verify: str,
+                   engine: str, fast_mirror: bool):
+    boot_mode = (prepared and prepared.boot_mode) or check_boot_mode()
+    verification = None
+    if prepared is not None:
+        prepared.callback = callback
+        verification = prepared.verification
     min_system_size_mib = min_system_size // (1024 * 1024)
     min_system_size_str = f"{min_system_size_mib}m"  # 例如: "+8192m"
                   
@@ -28,49 +83,189 @@ async def install(destination_disks: list[Disk], wipe_disks: list[Disk], system_
             if not os.path.exists("/etc/hostid"):
                 await run(["zgenhostid"])
 
-            for disk in destination_disks:
-                callback(0, _("wiping_disk", disk=disk.name))
-                await wipe_disk(disk, callback)
+            if verify == VERIFY_OFF:
+                verification = None
+            elif verification is None:
+                verification = asyncio.create_task(verify_image_async(callback))
 
-            for disk in destination_disks:
-                callback(0, _("formatting_disk", disk=disk.name))
-                if boot_mode == "UEFI":
-                    await format_disk_uefi(disk, system_pct, min_system_size_str, callback)
-                else:
-                    await format_disk_bios2(disk, system_pct, min_system_size_str, callback)
+            try:
+                if verify == VERIFY_BEFORE:
+                    await wait_for_verification(verification)
+
+                disk_parts = await prepare_disks(
+                    destination_disks, boot_mode, system_pct, min_system_size_str, callback, concurrency, discard,
+                )
+
+                if verify == VERIFY_OVERLAP:
+                    await wait_for_verification(verification)
+            finally:
+                if verification is not None and not verification.done() and prepared is None:
+                    verification.cancel()
 
             # for disk in wipe_disks:
             #     callback(0, f"Wiping disk {disk.name}")
             #     await wipe_disk(disk, callback)
 
-            disk_parts = list()
-            
-            part_num = 2 if system_pct == 100 else 3
-
-            for disk in destination_disks:
-                found = (await get_partitions(disk.device, [part_num]))[part_num]
-                if found is None:
-                    raise InstallError(f"Failed to find data partition on {disk.name}")
-                else:
-                    disk_parts.append(found)
-
+            # The other disks are attached once the system is installed
+            fast_mirror = fast_mirror and len(disk_parts) > 1
             callback(0, _("creating_boot_pool"))
-            await create_one_pool(disk_parts)
+            with tracer.span("create_pool", fast_mirror=fast_mirror):
+                await create_one_pool(disk_parts[:1] if fast_mirror else disk_parts)
+            monitor = None
             try:
-                await run_installer(
-                    [disk.name for disk in destination_disks],
-                    callback,
-                    version,
-                    language,
-                    boot_mode,
-                )
+                image = None
+                if prepared is not None:
+                    with tracer.span("wait_for_preparation"):
+                        image = await prepared.wait(callback)
+
+                stream = None
+                if engine == INSTALL_ENGINE_GOLDEN and (stream := golden_stream_path()) is None:
+                    logger.warning("No golden stream on the installation media, installing file by file")
+
+                with tracer.span("run_installer", engine=INSTALL_ENGINE_GOLDEN if stream else INSTALL_ENGINE_FILES):
+                    if stream is not None:
+                        await run_golden_installer(
+                            [disk.name for disk in destination_disks],
+                            callback,
+                            version,
+                            language,
+                            boot_mode,
+                            image,
+                            stream,
+                        )
+                    else:
+                        await run_installer(
+                            [disk.name for disk in destination_disks],
+                            callback,
+                            version,
+                            language,
+                            boot_mode,
+                            image,
+                        )
+
+                if fast_mirror:
+                    with tracer.span("attach_mirrors"):
+                        monitor = await attach_mirrors(disk_parts[0], disk_parts[1:])
+                    return monitor
             finally:
-                await run(["zpool", "export", "-f", ONE_POOL])
+                # The monitor exports the pool once the caller is done with it
+                if monitor is None:
+                    await run(["zpool", "export", "-f", ONE_POOL])
         except subprocess.CalledProcessError as e:
             raise InstallError(f"Command {' '.join(e.cmd)} failed:\n{e.stderr.rstrip()}")
 
 
+async def wait_for_verification(verification: asyncio.Task):
+    with tracer.span("verify_image"):
+        await asyncio.shield(verification)
+
+
+async def prepare_disks(disks: list[Disk], boot_mode: str, system_pct: int, min_system_size: str, callback: Callable,
+                        concurrency: int = DISK_CONCURRENCY, discard: bool = False) -> list[str]:
+    """
+    Run the (discard ->) wipe -> partition -> partition discovery pipeline for
+    every disk in `disks`, at most `concurrency` disks at a time. Returns the
+    data partition of each disk (in the same order as `disks`).
+
+    A failure on one disk does not stop the others; all failures are
+    collected and raised together as a single `InstallError`.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    done = 0
+
+    async def prepare(disk):
+        nonlocal done
+        async with semaphore:
+            part = await prepare_disk(disk, boot_mode, system_pct, min_system_size, callback, discard)
+
+        done += 1
+        callback(0, _("disk_prepared", disk=disk.name, done=done, total=len(disks)))
+        return part
+
+    results = await asyncio.gather(*[prepare(disk) for disk in disks], return_exceptions=True)
+
+    errors = []
+    for disk, result in zip(disks, results):
+        if isinstance(result, subprocess.CalledProcessError):
+            errors.append(f"{disk.name}: Command {' '.join(result.cmd)} failed:\n{result.stderr.rstrip()}")
+        elif isinstance(result, InstallError):
+            errors.append(f"{disk.name}: {result.message}")
+        elif isinstance(result, BaseException):
+            raise result
+
+    if errors:
+        raise InstallError("\n".join(errors))
+
+    return results
+
+
+async def prepare_disk(disk: Disk, boot_mode: str, system_pct: int, min_system_size: str, callback: Callable,
+                       discard: bool = False) -> str:
+    with tracer.span("disk", disk=disk.name):
+        return await _prepare_disk(disk, boot_mode, system_pct, min_system_size, callback, discard)
+
+
+async def _prepare_disk(disk: Disk, boot_mode: str, system_pct: int, min_system_size: str, callback: Callable,
+                        discard: bool) -> str:
+    if discard:
+        if discard_max_bytes(disk.name) > 0:
+            await discard_whole_disk(disk, callback)
+        else:
+            logger.info(f"{disk.name} does not support discard, skipping")
+
+    callback(0, _("wiping_disk", disk=disk.name))
+    await wipe_disk(disk, callback)
+
+    callback(0, _("formatting_disk", disk=disk.name))
+    if boot_mode == "UEFI":
+        await format_disk_uefi(disk, system_pct, min_system_size, callback)
+    else:
+        await format_disk_bios2(disk, system_pct, min_system_size, callback)
+
+    part_num = 2 if system_pct == 100 else 3
+    found = (await get_partitions(disk.device, [part_num]))[part_num]
+    if found is None:
+        raise InstallError(f"Failed to find data partition on {disk.name}")
+
+    return found
+
+
+async def discard_whole_disk(disk: Disk, callback: Callable):
+    loop = asyncio.get_running_loop()
+    reported = -1
+
+    def report(percent):
+        nonlocal reported
+        # Only report every 10%
+        if percent // 10 > reported:
+            reported = percent // 10
+            callback(0, _("discarding_disk", disk=disk.name, percent=percent))
+
+    def on_progress(done, total):
+        loop.call_soon_threadsafe(report, done * 100 // total)
+
+    report(0)
+    with tracer.span("discard", disk=disk.name):
+        try:
+            await loop.run_in_executor(None, discard_disk, disk.device, on_progress)
+        except OSError as e:
+            # i.e. EIO or EBUSY, the disk is reported with the other failed disks by `prepare_disks`
+            raise InstallError(f"Discard failed: {e}")
+
+
 async def wipe_disk(disk: Disk, callback: Callable):
+    with tracer.span("wipe", disk=disk.name):
+        await _wipe_disk(disk, callback)
+
+
+async def _wipe_disk(disk: Disk, callback: Callable):
+    try:
+        with tracer.span("fast_wipe", disk=disk.name):
+            await asyncio.get_running_loop().run_in_executor(None, fast_wipe, disk.device)
+        return
+    except OSError as e:
+        logger.warning(f"Fast wipe of {disk.name} failed, falling back to wipefs: {e}")
+
     for zfs_member in disk.zfs_members:
         if (result := await run(["zpool", "labelclear", "-f", f"/dev/{zfs_member.name}"],
                                 check=False)).returncode != 0:
@@ -82,103 +277,55 @@ async def wipe_disk(disk: Disk, callback: Callable):
 
     await run(["sgdisk", "-Z", disk.device], check=False)
 
-async def format_disk_uefi(disk: Disk, system_pct: int, min_system_size:str, callback: Callable):
-    await wipe_disk(disk, callback)
 
-    await run(["sgdisk", "-n1:1m:+512m", "-t", "1:ef00", disk.device])
-    if system_pct == 100:
-        await run(["sgdisk", "-n2:0:0", "-t2:BF01", disk.device])
-        part_nums = [1, 2]        
-    else:
-        await run(["sgdisk", f"-n2:0:+{min_system_size}", "-t2:BF00", disk.device])        
-        await run(["sgdisk", "-n3:0:0", "-t3:BF01", disk.device])
-        part_nums = [1, 2, 3]
-        
-    # Bad hardware is bad, but we've seen a few users
-    # state that by the time we run `parted` command
-    # down below OR the caller of this function tries
-    # to do something with the partition(s), they won't
-    # be present. This is almost _exclusively_ related
-    # to bad hardware, but we will wait up to 30 seconds
-    # for the partitions to show up in sysfs.
-    disk_parts = await get_partitions(disk.device, part_nums, tries=30)
-    for partnum, part_device in disk_parts.items():
-        logger.info("format_disk_uefi disk_parts:%s",disk_parts)
-        if part_device is None:
-            raise InstallError(f"Failed to find partition number {partnum} on {disk.name}")
-        
+async def format_disk_uefi(disk: Disk, system_pct: int, min_system_size: str, callback: Callable):
+    layout = uefi_layout(system_pct, _size_mib(min_system_size))
+    with tracer.span("partition", disk=disk.name):
+        await apply_layout(layout, disk.device)
+    await wait_for_partitions(disk, layout.numbers)
 
-async def format_disk_bios(disk: Disk, system_pct: int, min_system_size:str, callback: Callable):
-    await wipe_disk(disk, callback)
 
-    # await run(["sgdisk", "-n1:1m:+512m", "-t", "1:ef00", disk.device])
+async def format_disk_bios(disk: Disk, system_pct: int, min_system_size: str, callback: Callable):
     # 对应原始指令: sgdisk -n 1:2048:+512MiB -t 1:8300 -A 1:set:2
-    await run(["sgdisk","-n1:2048:+512m","-t1:8300","-A1:set:2",disk.device])
-    # sgdisk -n 1:2048:+512MiB -t 1:8300 -A 1:set:2 "${POOL_DISK}"
     if system_pct == 100:
-        await run(["sgdisk", "-n2:0:0", "-t2:8300", disk.device])        
+        partitions = [Partition(2, "8300")]
     else:
-        await run(["sgdisk", f"-n2:0:+{min_system_size}", "-t2:8300", disk.device])        
-        await run(["sgdisk", "-n3:0:0", "-t3:BF01", disk.device])
-        
+        partitions = [Partition(2, "8300", _size_mib(min_system_size)), Partition(3, "BF01")]
+    layout = PartitionLayout("gpt", [Partition(1, "8300", 512, start=1, bootable=True)] + partitions)
+
+    await apply_layout(layout, disk.device)
+    await wait_for_partitions(disk, layout.numbers)
 
-    # Bad hardware is bad, but we've seen a few users
-    # state that by the time we run `parted` command
-    # down below OR the caller of this function tries
-    # to do something with the partition(s), they won't
-    # be present. This is almost _exclusively_ related
-    # to bad hardware, but we will wait up to 30 seconds
-    # for the partitions to show up in sysfs.
-    disk_parts = await get_partitions(disk.device, [1, 2, 3], tries=30)
-    for partnum, part_device in disk_parts.items():
-        logger.info("format_disk_bios disk_parts:%s",disk_parts)
-        if part_device is None:
-            raise InstallError(f"Failed to find partition number {partnum} on {disk.name}")
 
 async def format_disk_bios2(disk: Disk, system_pct: int, min_system_size: str, callback: Callable):
-    await wipe_disk(disk, callback)
+    # 第三个分区的起始位置为 513MiB + min_system_size
+    layout = bios_layout(system_pct, _size_mib(min_system_size))
+    with tracer.span("partition", disk=disk.name):
+        await apply_layout(layout, disk.device)
+    await wait_for_partitions(disk, layout.numbers)
 
-    if system_pct == 100:
-        bash_cmd = f"""cat <<'EOF' | sfdisk "{disk.device}"
-label: dos
-start=1MiB, size=512MiB, type=83, bootable
-start=513MiB, size=+, type=83
-EOF"""
-        part_nums = [1, 2]
-    else:
-        # 计算第三个分区的起始位置 (513MiB + min_system_size)
-        # min_system_size 格式如 "8192m"，提取数值部分
-        min_size_num = int(''.join(filter(str.isdigit, min_system_size)))
-        third_start = 513 + min_size_num
-        bash_cmd = f"""cat <<'EOF' | sfdisk "{disk.device}"
-label: dos
-start=1MiB, size=512MiB, type=83, bootable
-start=513MiB, size={min_system_size}, type=83
-start={third_start}MiB, size=+, type=83
-EOF"""
-        part_nums = [1, 2, 3]
-
-    await run(["bash", "-c", bash_cmd])
-
-    # 等待分区出现在 sysfs 中（最多等待 30 秒）
-    disk_parts = await get_partitions(disk.device, part_nums, tries=30)
-    for partnum, part_device in disk_parts.items():
-        logger.info("format_disk_bios2 disk_parts:%s", disk_parts)
-        if part_device is None:
-            raise InstallError(f"Failed to find partition number {partnum} on {disk.name}")
 
 async def format_disk(disk: Disk, callback: Callable):
-    await wipe_disk(disk, callback)
-
-    # Create BIOS boot partition
-    await run(["sgdisk", "-a4096", "-n1:0:+1024K", "-t1:EF02", "-A1:set:2", disk.device])
+    layout = PartitionLayout(
+        "gpt",
+        [
+            # BIOS boot partition
+            Partition(1, "EF02", 1, bootable=True),
+            # EFI partition (Even if not used, allows user to switch to UEFI later)
+            Partition(2, "EF00", 512),
+            # Data partition
+            Partition(3, "BF01"),
+        ],
+        alignment=4096,
+    )
+    await apply_layout(layout, disk.device)
+    await wait_for_partitions(disk, layout.numbers)
 
-    # Create EFI partition (Even if not used, allows user to switch to UEFI later)
-    await run(["sgdisk", "-n2:0:+524288K", "-t2:EF00", disk.device])
+    # if set_pmbr:
+    #     await run(["parted", "-s", disk.device, "disk_set", "pmbr_boot", "on"], check=False)
 
-    # Create data partition
-    await run(["sgdisk", "-n3:0:0", "-t3:BF01", disk.device])
 
+async def wait_for_partitions(disk: Disk, part_nums: list[int]):
     # Bad hardware is bad, but we've seen a few users
     # state that by the time we run `parted` command
     # down below OR the caller of this function tries
@@ -186,17 +333,21 @@ async def format_disk(disk: Disk, callback: Callable):
     # be present. This is almost _exclusively_ related
     # to bad hardware, but we will wait up to 30 seconds
     # for the partitions to show up in sysfs.
-    disk_parts = await get_partitions(disk.device, [1, 2, 3], tries=30)
+    with tracer.span("wait_for_partitions", disk=disk.name):
+        disk_parts = await get_partitions(disk.device, part_nums, tries=30)
+    logger.info("%s disk_parts: %s", disk.name, disk_parts)
     for partnum, part_device in disk_parts.items():
         if part_device is None:
             raise InstallError(f"Failed to find partition number {partnum} on {disk.name}")
 
-    # if set_pmbr:
-    #     await run(["parted", "-s", disk.device, "disk_set", "pmbr_boot", "on"], check=False)
+
+def _size_mib(size: str):
+    # size 格式如 "8192m"，提取数值部分
+    return int(''.join(filter(str.isdigit, size)))
 
 
 async def create_one_pool(devices):
-    await run(
+    await run_streaming(
         [
             "zpool", "create", "-f",
             "-o", "ashift=12",
@@ -210,7 +361,9 @@ async def create_one_pool(devices):
             ONE_POOL,
         ] +
         (["mirror"] if len(devices) > 1 else []) +
-        devices
+        devices,
+        on_stdout=_log_output,
+        on_stderr=_log_output,
     )
     await run(["zfs", "create", "-o", "mountpoint=none", f"{ONE_POOL}/ROOT"])
     # await run(["zfs", "create", "-o", "canmount=noauto", "-o", "mountpoint=/", f"{ONE_POOL}/ROOT/{bootpool}"])
@@ -218,61 +371,97 @@ async def create_one_pool(devices):
 
 
 
-async def run_installer(disks, callback, version: str | None = None, language: str | None = None, boot_mode: str | None = None):
-    with tempfile.TemporaryDirectory() as src:
+async def attach_mirrors(device: str, devices: list[str]) -> ResilverMonitor:
+    """
+    Turn the single-disk boot pool into a mirror of `device` and `devices`. `zpool attach` returns immediately, the
+    new disks resilver in the background.
+    """
+    for other in devices:
+        await run(["zpool", "attach", "-f", ONE_POOL, device, other])
+
+    logger.info(f"Attached {', '.join(devices)} to {device}, resilvering")
+    return ResilverMonitor(ONE_POOL, device, devices)
+
+
+async def run_golden_installer(disks, callback, version: str | None, language: str | None, boot_mode: str | None,
+                               image: MountedImage | None, stream: str):
+    """
+    Receive the golden stream as the boot dataset, then let `truenas_install` only run its post-configuration steps
+    (bootloader, system configuration) on it. Falls back to `run_installer` if the `truenas_install` of the image
+    does not support that.
+    """
+    async with contextlib.AsyncExitStack() as stack:
+        if image is None:
+            image = await stack.enter_async_context(mount_image(callback))
+
+        if not supports_golden_dataset(image.path):
+            logger.warning("truenas_install of the installation image can't configure a received boot dataset, "
+                           "installing file by file")
+            await run_installer(disks, callback, version, language, boot_mode, image)
+            return
+
+        dataset = f"{ONE_POOL}/ROOT/{version or 'default'}"
+        await receive_golden_stream(dataset, callback, stream, GOLDEN_STREAM_WEIGHT)
+        await run(["zpool", "set", f"bootfs={dataset}", ONE_POOL])
+
+        def post_configuration_callback(progress, message):
+            callback(GOLDEN_STREAM_WEIGHT + (1 - GOLDEN_STREAM_WEIGHT) * progress, message)
+
+        await run_installer(disks, post_configuration_callback, version, language, boot_mode, image,
+                            golden_dataset=dataset)
+
+
+async def run_installer(disks, callback, version: str | None = None, language: str | None = None,
+                        boot_mode: str | None = None, image: MountedImage | None = None,
+                        golden_dataset: str | None = None):
+    async with contextlib.AsyncExitStack() as stack:
+        if image is None:
+            image = await stack.enter_async_context(mount_image(callback))
+        src = image.path
         logger.info(f"run_installer: src = {src}")
-        await run(["mount", "/cdrom/TrueNAS-SCALE.update", src, "-t", "squashfs", "-o", "loop"])
-        try:
-            params = {
-                "disks": disks,
-                "json": True,
-                "pool_name": ONE_POOL,
-                "src": src,
-                "version": version,
-                "language": language,
-                "boot_mode": boot_mode,
-            }
-            process = await asyncio.create_subprocess_exec(
-                "python3", "-m", "truenas_install",
-                cwd=src,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
+        params = {
+            "disks": disks,
+            "json": True,
+            "pool_name": ONE_POOL,
+            "src": src,
+            "version": version,
+            "language": language,
+            "boot_mode": boot_mode,
+        }
+        if golden_dataset is not None:
+            # The system is already in this dataset, only configure it
+            params["golden_dataset"] = golden_dataset
+        process = await asyncio.create_subprocess_exec(
+            "python3", "-m", "truenas_install",
+            cwd=src,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        if process.stdin:
+            process.stdin.write(json.dumps(params).encode("utf-8"))
+            process.stdin.close()
+        result = await ProgressReader(process.stdout, callback).read()
+        await process.wait()
+
+        if process.returncode != 0:
+            raise InstallError(
+                result.error or "\n".join(result.output) or
+                f"Abnormal installer process termination with code {process.returncode}"
             )
-            if process.stdin:
-                process.stdin.write(json.dumps(params).encode("utf-8"))
-                process.stdin.close()
-            error = None
-            stderr = ""
-            while True:
-                line = await process.stdout.readline() if process.stdout else b""
-                if not line:
-                    break
-
-                line = line.decode("utf-8", "ignore")
-
-                try:
-                    data = json.loads(line)
-                except ValueError:
-                    stderr += line
-                else:
-                    if "progress" in data and "message" in data:
-                        callback(data["progress"], data["message"])
-                    elif "error" in data:
-                        error = data["error"]
-                    else:
-                        raise ValueError(f"Invalid truenas_install JSON: {data!r}")
-            await process.wait()
-
-            if error is not None:
-                result = error
-            else:
-                result = stderr
-
-            if process.returncode != 0:
-                raise InstallError(result or f"Abnormal installer process termination with code {process.returncode}")
-        finally:
-            await run(["umount", "-f", src])
+
+
+def write_trace():
+    logger.info(f"Installation timings:\n{tracer.summary()}")
+    try:
+        tracer.write()
+    except OSError as e:
+        logger.warning(f"Unable to write installation trace: {e}")
+
+
+def _log_output(line):
+    logger.debug(f"> {line}")
+
 
 def check_boot_mode():
     if os.path.exists("/sys/firmware/efi"):
@@ -4,10 +4,14 @@ from .logger import logger
 
 
 class Installer:
-    def __init__(self, version, dmi, vendor, tn_model):
+    def __init__(self, version, dmi, vendor, tn_model, verify_image="before", install_engine="files"):
         self.version = version
         self.dmi = dmi
         self.efi = os.path.exists("/sys/firmware/efi")
         self.vendor = vendor
         self.tn_model = tn_model
+        # When the installation image is checked against its manifest (`verify.VERIFY_*`)
+        self.verify_image = verify_image
+        # How the system is written to the boot pool (`install.INSTALL_ENGINE_*`)
+        self.install_engine = install_engine
         logger.info(f"Installer initialized: vendor={vendor}, version={version}, efi={self.efi}")
@@ -1,10 +1,12 @@
 import asyncio
+import contextlib
 import os
 import sys
-
-import humanfriendly
+import termios
+from typing import TYPE_CHECKING
 
 from .dialog import (
+    close_ui,
     dialog_checklist,
     dialog_inputbox,
     dialog_menu,
@@ -12,23 +14,49 @@ from .dialog import (
     dialog_password,
     dialog_radiolist,
     dialog_yesno,
+    suspended_ui,
 )
-from .disks import Disk, list_disks
 from .exception import InstallError
-from .install import install
 from .i18n import _, set_language, get_available_languages, get_language
-from .logger import logger
+from .logger import flush_logging, logger, progress_logger, shutdown_logging
+from .progress import ProgressRenderer
+
+# 主菜单首次显示前只导入菜单需要的模块；磁盘、安装相关模块和 humanfriendly 在第一次使用时才导入
+if TYPE_CHECKING:
+    from .disks import Disk
+    from .inventory import DiskInventory
+    from .resilver import ResilverMonitor
+
+
+def format_size(size: int) -> str:
+    import humanfriendly
+    return humanfriendly.format_size(size, binary=True)
 
 
 class InstallerMenu:
     def __init__(self, installer):
         self.installer = installer
+        self._disk_inventory = None
+        self.progress_renderer = ProgressRenderer()
+        # "快速镜像"安装后仍在同步的启动池，重启/关机/再次安装前导出
+        self.resilver: "ResilverMonitor | None" = None
+
+    @property
+    def disk_inventory(self) -> "DiskInventory":
+        if self._disk_inventory is None:
+            from .inventory import DiskInventory
+            self._disk_inventory = DiskInventory()
+            self._disk_inventory.start()
+
+        return self._disk_inventory
 
     async def run(self):
-        await self._main_menu()
+        # 每个菜单项处理完后返回这里，而不是递归调用 `_main_menu`，协程栈和内存占用保持不变
+        while True:
+            await self._main_menu()
 
     async def _main_menu(self):
-        """显示主菜单"""
+        """显示一次主菜单并执行所选菜单项"""
         logger.info("Displaying main menu")
         # 使用 lambda 来确保每次菜单显示时都使用当前语言的翻译
         menu_items = {
@@ -39,13 +67,11 @@ class InstallerMenu:
             _("select_language"): self._select_language,
         }
         
+        # 返回后由 `run` 重新显示主菜单（支持语言切换后立即刷新）
         await dialog_menu(
             _("main_menu_title", vendor=self.installer.vendor, version=self.installer.version),
             menu_items,
         )
-        
-        # 菜单返回后重新显示（支持语言切换后立即刷新）
-        await self._main_menu()
 
     async def _select_language(self):
         """语言选择菜单"""
@@ -81,13 +107,23 @@ class InstallerMenu:
             return
 
     async def _install_upgrade(self):
-        while True:
-            await self._install_upgrade_internal()
-            await self._main_menu()
+        from .prepare import BackgroundPreparation
+        from .verify import VERIFY_OFF
+
+        await self._finish_resilver()
+
+        # 用户选择磁盘期间在后台挂载安装映像等（不会修改任何磁盘），取消或安装结束后清理
+        preparation = BackgroundPreparation(verify=self.installer.verify_image != VERIFY_OFF)
+        preparation.start()
+        try:
+            await self._install_upgrade_internal(preparation)
+        finally:
+            await preparation.close()
 
-    async def _install_upgrade_internal(self):
+    async def _install_upgrade_internal(self, preparation=None):
         logger.info("Starting install/upgrade process")
-        disks = await list_disks()
+        snapshot = await self.disk_inventory.snapshot()
+        disks = snapshot.disks
         vendor = self.installer.vendor
         logger.info(f"Detected disks: {[d.name for d in disks]}")
 
@@ -106,7 +142,7 @@ class InstallerMenu:
                             disk.model[:15].ljust(15, " "),
                             disk.label[:15].ljust(15, " "),
                             "--",
-                            humanfriendly.format_size(disk.size, binary=True),
+                            format_size(disk.size),
                         ]
                     )
                     for disk in disks
@@ -173,11 +209,11 @@ class InstallerMenu:
         # 获取选中磁盘的总容量
         selected_disks = [d for d in disks if d.name in destination_disks]
         total_size = sum(d.size for d in selected_disks)
-        total_size_str = humanfriendly.format_size(total_size, binary=True)
+        total_size_str = format_size(total_size)
         # 获取最小容量硬盘并按百分比计算
         min_disk = min(selected_disks, key=lambda d: d.size)
         min_disk_size = min_disk.size
-        min_disk_size_str = humanfriendly.format_size(min_disk_size, binary=True)
+        min_disk_size_str = format_size(min_disk_size)
 
         # 让用户选择分区方式
         partition_choice = await dialog_radiolist(
@@ -196,7 +232,7 @@ class InstallerMenu:
         use_full_disk = (partition_choice == "full")
         system_partition_percentage = 100  # 默认使用全部
         min_disk_system_size = min_disk_size * system_partition_percentage // 100
-        min_disk_system_size_str = humanfriendly.format_size(min_disk_system_size, binary=True)
+        min_disk_system_size_str = format_size(min_disk_system_size)
         
         if not use_full_disk:
             # 用户选择按百分比，询问百分比
@@ -215,12 +251,12 @@ class InstallerMenu:
                     if 1 <= percentage <= 100:
                         # 计算分区容量
                         system_size = total_size * percentage // 100
-                        system_size_str = humanfriendly.format_size(system_size, binary=True)
+                        system_size_str = format_size(system_size)
                         remaining_size = total_size - system_size
-                        remaining_size_str = humanfriendly.format_size(remaining_size, binary=True)
+                        remaining_size_str = format_size(remaining_size)
                         
                         min_disk_system_size = min_disk_size * percentage // 100
-                        min_disk_system_size_str = humanfriendly.format_size(min_disk_system_size, binary=True)                        
+                        min_disk_system_size_str = format_size(min_disk_system_size)                        
                                                 
                         # 显示计算结果并让用户确认
                         confirm_text = _(
@@ -243,39 +279,109 @@ class InstallerMenu:
                 except ValueError:
                     await dialog_msgbox(_("error"), _("percentage_invalid_error"))
 
+        from .install import install
+        from .wipe import discard_max_bytes
+
+        # SSD 支持 TRIM 时，询问是否在安装前 discard 整个磁盘
+        discard = False
+        if discard_disks := [d.name for d in selected_disks if discard_max_bytes(d.name) > 0]:
+            discard = await dialog_yesno(_("discard_title"), _("discard_prompt", disks=", ".join(discard_disks)))
+
+        # 多块磁盘时可以先安装到第一块磁盘，安装完成后再挂载其余磁盘为镜像并在后台同步
+        fast_mirror = False
+        if len(destination_disks) > 1:
+            fast_mirror = await dialog_yesno(
+                _("fast_mirror_title"),
+                _("fast_mirror_prompt", disk=destination_disks[0], disks=", ".join(destination_disks[1:])),
+            )
+
         # 将选择存入变量（供后续安装使用）
         # use_full_disk: 是否使用整个磁盘
         # system_partition_percentage: 系统分区占用的百分比
 
+        if not self.disk_inventory.is_current(snapshot):
+            logger.warning("Disks changed while the installation was being configured")
+            await dialog_msgbox(_("choose_destination"), _("disks_changed"))
+            return False
+
         try:
             logger.info(f"Starting installation to disks: {destination_disks}")
             logger.info(f"Starting installation wipe_disks: {wipe_disks}")
-            await install(
-                self._select_disks(disks, destination_disks),
-                self._select_disks(disks, wipe_disks),
-                system_partition_percentage,
-                min_disk_system_size,
-                self._callback,
-                self.installer.version,
-                get_language(),
-            )
+            with suspended_ui():
+                self.progress_renderer.start()
+                try:
+                    self.resilver = await install(
+                        self._select_disks(disks, destination_disks),
+                        self._select_disks(disks, wipe_disks),
+                        system_partition_percentage,
+                        min_disk_system_size,
+                        self._callback,
+                        self.installer.version,
+                        get_language(),
+                        discard=discard,
+                        prepared=preparation,
+                        verify=self.installer.verify_image,
+                        engine=self.installer.install_engine,
+                        fast_mirror=fast_mirror,
+                    )
+                finally:
+                    await self.progress_renderer.stop()
             logger.info("Installation completed successfully")
+            self.disk_inventory.invalidate()
         except InstallError as e:
             logger.error(f"Installation failed: {e.message}")
+            self.disk_inventory.invalidate()
             await dialog_msgbox(_("installation_error"), e.message)
             return False
 
-        await dialog_msgbox(
-            _("installation_succeeded"),
-            _(
-                "installation_succeeded_msg",
-                vendor=self.installer.vendor,
-                disks=", ".join(destination_disks)
-            ),
-        )
+        message = _("installation_succeeded_msg", vendor=self.installer.vendor, disks=", ".join(destination_disks))
+        if self.resilver is not None:
+            message += _("resilver_in_progress", disks=", ".join(destination_disks[1:]))
+        await dialog_msgbox(_("installation_succeeded"), message)
+
+        if self.resilver is not None:
+            await self._watch_resilver()
         return True
 
-    def _select_disks(self, disks: list[Disk], disks_names: list[str]):
+    async def _watch_resilver(self):
+        """在控制台显示镜像同步进度，直到同步完成或用户按下 Enter；之后同步在后台继续"""
+        self.resilver.start(self._callback)
+        with suspended_ui():
+            sys.stdout.write(_("resilver_watch_hint") + "\n")
+            sys.stdout.flush()
+            self.progress_renderer.start()
+            try:
+                done = asyncio.create_task(self.resilver.wait())
+                enter = asyncio.create_task(self._wait_for_enter())
+                await asyncio.wait([done, enter], return_when=asyncio.FIRST_COMPLETED)
+                for task in [done, enter]:
+                    task.cancel()
+            finally:
+                await self.progress_renderer.stop()
+
+    async def _wait_for_enter(self):
+        loop = asyncio.get_running_loop()
+        fd = sys.stdin.fileno()
+        pressed = asyncio.Event()
+        loop.add_reader(fd, pressed.set)
+        try:
+            await pressed.wait()
+        finally:
+            loop.remove_reader(fd)
+            # 丢弃已输入的内容，避免影响随后显示的菜单
+            with contextlib.suppress(termios.error):
+                termios.tcflush(fd, termios.TCIFLUSH)
+
+    async def _finish_resilver(self):
+        """导出仍在同步的启动池，同步会在安装的系统导入该池后继续"""
+        if self.resilver is not None:
+            resilver, self.resilver = self.resilver, None
+            try:
+                await resilver.close()
+            except Exception as e:
+                logger.warning(f"Unable to export the boot pool: {e!r}")
+
+    def _select_disks(self, disks: list["Disk"], disks_names: list[str]):
         disks_dict = {disk.name: disk for disk in disks}
         return [disks_dict[disk_name] for disk_name in disks_names]
 
@@ -297,19 +403,27 @@ class InstallerMenu:
 
     async def _shell(self):
         logger.info("User exited to shell")
+        await self._finish_resilver()
+        close_ui()
+        shutdown_logging()
         os._exit(1)
 
     async def _reboot(self):
         logger.info("System reboot requested")
-        process = await asyncio.create_subprocess_exec("reboot")
-        await process.communicate()
+        await self._finish_resilver()
+        await asyncio.get_running_loop().run_in_executor(None, flush_logging)
+        with suspended_ui():
+            process = await asyncio.create_subprocess_exec("reboot")
+            await process.communicate()
 
     async def _shutdown(self):
         logger.info("System shutdown requested")
-        process = await asyncio.create_subprocess_exec("shutdown", "now")
-        await process.communicate()
+        await self._finish_resilver()
+        await asyncio.get_running_loop().run_in_executor(None, flush_logging)
+        with suspended_ui():
+            process = await asyncio.create_subprocess_exec("shutdown", "now")
+            await process.communicate()
 
     def _callback(self, progress, message):
-        logger.info(f"[{int(progress * 100)}%] {message}")
-        sys.stdout.write(f"[{int(progress * 100)}%] {message}\n")
-        sys.stdout.flush()
+        progress_logger.info(f"[{int(progress * 100)}%] {message}")
+        self.progress_renderer.update(progress, message)
@@ -0,0 +1,141 @@
+import asyncio
+from dataclasses import dataclass
+import time
+
+from .disks import IGNORED_DISK_PREFIXES, Disk, disk_from_blockdevice, list_disks, read_sysfs_blockdevices
+from .logger import logger
+from .mounts import MountIndex
+from .uevent import Uevent, UeventSource, get_uevent_source
+from .utils import run
+
+__all__ = ["DiskInventory", "DiskSnapshot"]
+
+# Safety net for missed uevents. Without a uevent source, the inventory is refreshed on every snapshot.
+DISK_INVENTORY_TTL = 60
+
+
+@dataclass(frozen=True)
+class DiskSnapshot:
+    generation: int
+    disks: list[Disk]
+
+
+class DiskInventory:
+    """
+    Long-lived cache of `list_disks()`.
+
+    The cache is fully refreshed when `ttl` expires and only the affected disks are re-read when block
+    uevents arrive. `generation` is incremented every time a disk is added or removed, or its size or model
+    changes, so a caller holding a `DiskSnapshot` can check whether it is still current. Other changes
+    (partition table rescans, labels) are picked up by the next snapshot without invalidating the current one.
+    """
+
+    def __init__(self, ttl: float = DISK_INVENTORY_TTL, uevents: UeventSource | None = None):
+        self.ttl = ttl
+        self.uevents = uevents
+        self.generation = 0
+        self._disks = {}
+        self._refreshed_at = None
+        self._dirty = set()
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def start(self):
+        if self.uevents is None:
+            self.uevents = get_uevent_source()
+
+        if self.uevents is None:
+            self.ttl = 0
+        elif self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def invalidate(self):
+        self._refreshed_at = None
+        self.generation += 1
+
+    def is_current(self, snapshot: DiskSnapshot):
+        return snapshot.generation == self.generation
+
+    async def snapshot(self):
+        async with self._lock:
+            if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= self.ttl:
+                await self._refresh_all()
+            elif self._dirty:
+                await self._refresh_dirty()
+
+            return DiskSnapshot(self.generation, sorted(self._disks.values(), key=lambda x: x.name))
+
+    async def _refresh_all(self):
+        self._dirty.clear()
+        self._refreshed_at = time.monotonic()
+        disks = {disk.name: disk for disk in await list_disks()}
+        # Like `_refresh_dirty`, only disks being added, removed or resized invalidate the snapshots
+        if _identities(disks) != _identities(self._disks):
+            self.generation += 1
+
+        self._disks = disks
+
+    async def _refresh_dirty(self):
+        names = sorted(self._dirty)
+        self._dirty.clear()
+        logger.debug(f"Refreshing disk inventory for {names}")
+        # the udev database for the changed devices must be up to date
+        await run(["udevadm", "settle"])
+        try:
+            blockdevices = {blockdevice["name"]: blockdevice for blockdevice in read_sysfs_blockdevices(names=names)}
+        except OSError as e:
+            logger.warning(f"Unable to refresh disk inventory from sysfs: {e}")
+            return await self._refresh_all()
+
+        mount_index = MountIndex.build()
+        for name in names:
+            old = self._disks.get(name)
+            if name in blockdevices and (disk := disk_from_blockdevice(blockdevices[name], mount_index)):
+                self._disks[name] = disk
+            else:
+                disk = self._disks.pop(name, None)
+
+            if _identity(old) != _identity(disk):
+                self.generation += 1
+
+    async def _watch(self):
+        with self.uevents.subscribe() as events:
+            while True:
+                self._on_uevent(await events.get())
+                # Re-read the affected disks once a burst of uevents has been processed so that a size or
+                # model change invalidates the snapshots that are being held
+                if events.empty() and self._dirty and self._refreshed_at is not None:
+                    async with self._lock:
+                        if self._dirty:
+                            await self._refresh_dirty()
+
+    def _on_uevent(self, event: Uevent):
+        if event.subsystem != "block" or event.action not in ("add", "remove", "change"):
+            return
+
+        if event.devtype == "partition":
+            name = event.parent
+        elif event.devtype == "disk":
+            name = event.devname or event.devpath.rstrip("/").split("/")[-1]
+        else:
+            return
+
+        if name and not name.startswith(IGNORED_DISK_PREFIXES):
+            self._dirty.add(name)
+            # `change` uevents (i.e. partition table rescans) only invalidate snapshots if the refresh finds that
+            # the size or model of the disk changed
+            if event.devtype == "disk" and event.action in ("add", "remove"):
+                self.generation += 1
+
+
+def _identity(disk: Disk | None):
+    return None if disk is None else (disk.size, disk.model)
+
+
+def _identities(disks: dict[str, Disk]):
+    return {name: _identity(disk) for name, disk in disks.items()}
@@ -1,39 +1,219 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
 import sys
+import threading
+import time
 
 # 建议在 logger.py 顶层定义格式
 LOG_FORMAT = '%(asctime)s %(name)s[%(process)d]: %(levelname)s - %(message)s'
+# 文件写入由后台线程批量完成，最多每 FLUSH_INTERVAL 秒刷新一次
+FLUSH_INTERVAL = 1.0
+LOG_FILE = "/var/log/onenas-installer.log"
+# 结构化 JSON lines 日志，默认关闭，见 `enable_json_log`
+JSON_LOG_FILE = "/var/log/onenas-installer.jsonl"
 
-def get_file_logger(name="onenas-installer", log_file="/var/log/onenas-installer.log", level=logging.INFO):
+# logger name -> its background writer
+_listeners = {}
+
+
+class BufferedFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    File handler that only flushes its stream every `flush_interval` seconds (or on `sync()`/`close()`), so that
+    a burst of records results in a few large writes. Rotates when `max_bytes` is non-zero.
+    """
+
+    def __init__(self, filename, max_bytes=0, backup_count=0, flush_interval=FLUSH_INTERVAL):
+        super().__init__(filename, mode='a', maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.flush_interval = flush_interval
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        if time.monotonic() - self._last_sync >= self.flush_interval:
+            self.sync()
+
+    def sync(self):
+        super().flush()
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        self.sync()
+        super().close()
+
+
+class JSONLinesFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "time": record.created,
+            "logger": record.name,
+            "process": record.process,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class _Request:
+    """
+    Queued next to the log records and run by the listener thread once every record queued before it has been
+    handled. `done` is set when it has run.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.done = threading.Event()
+
+
+class FlushingQueueListener(logging.handlers.QueueListener):
+    """
+    Syncs the buffered handlers whenever no record has arrived for `flush_interval` seconds.
+    """
+
+    def __init__(self, records, *handlers, flush_interval=FLUSH_INTERVAL):
+        super().__init__(records, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+        self.running = False
+
+    def start(self):
+        super().start()
+        self.running = True
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            super().stop()
+
+    def request(self, func, timeout=None):
+        """
+        Run `func()` on the listener thread after the records queued so far and wait for it.
+        """
+        if not self.running:
+            func()
+            return True
+
+        request = _Request(func)
+        self.queue.put(request)
+        return request.done.wait(timeout)
+
+    def handle(self, record):
+        if isinstance(record, _Request):
+            try:
+                record.func()
+            finally:
+                record.done.set()
+            return
+
+        super().handle(record)
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, self.flush_interval)
+            except queue.Empty:
+                self.sync()
+
+    def sync(self):
+        for handler in self.handlers:
+            getattr(handler, "sync", handler.flush)()
+
+
+def get_file_logger(name="onenas-installer", log_file=LOG_FILE, level=logging.INFO,
+                    max_bytes=0, backup_count=0, json_log_file=None):
     logger = logging.getLogger(name)
     if logger.handlers:
         return logger
 
     logger.setLevel(level)
-    
+    formatter = logging.Formatter(LOG_FORMAT, datefmt='%m%d %H%M%S')
+    handlers = []
+
     # 尝试创建目录
     log_dir = os.path.dirname(log_file)
     try:
         os.makedirs(log_dir, mode=0o755, exist_ok=True)
         # 尝试创建 FileHandler
-        handler = logging.FileHandler(log_file, mode='a', encoding='utf-8')
+        handler = BufferedFileHandler(log_file, max_bytes, backup_count)
         # 尝试设置文件权限
         try:
             os.chmod(log_file, 0o644)
         except OSError:
             pass # 无法改权限但不影响写入，通常可忽略
-            
+
     except (OSError, PermissionError):
         # 彻底回退到 stderr
         handler = logging.StreamHandler(sys.stderr)
         print(f"Warning: Cannot write to {log_file}, logging to stderr instead.", file=sys.stderr)
+        json_log_file = None
 
-    formatter = logging.Formatter(LOG_FORMAT, datefmt='%m%d %H%M%S')
     handler.setFormatter(formatter)
-    logger.addHandler(handler)
-    
+    handlers.append(handler)
+
+    # 结构化 JSON lines 日志（可选）
+    if json_log_file is not None and (json_handler := _json_handler(json_log_file, max_bytes, backup_count)):
+        handlers.append(json_handler)
+
+    # 日志记录只放入队列，由后台线程写入文件，避免阻塞 asyncio 事件循环
+    records = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    listener = FlushingQueueListener(records, *handlers)
+    listener.start()
+    _listeners[name] = listener
+
     return logger
 
+
+def _json_handler(json_log_file, max_bytes=0, backup_count=0):
+    try:
+        handler = BufferedFileHandler(json_log_file, max_bytes, backup_count)
+    except OSError as e:
+        print(f"Warning: Cannot write to {json_log_file}: {e}", file=sys.stderr)
+        return None
+
+    handler.setFormatter(JSONLinesFormatter())
+    return handler
+
+
+def enable_json_log(json_log_file=JSON_LOG_FILE, name="onenas-installer"):
+    """
+    Also write the `name` log as JSON lines to `json_log_file`.
+    """
+    if (listener := _listeners.get(name)) is None or (handler := _json_handler(json_log_file)) is None:
+        return
+
+    # The handlers are only used by the listener thread, change them from there
+    listener.request(lambda: setattr(listener, "handlers", listener.handlers + (handler,)))
+
+
+def flush_logging(timeout=None):
+    """
+    Wait until every queued record has been written and synced to disk. Blocks: from the event loop, run it in an
+    executor.
+    """
+    for listener in list(_listeners.values()):
+        listener.request(listener.sync, timeout)
+
+
+def shutdown_logging():
+    """
+    Write all queued records and close the log files. Must be called before `os._exit`, which skips `atexit`.
+    """
+    while _listeners:
+        name, listener = _listeners.popitem()
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(shutdown_logging)
+
 # 在 logger.py 末尾直接初始化一个全局实例
-logger = get_file_logger(name="onenas-installer", log_file="/var/log/onenas-installer.log", level=logging.DEBUG)
\ No newline at end of file
+logger = get_file_logger(name="onenas-installer", log_file=LOG_FILE, level=logging.DEBUG)
+# 高频的安装进度日志
+progress_logger = logger.getChild("progress")
@@ -0,0 +1,85 @@
+import os
+
+from . import utils
+
+__all__ = ["MountIndex"]
+
+
+class MountIndex:
+    """
+    Set of disks that are in use by a mounted filesystem, either directly, through one of their partitions,
+    or through a device-mapper/md device stacked on top of them (see `/sys/block/*/holders`).
+    """
+
+    def __init__(self, busy: set[str]):
+        self.busy = busy
+
+    def is_mounted(self, disk_name: str):
+        return disk_name in self.busy
+
+    @classmethod
+    def build(cls, mountinfo: str = "/proc/self/mountinfo", sys_block: str | None = None):
+        sys_block = sys_block or utils.SYS_BLOCK
+        # `major:minor` and device name of every block device -> whole disks backing it
+        by_dev = {}
+        by_name = {}
+        for disk in os.listdir(sys_block):
+            disk_path = os.path.join(sys_block, disk)
+            nodes = [(disk, disk_path)]
+            try:
+                with os.scandir(disk_path) as entries:
+                    nodes.extend(
+                        (entry.name, entry.path) for entry in entries
+                        if entry.is_dir() and os.path.exists(os.path.join(entry.path, "partition"))
+                    )
+            except FileNotFoundError:
+                continue
+
+            for name, path in nodes:
+                for holder_name, holder_path in [(name, path)] + _holders(sys_block, path):
+                    by_name.setdefault(holder_name, set()).add(disk)
+                    if (dev := _read_dev(holder_path)) is not None:
+                        by_dev.setdefault(dev, set()).add(disk)
+
+        busy = set()
+        with open(mountinfo) as f:
+            for line in f:
+                fields = line.split()
+                # 36 35 98:0 /mnt1 /mnt2 rw,noatime master:1 - ext3 /dev/root rw,errors=continue
+                busy |= by_dev.get(fields[2], set())
+                try:
+                    source = fields[fields.index("-", 6) + 2]
+                except (ValueError, IndexError):
+                    continue
+
+                if source.startswith("/dev/"):
+                    # Resolves `/dev/mapper/*`, `/dev/disk/by-*/*`, etc.
+                    busy |= by_name.get(os.path.basename(os.path.realpath(source)), set())
+
+        return cls(busy)
+
+
+def _holders(sys_block, path, seen=None):
+    seen = set() if seen is None else seen
+    holders = []
+    try:
+        names = os.listdir(os.path.join(path, "holders"))
+    except FileNotFoundError:
+        return holders
+
+    for name in names:
+        if name not in seen:
+            seen.add(name)
+            holder_path = os.path.join(sys_block, name)
+            holders.append((name, holder_path))
+            holders.extend(_holders(sys_block, holder_path, seen))
+
+    return holders
+
+
+def _read_dev(path):
+    try:
+        with open(os.path.join(path, "dev")) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
@@ -1,13 +1,19 @@
-from dataclasses import dataclass
+import asyncio
+import contextlib
+from dataclasses import dataclass, field
 import ipaddress
 import logging
 
 from pyroute2 import IPRoute, NetlinkDumpInterrupted
+from pyroute2.netlink.rtnl import RTMGRP_IPV4_IFADDR, RTMGRP_IPV6_IFADDR, RTMGRP_LINK
 
 logger = logging.getLogger(__name__)
 
 
-__all__ = ["list_network_interfaces", "get_available_ip_addresses", "get_interface_ips"]
+__all__ = [
+    "NetworkState", "NetworkStateCache", "list_network_interfaces", "get_available_ip_addresses", "get_interface_ips",
+    "get_network_state_cache",
+]
 
 
 @dataclass
@@ -15,12 +21,43 @@ class NetworkInterface:
     name: str
 
 
-async def list_network_interfaces():
+# A single rtnetlink socket is shared by every query
+_ipr = None
+
+
+def _get_ipr():
+    global _ipr
+    if _ipr is None:
+        _ipr = IPRoute()
+
+    return _ipr
+
+
+def _close_ipr():
+    global _ipr
+    if _ipr is not None:
+        try:
+            _ipr.close()
+        except Exception:
+            pass
+
+        _ipr = None
+
+
+def _dump(method):
+    try:
+        return _retry_dump(getattr(_get_ipr(), method))
+    except OSError:
+        # The socket is unusable, open a new one on the next query
+        _close_ipr()
+        raise
+
+
+def _retry_dump(dump):
     max_retries = 3
     for attempt in range(1, max_retries + 1):
         try:
-            with IPRoute() as ipr:
-                interfaces = [NetworkInterface(dev.get_attr("IFLA_IFNAME")) for dev in ipr.get_links()]
+            return list(dump())
         except NetlinkDumpInterrupted:
             if attempt < max_retries:
                 # When the kernel is producing a dump of a kernel structure
@@ -35,9 +72,21 @@ async def list_network_interfaces():
             else:
                 raise
 
+
+def _interface_names():
+    """
+    Returns {ifindex: name} built from a single link dump.
+    """
+    return {link["index"]: link.get_attr("IFLA_IFNAME") for link in _dump("get_links")}
+
+
+async def list_network_interfaces():
+    if (cache := get_network_state_cache()) is not None:
+        return cache.state.network_interfaces
+
     return [
-        interface for interface in interfaces
-        if interface.name not in ["lo"]
+        NetworkInterface(name) for name in _interface_names().values()
+        if name not in ["lo"]
     ]
 
 
@@ -75,73 +124,81 @@ async def _get_ip_addresses_with_filter(interface_filter=None):
     Returns:
         dict: {"ipv4": [...], "ipv6": [...]}
     """
+    if (cache := get_network_state_cache()) is not None:
+        return cache.state.ip_addresses(interface_filter)
+
     result = {"ipv4": [], "ipv6": []}
 
-    max_retries = 3
-    for attempt in range(1, max_retries + 1):
-        try:
-            with IPRoute() as ipr:
-                # Get all addresses
-                addresses = ipr.get_addr()
-
-                for addr in addresses:
-                    # Get the IP address
-                    ip_str = addr.get_attr("IFA_ADDRESS")
-                    if not ip_str:
-                        continue
-
-                    # Get the interface index and name
-                    if_index = addr["index"]
-                    try:
-                        link = ipr.get_links(if_index)[0]
-                        if_name = link.get_attr("IFLA_IFNAME")
-
-                        # Apply interface filter
-                        if interface_filter is None:
-                            # Skip loopback for "all interfaces" mode
-                            if if_name == "lo":
-                                continue
-                        else:
-                            # Check if interface is in the filter list
-                            if if_name not in interface_filter:
-                                continue
-                    except (IndexError, KeyError):
-                        continue
-
-                    try:
-                        ip_obj = ipaddress.ip_address(ip_str)
-
-                        # Check if IP is valid for connections
-                        if not _is_valid_ip_for_connection(ip_obj):
-                            continue
-
-                        # Add to appropriate list
-                        if isinstance(ip_obj, ipaddress.IPv4Address):
-                            if ip_str not in result["ipv4"]:
-                                result["ipv4"].append(ip_str)
-                        elif isinstance(ip_obj, ipaddress.IPv6Address):
-                            if ip_str not in result["ipv6"]:
-                                result["ipv6"].append(ip_str)
-
-                    except ValueError:
-                        # Invalid IP address, skip
-                        continue
-
-            # Success, break out of retry loop
-            break
+    try:
+        # One link dump and one address dump, joined on the interface index
+        if_names = _interface_names()
+        addresses = _dump("get_addr")
+    except NetlinkDumpInterrupted:
+        logger.error("Failed to get IP addresses after retries due to NetlinkDumpInterrupted")
+        return result
+    except Exception as e:
+        if interface_filter:
+            logger.error("Error getting IP addresses for interfaces %s: %s", interface_filter, e, exc_info=True)
+        else:
+            logger.error("Error getting IP addresses: %s", e, exc_info=True)
+        return result
+
+    return _filter_ip_addresses(
+        if_names,
+        ((addr["index"], addr.get_attr("IFA_ADDRESS")) for addr in addresses),
+        interface_filter,
+    )
+
+
+def _filter_ip_addresses(if_names, addresses, interface_filter=None):
+    """
+    Args:
+        if_names: {ifindex: name}
+        addresses: iterable of (ifindex, ip_str)
+        interface_filter: None to get all interfaces, or a list of interface names to filter
 
-        except NetlinkDumpInterrupted:
-            if attempt < max_retries:
+    Returns:
+        dict: {"ipv4": [...], "ipv6": [...]}
+    """
+    result = {"ipv4": [], "ipv6": []}
+
+    if interface_filter is not None:
+        interface_filter = set(interface_filter)
+
+    seen = set()
+    for if_index, ip_str in addresses:
+        if not ip_str or ip_str in seen:
+            continue
+
+        # Get the interface name
+        if_name = if_names.get(if_index)
+        if if_name is None:
+            continue
+
+        # Apply interface filter
+        if interface_filter is None:
+            # Skip loopback for "all interfaces" mode
+            if if_name == "lo":
                 continue
-            else:
-                logger.error("Failed to get IP addresses after %d retries due to NetlinkDumpInterrupted", max_retries)
-                return result
-        except Exception as e:
-            if interface_filter:
-                logger.error("Error getting IP addresses for interfaces %s: %s", interface_filter, e, exc_info=True)
-            else:
-                logger.error("Error getting IP addresses: %s", e, exc_info=True)
-            return result
+        elif if_name not in interface_filter:
+            continue
+
+        try:
+            ip_obj = ipaddress.ip_address(ip_str)
+        except ValueError:
+            # Invalid IP address, skip
+            continue
+
+        # Check if IP is valid for connections
+        if not _is_valid_ip_for_connection(ip_obj):
+            continue
+
+        seen.add(ip_str)
+        # Add to appropriate list
+        if isinstance(ip_obj, ipaddress.IPv4Address):
+            result["ipv4"].append(ip_str)
+        elif isinstance(ip_obj, ipaddress.IPv6Address):
+            result["ipv6"].append(ip_str)
 
     return result
 
@@ -169,10 +226,155 @@ async def get_interface_ips(interface_names):
     """
     # First validate that all requested interfaces exist
     available_interfaces = await list_network_interfaces()
-    available_names = [iface.name for iface in available_interfaces]
+    available_names = {iface.name for iface in available_interfaces}
 
     for name in interface_names:
         if name not in available_names:
             raise ValueError(f"Interface '{name}' not found")
 
     return await _get_ip_addresses_with_filter(interface_filter=interface_names)
+
+
+@dataclass(frozen=True)
+class NetworkState:
+    generation: int = 0
+    # {ifindex: name}
+    interfaces: dict = field(default_factory=dict)
+    # {ifindex: frozenset of IP addresses}
+    addresses: dict = field(default_factory=dict)
+    # Precomputed `get_available_ip_addresses()` result
+    available_ip_addresses: dict = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "available_ip_addresses", _filter_ip_addresses(self.interfaces, self._address_pairs()))
+
+    @property
+    def network_interfaces(self):
+        return [NetworkInterface(name) for name in self.interfaces.values() if name not in ["lo"]]
+
+    def ip_addresses(self, interface_filter=None):
+        if interface_filter is None:
+            return self.available_ip_addresses
+
+        return _filter_ip_addresses(self.interfaces, self._address_pairs(), interface_filter)
+
+    def _address_pairs(self):
+        return ((if_index, ip_str) for if_index, ips in self.addresses.items() for ip_str in sorted(ips))
+
+
+class NetworkStateCache:
+    """
+    In-memory table of network interfaces and their addresses, kept up to date by rtnetlink link/address
+    notifications instead of repeated dumps. `state` is an immutable `NetworkState` snapshot that is replaced on
+    every change; `subscribe()` yields a queue that receives every new snapshot.
+    """
+
+    def __init__(self):
+        self.state = NetworkState()
+        # Event loop the notifications are read from
+        self.loop = None
+        self._ipr = None
+        self._subscriptions = set()
+
+    def start(self):
+        # Subscribe before dumping so that no change is lost in between. The dumps use the shared query socket:
+        # pyroute2 would buffer the notifications received on the subscribed socket while it reads a dump, and
+        # these buffered messages would not wake up the event loop reader. On a socket of their own they stay in
+        # the kernel queue until `_on_readable` reads them (replaying a change that the dump already contains is
+        # harmless).
+        ipr = IPRoute()
+        try:
+            ipr.bind(groups=RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR)
+            interfaces = _interface_names()
+            addresses = {}
+            for addr in _dump("get_addr"):
+                if ip_str := addr.get_attr("IFA_ADDRESS"):
+                    addresses.setdefault(addr["index"], set()).add(ip_str)
+        except Exception:
+            ipr.close()
+            raise
+
+        self._ipr = ipr
+        self._publish(interfaces, _freeze(addresses))
+        self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(ipr.fileno(), self._on_readable)
+
+    def close(self):
+        if self._ipr is not None:
+            if not self.loop.is_closed():
+                self.loop.remove_reader(self._ipr.fileno())
+            self._ipr.close()
+            self._ipr = None
+            self.loop = None
+
+    @contextlib.contextmanager
+    def subscribe(self):
+        queue = asyncio.Queue()
+        self._subscriptions.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscriptions.discard(queue)
+
+    def _on_readable(self):
+        interfaces = dict(self.state.interfaces)
+        addresses = {if_index: set(ips) for if_index, ips in self.state.addresses.items()}
+        try:
+            messages = self._ipr.get()
+        except Exception as e:
+            logger.error("Error reading rtnetlink notifications: %s", e, exc_info=True)
+            return
+
+        for msg in messages:
+            event = msg.get("event")
+            if_index = msg.get("index")
+            if event == "RTM_NEWLINK":
+                interfaces[if_index] = msg.get_attr("IFLA_IFNAME")
+            elif event == "RTM_DELLINK":
+                interfaces.pop(if_index, None)
+                addresses.pop(if_index, None)
+            elif event in ("RTM_NEWADDR", "RTM_DELADDR") and (ip_str := msg.get_attr("IFA_ADDRESS")):
+                if event == "RTM_NEWADDR":
+                    addresses.setdefault(if_index, set()).add(ip_str)
+                else:
+                    addresses.get(if_index, set()).discard(ip_str)
+
+        addresses = _freeze(addresses)
+        if interfaces != self.state.interfaces or addresses != self.state.addresses:
+            self._publish(interfaces, addresses)
+
+    def _publish(self, interfaces, addresses):
+        state = NetworkState(self.state.generation + 1, interfaces, addresses)
+        self.state = state
+        for queue in list(self._subscriptions):
+            queue.put_nowait(state)
+
+
+def _freeze(addresses):
+    return {if_index: frozenset(ips) for if_index, ips in addresses.items() if ips}
+
+
+_cache = None
+
+
+def get_network_state_cache():
+    """
+    Returns a shared, started `NetworkStateCache` bound to the running event loop, or `None` if rtnetlink
+    notifications can't be received, in which case the callers fall back to dumps.
+    """
+    global _cache
+    if _cache is not None and _cache.loop is not asyncio.get_running_loop():
+        _cache.close()
+        _cache = None
+
+    if _cache is None:
+        cache = NetworkStateCache()
+        try:
+            cache.start()
+        except Exception as e:
+            logger.warning("Unable to subscribe to rtnetlink notifications: %s", e)
+            return None
+
+        _cache = cache
+
+    return _cache
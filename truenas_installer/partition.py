@@ -0,0 +1,109 @@
+from dataclasses import dataclass, field
+
+from .logger import logger
+from .utils import run
+
+__all__ = ["Partition", "PartitionLayout", "apply_layout", "bios_layout", "uefi_layout"]
+
+# Legacy BIOS bootable attribute of a GPT partition
+GPT_LEGACY_BIOS_BOOTABLE = 2
+
+
+@dataclass
+class Partition:
+    number: int
+    # `sgdisk` type code for GPT layouts, `sfdisk` type for DOS layouts
+    type: str
+    # MiB, `None` takes the rest of the disk
+    size: int | None = None
+    # MiB, `None` starts right after the previous partition
+    start: int | None = None
+    bootable: bool = False
+
+
+@dataclass
+class PartitionLayout:
+    # "gpt" or "dos"
+    label: str
+    partitions: list[Partition] = field(default_factory=list)
+    # `sgdisk` sector alignment (GPT only)
+    alignment: int | None = None
+
+    @property
+    def numbers(self):
+        return [partition.number for partition in self.partitions]
+
+    def render(self, device: str):
+        """
+        Returns the command (and its stdin) that writes the whole partition table of `device` at once.
+        """
+        if self.label == "gpt":
+            return self._sgdisk_args(device), None
+        elif self.label == "dos":
+            return ["sfdisk", device], self._sfdisk_script()
+        else:
+            raise ValueError(f"Invalid partition table label: {self.label!r}")
+
+    def _sgdisk_args(self, device):
+        args = ["sgdisk"]
+        if self.alignment is not None:
+            args.append(f"-a{self.alignment}")
+
+        for p in self.partitions:
+            start = "0" if p.start is None else f"{p.start}m"
+            end = "0" if p.size is None else f"+{p.size}m"
+            args.extend([f"-n{p.number}:{start}:{end}", f"-t{p.number}:{p.type}"])
+            if p.bootable:
+                args.append(f"-A{p.number}:set:{GPT_LEGACY_BIOS_BOOTABLE}")
+
+        return args + [device]
+
+    def _sfdisk_script(self):
+        lines = ["label: dos"]
+        for p in self.partitions:
+            fields = []
+            if p.start is not None:
+                fields.append(f"start={p.start}MiB")
+            fields.append("size=+" if p.size is None else f"size={p.size}MiB")
+            fields.append(f"type={p.type}")
+            if p.bootable:
+                fields.append("bootable")
+            lines.append(", ".join(fields))
+
+        return "\n".join(lines) + "\n"
+
+
+def uefi_layout(system_pct: int, system_size_mib: int):
+    if system_pct == 100:
+        partitions = [Partition(2, "BF01")]
+    else:
+        partitions = [Partition(2, "BF00", system_size_mib), Partition(3, "BF01")]
+
+    return PartitionLayout("gpt", [Partition(1, "ef00", 512, start=1)] + partitions)
+
+
+def bios_layout(system_pct: int, system_size_mib: int):
+    if system_pct == 100:
+        partitions = [Partition(2, "83", start=513)]
+    else:
+        partitions = [
+            Partition(2, "83", system_size_mib, start=513),
+            Partition(3, "83", start=513 + system_size_mib),
+        ]
+
+    return PartitionLayout("dos", [Partition(1, "83", 512, start=1, bootable=True)] + partitions)
+
+
+async def apply_layout(layout: PartitionLayout, device: str, dry_run: bool = False):
+    """
+    Write `layout` to `device` with a single `sgdisk`/`sfdisk` invocation.
+
+    `dry_run`: only render the command, the disk is not touched.
+    """
+    args, script = layout.render(device)
+    if dry_run:
+        logger.info(f"Dry run: {' '.join(args)}" + (f"\n{script}" if script else ""))
+        return args, script
+
+    await run(args, input=script)
+    return args, script
@@ -0,0 +1,144 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from typing import Callable
+
+from .image import MIN_FREE_MEMORY, STRATEGY_LOOP, STRATEGY_TMPFS, MountedImage, mem_available, mount_image
+from .install import check_boot_mode
+from .logger import logger
+from .tracing import tracer
+from .verify import manifest_path, verify_image_async
+
+__all__ = ["BackgroundPreparation"]
+
+WARM_CHUNK_SIZE = 4 * 1024 ** 2
+
+
+class BackgroundPreparation:
+    """
+    Non-destructive installation work started as soon as the install menu is opened, while the operator is
+    still going through the dialogs: resolving the boot mode, mounting the installation image read-only (which
+    measures the boot medium and may stage the image in RAM), verifying it against its manifest and warming its
+    page cache. The steps that read the image run one after the other: concurrent reads of the same slow medium
+    would be slower than sequential ones and would skew the throughput measurement the staging decision relies on.
+
+    Nothing here touches the destination disks. `close()` cancels whatever is still running and unmounts the
+    image, it must be called once the installation is finished or cancelled.
+
+    `verify`: `False` if the installation will not verify the image.
+    """
+
+    def __init__(self, image: str | None = None, verify: bool = True):
+        self.image_path = image
+        self.verify = verify
+        self.boot_mode = None
+        self.image: MountedImage | None = None
+        # Progress of the background work is forwarded here once the installation has started
+        self.callback = None
+        # `verify_image_async` result, awaited by the installation
+        self.verification = None
+        # `time.monotonic()` when the preparation started, the installation trace includes what was done since
+        self.started_at = None
+        self._stack = contextlib.AsyncExitStack()
+        self._mount = None
+        self._task = None
+        self._cancelled = threading.Event()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._mount = asyncio.create_task(self._mount_image())
+        if self.verify:
+            self.verification = asyncio.create_task(self._verify())
+        self._task = asyncio.create_task(self._prepare())
+
+    async def wait(self, callback: Callable | None = None) -> MountedImage | None:
+        """
+        Wait for the preparation to finish, forwarding its progress to `callback` in the meantime.
+
+        Returns `None` if the image could not be prepared, in which case the installation mounts it itself.
+        """
+        if callback is not None:
+            self.callback = callback
+        if self._task is None:
+            return None
+
+        try:
+            await asyncio.shield(self._task)
+        except Exception as e:
+            logger.warning(f"Background preparation failed: {e!r}")
+            return None
+
+        return self.image
+
+    async def close(self):
+        self._cancelled.set()
+        for task in [self._task, self.verification, self._mount]:
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._task = self.verification = self._mount = None
+
+        await self._stack.aclose()
+        self.image = None
+
+    async def _mount_image(self):
+        self.boot_mode = check_boot_mode()
+        self.image = await self._stack.enter_async_context(mount_image(self._report, self.image_path))
+
+    async def _verify(self):
+        # The image is verified once it is mounted, even if mounting it failed. A copy staged in tmpfs is verified
+        # instead of the image: it is read from RAM, and it is what will be installed.
+        await asyncio.wait([self._mount])
+        with tracer.span("background_verify_image"):
+            if self.image is not None and self.image.strategy == STRATEGY_TMPFS:
+                return await verify_image_async(self._report, self.image.backing, manifest_path(self.image.source))
+
+            return await verify_image_async(self._report, self.image_path)
+
+    async def _prepare(self):
+        with tracer.span("background_preparation"):
+            await asyncio.shield(self._mount)
+            if self.verification is not None:
+                # Verification failures are reported by the installation, which waits for `verification` itself
+                await asyncio.wait([self.verification])
+
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._warm_page_cache)
+            except OSError as e:
+                logger.warning(f"Unable to warm the page cache of {self.image.loop_device}: {e}")
+
+        logger.info(f"Background preparation finished in {time.monotonic() - self.started_at:.1f}s")
+
+    def _report(self, progress, message):
+        if self.callback is not None:
+            self.callback(progress, message)
+
+    def _warm_page_cache(self):
+        """
+        Read the whole loop device once so that `truenas_install` reads the image from RAM. Images staged in tmpfs
+        already are in RAM, and the cache is not warmed if it would not fit next to the installation.
+        """
+        if self.image.strategy != STRATEGY_LOOP:
+            return
+
+        fd = os.open(self.image.loop_device, os.O_RDONLY)
+        try:
+            size = os.lseek(fd, 0, os.SEEK_END)
+            if mem_available() - size < MIN_FREE_MEMORY:
+                logger.info(f"Not warming the page cache of {self.image.loop_device}: not enough memory")
+                return
+
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            buffer = bytearray(WARM_CHUNK_SIZE)
+            offset = 0
+            while offset < size and not self._cancelled.is_set():
+                if not (read := os.preadv(fd, [buffer], offset)):
+                    break
+                offset += read
+        finally:
+            os.close(fd)
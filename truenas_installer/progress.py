@@ -0,0 +1,181 @@
+import asyncio
+import collections
+from dataclasses import dataclass
+import json
+import re
+import shutil
+import sys
+
+__all__ = ["ProgressReader", "ProgressRenderer", "ProgressResult"]
+
+# Maximum number of progress callbacks per second
+PROGRESS_RATE = 10
+# Number of non-protocol output lines kept for error messages
+OUTPUT_LINES = 200
+READ_SIZE = 64 * 1024
+# Longer lines are split, so that output that never ends a line does not grow the buffer without bound
+MAX_LINE_SIZE = 64 * 1024
+# Console progress gauge redraws per second
+RENDER_FPS = 10
+GAUGE_WIDTH = 20
+
+
+@dataclass
+class ProgressResult:
+    error: str | None
+    output: list[str]
+
+
+_line_end = re.compile(rb"[\r\n]")
+
+
+class ProgressReader:
+    """
+    Reads the `truenas_install` JSON-lines progress protocol from `reader`:
+
+        {"progress": 0.5, "message": "Installing packages"}
+        {"error": "Something went wrong"}
+
+    Progress frames are coalesced so that `callback(progress, message)` is called at most `rate` times per second
+    (the last frame is always delivered). Lines that are not protocol frames are kept in a bounded buffer.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, callback, rate: float = PROGRESS_RATE,
+                 output_lines: int = OUTPUT_LINES):
+        self.reader = reader
+        self.callback = callback
+        self.interval = 1 / rate
+        self.error = None
+        self.output = collections.deque(maxlen=output_lines)
+        self._last_emit = None
+        self._pending = None
+        self._timer = None
+
+    async def read(self):
+        buffer = bytearray()
+        try:
+            while chunk := await self.reader.read(READ_SIZE):
+                buffer += chunk
+                with memoryview(buffer) as view:
+                    start = 0
+                    # `\r` also ends a line: progress bars redraw themselves with it
+                    while (match := _line_end.search(buffer, start)) is not None:
+                        self._frame(view[start:match.start()])
+                        start = match.end()
+
+                    if len(buffer) - start > MAX_LINE_SIZE:
+                        self._frame(view[start:])
+                        start = len(buffer)
+
+                del buffer[:start]
+
+            if buffer:
+                with memoryview(buffer) as view:
+                    self._frame(view)
+        finally:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        self._flush()
+        return ProgressResult(self.error, list(self.output))
+
+    def _frame(self, frame: memoryview):
+        line = str(frame, "utf-8", "ignore")
+        if not line.lstrip().startswith("{"):
+            self._output(line)
+            return
+
+        try:
+            data = json.loads(line)
+        except ValueError:
+            self._output(line)
+            return
+
+        if "progress" in data and "message" in data:
+            self._progress(data["progress"], data["message"])
+        elif "error" in data:
+            self.error = data["error"]
+        else:
+            raise ValueError(f"Invalid truenas_install JSON: {data!r}")
+
+    def _output(self, line):
+        if line := line.rstrip("\r"):
+            self.output.append(line)
+
+    def _progress(self, progress, message):
+        self._pending = (progress, message)
+        loop = asyncio.get_running_loop()
+        if self._last_emit is None or loop.time() - self._last_emit >= self.interval:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_at(self._last_emit + self.interval, self._flush)
+
+    def _flush(self):
+        self._timer = None
+        if self._pending is not None:
+            progress, message = self._pending
+            self._pending = None
+            self._last_emit = asyncio.get_running_loop().time()
+            self.callback(progress, message)
+
+
+class ProgressRenderer:
+    """
+    Single-line console progress gauge.
+
+    `update()` only records the latest state, a background task redraws it at most `fps` times per second and
+    writes to the console from an executor thread, so a slow TTY never blocks the event loop.
+    """
+
+    def __init__(self, stream=None, fps: float = RENDER_FPS):
+        self.stream = stream or sys.stdout
+        self.interval = 1 / fps
+        self._state = None
+        self._drawn = None
+        self._task = None
+
+    def update(self, progress, message):
+        self._state = (progress, message)
+
+    def start(self):
+        self._state = self._drawn = None
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        await self._draw()
+        if self._drawn is not None:
+            await self._write("\n")
+
+    async def _run(self):
+        while True:
+            await self._draw()
+            await asyncio.sleep(self.interval)
+
+    async def _draw(self):
+        if (state := self._state) is not None and state != self._drawn:
+            self._drawn = state
+            await self._write(self.render(*state))
+
+    async def _write(self, text):
+        await asyncio.get_running_loop().run_in_executor(None, self._write_sync, text)
+
+    def _write_sync(self, text):
+        self.stream.write(text)
+        self.stream.flush()
+
+    @staticmethod
+    def render(progress, message):
+        progress = min(max(progress, 0), 1)
+        filled = int(progress * GAUGE_WIDTH)
+        line = f"[{'#' * filled}{'-' * (GAUGE_WIDTH - filled)}] {int(progress * 100):>3}% {message}"
+        # `\r` + erase line: the gauge is redrawn in place
+        return "\r\x1b[K" + line[:shutil.get_terminal_size().columns - 1]
@@ -0,0 +1,99 @@
+"""
+"Fast mirror" installs: the boot pool is created on the first disk only, the other disks are attached once the
+system is installed and resilver in the background.
+"""
+import asyncio
+from dataclasses import dataclass
+import re
+import subprocess
+from typing import Callable
+
+from .i18n import _
+from .logger import logger
+from .utils import run
+
+__all__ = ["ResilverMonitor", "ResilverStatus", "parse_resilver_status"]
+
+POLL_INTERVAL = 2.0
+
+RESILVER_IN_PROGRESS = "resilvering"
+RESILVER_DONE = "done"
+
+_percent_done = re.compile(r"([0-9.]+)% done")
+
+
+@dataclass
+class ResilverStatus:
+    state: str
+    # 0 - 100, `None` if not reported yet
+    percent: float | None = None
+
+
+def parse_resilver_status(output: str) -> ResilverStatus:
+    """
+    Parses `zpool status -p` output:
+
+          scan: resilver in progress since Fri Oct 17 10:00:00 2026
+                1234567 scanned at 123456/s, 234567 issued at 12345/s, 9876543 total
+                234567 resilvered, 12.34% done, 00:01:23 to go
+    """
+    if "resilver in progress" not in output:
+        return ResilverStatus(RESILVER_DONE, 100.0)
+
+    if m := _percent_done.search(output.split("resilver in progress", 1)[1]):
+        return ResilverStatus(RESILVER_IN_PROGRESS, float(m.group(1)))
+
+    return ResilverStatus(RESILVER_IN_PROGRESS)
+
+
+class ResilverMonitor:
+    """
+    Owns the imported boot pool while the attached disks resilver: `start()` polls the progress, `close()` exports
+    the pool (resilvering resumes when the installed system imports it).
+    """
+
+    def __init__(self, pool: str, disk: str, attached: list[str]):
+        self.pool = pool
+        # Disk the system was installed to and disks that are being resilvered
+        self.disk = disk
+        self.attached = attached
+        self.status = ResilverStatus(RESILVER_IN_PROGRESS)
+        self._task = None
+        self._done = asyncio.Event()
+
+    def start(self, callback: Callable):
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll(callback))
+
+    async def wait(self):
+        await self._done.wait()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+        if self.status.state != RESILVER_DONE:
+            logger.info(f"Exporting {self.pool} while resilvering ({self.status.percent}%), it resumes on boot")
+        await run(["zpool", "export", "-f", self.pool])
+
+    async def _poll(self, callback):
+        while True:
+            try:
+                output = (await run(["zpool", "status", "-p", self.pool])).stdout
+            except subprocess.CalledProcessError as e:
+                logger.warning(f"Unable to get the resilver status of {self.pool}: {e.stderr.rstrip()}")
+            else:
+                self.status = parse_resilver_status(output)
+                if self.status.percent is not None:
+                    callback(self.status.percent / 100, _("resilvering", percent=f"{self.status.percent:.1f}"))
+                if self.status.state == RESILVER_DONE:
+                    logger.info(f"Resilvering of {self.pool} finished")
+                    self._done.set()
+                    return
+
+            await asyncio.sleep(POLL_INTERVAL)
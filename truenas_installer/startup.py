@@ -0,0 +1,55 @@
+"""
+Startup import profile of `python3 -m truenas_installer` (`--profile-startup`).
+"""
+from dataclasses import dataclass
+import os
+import subprocess
+import sys
+
+__all__ = ["ENTRY_MODULE", "ImportTime", "measure_imports", "print_import_profile"]
+
+ENTRY_MODULE = "truenas_installer.__main__"
+
+
+@dataclass
+class ImportTime:
+    name: str
+    # Microseconds
+    self: int
+    cumulative: int
+
+
+def measure_imports(module=ENTRY_MODULE):
+    """
+    Import `module` in a fresh interpreter with `-X importtime` and return an `ImportTime` for every module it
+    imported, in import order.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        if self_us.strip().isdigit():
+            imports.append(ImportTime(name.strip(), int(self_us), int(cumulative_us)))
+
+    return imports
+
+
+def print_import_profile(limit=30, file=None):
+    imports = measure_imports()
+    total = next((i.cumulative for i in imports if i.name == ENTRY_MODULE), 0)
+    own = sum(i.self for i in imports if i.name.split(".")[0] == "truenas_installer")
+
+    print(f"{ENTRY_MODULE}: {total / 1000:.1f} ms, {len(imports)} modules, "
+          f"{own / 1000:.1f} ms in truenas_installer", file=file)
+    print(f"{'Self (ms)':>10} {'Cumulative (ms)':>16}  Module", file=file)
+    for i in sorted(imports, key=lambda x: -x.self)[:limit]:
+        print(f"{i.self / 1000:>10.1f} {i.cumulative / 1000:>16.1f}  {i.name}", file=file)
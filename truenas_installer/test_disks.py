@@ -0,0 +1,120 @@
+import json
+import os
+
+from truenas_installer.disks import disk_from_blockdevice, read_sysfs_blockdevices
+from truenas_installer.mounts import MountIndex
+
+# `lsblk -b -fJ -o name,fstype,label,rm,size,model` recorded on a test system
+LSBLK_OUTPUT = """\
+{
+   "blockdevices": [
+      {"name":"loop0", "fstype":"squashfs", "label":null, "rm":false, "size":1073741824, "model":null},
+      {"name":"nvme0n1", "fstype":null, "label":null, "rm":false, "size":256060514304, "model":"Samsung SSD 980 250GB",
+         "children": [
+            {"name":"nvme0n1p1", "fstype":"vfat", "label":"EFI", "rm":false, "size":536870912, "model":null},
+            {"name":"nvme0n1p2", "fstype":"zfs_member", "label":"one-pool", "rm":false, "size":255522594816,
+             "model":null}
+         ]
+      },
+      {"name":"sda", "fstype":null, "label":null, "rm":false, "size":4000787030016, "model":"ST4000NM000A-2HZ100",
+         "children": [
+            {"name":"sda1", "fstype":"linux_raid_member", "label":"data:0", "rm":false, "size":2147483648,
+             "model":null},
+            {"name":"sda2", "fstype":"ext4", "label":"my data", "rm":false, "size":3998639546368, "model":null}
+         ]
+      },
+      {"name":"sdb", "fstype":"zfs_member", "label":"tank", "rm":false, "size":4000787030016,
+       "model":"ST4000NM000A-2HZ100"},
+      {"name":"sdc", "fstype":null, "label":null, "rm":true, "size":30752000000, "model":null},
+      {"name":"sdd", "fstype":null, "label":null, "rm":true, "size":1000000000, "model":"Cruzer Blade"},
+      {"name":"sde", "fstype":null, "label":null, "rm":false, "size":1000204886016,
+       "model":"Samsung SSD 870 EVO 1TB"},
+      {"name":"sr0", "fstype":"iso9660", "label":"TRUENAS", "rm":true, "size":1838776320, "model":"QEMU DVD-ROM"}
+   ]
+}
+"""
+
+
+def write_sysfs(sys_block, udev_data, devices):
+    for path, attrs in devices.items():
+        os.makedirs(os.path.join(sys_block, path), exist_ok=True)
+        for attr, value in attrs.items():
+            if attr == "udev":
+                with open(os.path.join(udev_data, f"b{attrs['dev']}"), "w") as f:
+                    f.write("".join(f"E:{k}={v}\n" for k, v in value.items()))
+                continue
+
+            os.makedirs(os.path.dirname(os.path.join(sys_block, path, attr)), exist_ok=True)
+            with open(os.path.join(sys_block, path, attr), "w") as f:
+                f.write(f"{value}\n")
+
+
+def test_sysfs_enumeration_matches_lsblk(tmp_path):
+    sys_block = tmp_path / "sys_block"
+    udev_data = tmp_path / "udev_data"
+    udev_data.mkdir()
+    write_sysfs(sys_block, udev_data, {
+        "loop0": {"dev": "7:0", "size": 2097152, "removable": 0, "udev": {"ID_FS_TYPE": "squashfs"}},
+        "nvme0n1": {"dev": "259:0", "size": 500118192, "removable": 0, "device/model": "Samsung SSD 980 250GB    ",
+                    "udev": {"ID_MODEL_ENC": "Samsung\\x20SSD\\x20980\\x20250GB", "ID_PART_TABLE_TYPE": "gpt"}},
+        "nvme0n1/nvme0n1p1": {"dev": "259:1", "size": 1048576, "partition": 1,
+                              "udev": {"ID_FS_TYPE": "vfat", "ID_FS_LABEL_ENC": "EFI",
+                                       "ID_MODEL_ENC": "Samsung\\x20SSD\\x20980\\x20250GB"}},
+        "nvme0n1/nvme0n1p2": {"dev": "259:2", "size": 499067568, "partition": 2,
+                              "udev": {"ID_FS_TYPE": "zfs_member", "ID_FS_LABEL_ENC": "one-pool"}},
+        "sda": {"dev": "8:0", "size": 7814037168, "removable": 0, "device/model": "ST4000NM000A-2HZ100"},
+        "sda/sda2": {"dev": "8:2", "size": 7809842864, "partition": 2,
+                     "udev": {"ID_FS_TYPE": "ext4", "ID_FS_LABEL": "my_data", "ID_FS_LABEL_ENC": "my\\x20data"}},
+        "sda/sda1": {"dev": "8:1", "size": 4194304, "partition": 1,
+                     "udev": {"ID_FS_TYPE": "linux_raid_member", "ID_FS_LABEL_ENC": "data:0"}},
+        "sdb": {"dev": "8:16", "size": 7814037168, "removable": 0, "device/model": "ST4000NM000A-2HZ100",
+                "udev": {"ID_FS_TYPE": "zfs_member", "ID_FS_LABEL_ENC": "tank"}},
+        "sdc": {"dev": "8:32", "size": 60062500, "removable": 1},
+        "sdd": {"dev": "8:48", "size": 1953125, "removable": 1, "device/model": "Cruzer Blade"},
+        "sde": {"dev": "8:64", "size": 1953525168, "removable": 0, "device/model": "Samsung SSD 870 EVO 1TB",
+                "udev": {"ID_MODEL_ENC": "Samsung\\x20SSD\\x20870\\x20EVO\\x20\\x201TB\\x20\\x20\\x20\\x20"}},
+        "sr0": {"dev": "11:0", "size": 3591360, "removable": 1, "device/model": "QEMU DVD-ROM",
+                "udev": {"ID_FS_TYPE": "iso9660", "ID_FS_LABEL_ENC": "TRUENAS"}},
+    })
+
+    lsblk = json.loads(LSBLK_OUTPUT)["blockdevices"]
+    sysfs = read_sysfs_blockdevices(str(sys_block), str(udev_data))
+
+    assert sysfs == lsblk
+    mount_index = MountIndex(set())
+    assert [disk_from_blockdevice(disk, mount_index) for disk in sysfs] == [
+        disk_from_blockdevice(disk, mount_index) for disk in lsblk
+    ]
+    mount_index = MountIndex({"sda"})
+    assert [disk.name for disk in filter(None, [disk_from_blockdevice(disk, mount_index) for disk in sysfs])] == [
+        "nvme0n1", "sdb", "sdc", "sde",
+    ]
+
+
+def test_mount_index(tmp_path):
+    sys_block = tmp_path / "sys_block"
+    write_sysfs(sys_block, tmp_path, {
+        "sda": {"dev": "8:0"},
+        "sda/sda1": {"dev": "8:1", "partition": 1, "holders/md0": ""},
+        "sdb": {"dev": "8:16"},
+        "sdb/sdb1": {"dev": "8:17", "partition": 1, "holders/md0": ""},
+        "md0": {"dev": "9:0", "holders/dm-0": ""},
+        "dm-0": {"dev": "253:0"},
+        "sdc": {"dev": "8:32", "holders/dm-1": ""},
+        "dm-1": {"dev": "253:1"},
+        "sdd": {"dev": "8:48"},
+        "sdd/sdd2": {"dev": "8:50", "partition": 2},
+        "sde": {"dev": "8:64"},
+        "sde/sde1": {"dev": "8:65", "partition": 1},
+    })
+    (tmp_path / "mountinfo").write_text(
+        "22 1 253:0 / / rw,relatime shared:1 - ext4 /dev/mapper/vg-root rw\n"
+        "23 22 0:5 / /dev rw,nosuid shared:2 - devtmpfs udev rw,size=8131400k\n"
+        # btrfs reports an anonymous device number, only the mount source identifies the disk
+        "24 22 0:40 / /data rw,relatime shared:3 - btrfs /dev/sdd2 rw,space_cache=v2\n"
+        "25 22 253:1 / /srv rw,relatime shared:4 - xfs /dev/disk/by-uuid/0e9d6f5f rw\n"
+    )
+
+    mount_index = MountIndex.build(str(tmp_path / "mountinfo"), str(sys_block))
+
+    assert mount_index.busy == {"sda", "sdb", "sdc", "sdd", "md0", "dm-0", "dm-1"}
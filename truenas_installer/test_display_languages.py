@@ -9,7 +9,10 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from truenas_installer.i18n import _, set_language, get_available_languages, get_language
+import pytest  # noqa: E402
+
+from truenas_installer import i18n  # noqa: E402
+from truenas_installer.i18n import _, set_language, get_available_languages, get_language  # noqa: E402
 
 
 def test_language_switching():
@@ -116,6 +119,47 @@ def test_all_translations():
     return True
 
 
+def test_compiled_catalogs(tmp_path, monkeypatch):
+    """测试编译后的语言目录"""
+    catalogs = i18n.compile_catalogs()
+    assert catalogs["en"].messages.keys() == catalogs["zh"].messages.keys()
+
+    # 没有占位符的文本直接返回常量
+    set_language("en")
+    assert _("install_upgrade") is catalogs["en"].messages["install_upgrade"].text
+    assert _("main_menu_title", vendor="OneNAS", version="25.04") == "OneNAS 25.04 Console Setup"
+    assert _("main_menu_title", vendor="OneNAS") == "{vendor} {version} Console Setup"
+
+    # 缺少的键、不同的占位符在编译时报错
+    with pytest.raises(i18n.CatalogError, match="missing keys: shell"):
+        i18n.compile_catalogs({"en": {"ok": "OK", "shell": "Shell"}, "fr": {"ok": "OK"}})
+    with pytest.raises(i18n.CatalogError, match="placeholders"):
+        i18n.compile_catalogs({"en": {"ok": "{vendor}"}, "fr": {"ok": "{vendeur}"}})
+
+
+
+def test_catalogs_are_compiled_lazily(monkeypatch, capsys):
+    """每种语言在第一次使用时才编译，`python3 -m truenas_installer.i18n` 检查所有翻译"""
+    monkeypatch.setitem(i18n.TRANSLATIONS, "fr", dict(i18n.TRANSLATIONS["en"], install_upgrade="Installer"))
+    monkeypatch.setattr(i18n, "_catalogs", {})
+    try:
+        # 没有语言名称键时显示语言代码
+        assert get_available_languages() == {"en": "English", "zh": "中文 (Chinese)", "fr": "fr"}
+        assert i18n._catalogs == {}
+
+        assert set_language("fr")
+        assert list(i18n._catalogs) == ["fr"]
+        assert _("install_upgrade") == "Installer"
+        assert _("main_menu_title", vendor="OneNAS", version="25.04") == "OneNAS 25.04 Console Setup"
+    finally:
+        set_language("en")
+
+    assert i18n.main() == 0
+    monkeypatch.setitem(i18n.TRANSLATIONS, "de", {"install_upgrade": "Installieren"})
+    assert i18n.main() == 1
+    assert "Invalid 'de' translations: missing keys:" in capsys.readouterr().err
+
+
 def main():
     """主函数 - 运行所有测试"""
     print("\n")
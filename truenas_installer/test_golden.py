@@ -0,0 +1,74 @@
+import asyncio
+import json
+import os
+import subprocess
+
+import pytest
+
+from truenas_installer import golden
+from truenas_installer.golden import receive_golden_stream, supports_golden_dataset
+
+
+def receive(tmp_path, monkeypatch, script, callback=None):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "zfs").write_text(f"#!/bin/sh\n{script}\n")
+    (bin_dir / "zfs").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(golden, "POLL_INTERVAL", 0.05)
+
+    stream = tmp_path / "TrueNAS-SCALE.zfs"
+    stream.write_bytes(os.urandom(4 * 1024 ** 2))
+    calls = []
+    if callback is None:
+        def callback(*args):
+            calls.append(args)
+
+    async def main():
+        return await receive_golden_stream("one-pool/ROOT/25.04", callback, str(stream), 0.9)
+
+    return asyncio.run(main()), calls
+
+
+def test_receive_progress(tmp_path, monkeypatch):
+    result, calls = receive(
+        tmp_path, monkeypatch, "dd bs=1048576 count=1 of=/dev/null 2>/dev/null; sleep 0.3; cat > /dev/null",
+    )
+
+    assert result.size == 4 * 1024 ** 2
+    # Progress is reported once the first MiB has been read, scaled to the stream's share of the installation
+    assert 0.9 * 0.25 in [progress for progress, message in calls]
+    assert all(progress <= 0.9 for progress, message in calls)
+
+
+def test_receive_failure(tmp_path, monkeypatch):
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        receive(tmp_path, monkeypatch, "echo 'cannot receive: destination exists' >&2; exit 1")
+
+    assert e.value.stderr == "cannot receive: destination exists\n"
+
+
+def test_receive_is_killed_on_error(tmp_path, monkeypatch):
+    pid_file = tmp_path / "pid"
+
+    def callback(progress, message):
+        raise RuntimeError("progress display failed")
+
+    with pytest.raises(RuntimeError):
+        receive(tmp_path, monkeypatch, f"echo $$ > {pid_file}; dd bs=1048576 count=1 of=/dev/null 2>/dev/null; "
+                                       "exec sleep 30", callback)
+
+    # The process has been killed and reaped
+    assert not os.path.exists(f"/proc/{pid_file.read_text().strip()}")
+
+
+def test_supports_golden_dataset(tmp_path):
+    assert not supports_golden_dataset(str(tmp_path))
+
+    (tmp_path / "truenas_install").mkdir()
+    capabilities = tmp_path / "truenas_install" / "capabilities.json"
+    capabilities.write_text("not json")
+    assert not supports_golden_dataset(str(tmp_path))
+
+    capabilities.write_text(json.dumps({"capabilities": ["golden_dataset"]}))
+    assert supports_golden_dataset(str(tmp_path))
@@ -0,0 +1,32 @@
+import os
+
+from truenas_installer.image import (
+    FAST_SOURCE_THROUGHPUT, MIN_FREE_MEMORY, STRATEGY_LOOP, STRATEGY_TMPFS, choose_strategy, copy_image, mem_available,
+)
+
+GiB = 1024 ** 3
+
+
+def test_choose_strategy(tmp_path):
+    meminfo = tmp_path / "meminfo"
+    meminfo.write_text("MemTotal:       16318412 kB\nMemFree:         1204292 kB\nMemAvailable:    8388608 kB\n")
+    assert mem_available(str(meminfo)) == 8 * GiB
+
+    # Slow virtual media and enough memory
+    assert choose_strategy(2 * GiB, 8 * GiB, 10 * 1024 ** 2) == STRATEGY_TMPFS
+    assert choose_strategy(2 * GiB, 8 * GiB, None) == STRATEGY_TMPFS
+    # Not enough memory left for the installation
+    assert choose_strategy(2 * GiB, 2 * GiB + MIN_FREE_MEMORY - 1, 10 * 1024 ** 2) == STRATEGY_LOOP
+    # Fast source
+    assert choose_strategy(2 * GiB, 8 * GiB, FAST_SOURCE_THROUGHPUT) == STRATEGY_LOOP
+
+
+def test_copy_image(tmp_path):
+    data = os.urandom(3 * 1024 ** 2 + 17)
+    (tmp_path / "image").write_bytes(data)
+    progress = []
+
+    copy_image(str(tmp_path / "image"), str(tmp_path / "staged"), lambda done, total: progress.append((done, total)))
+
+    assert (tmp_path / "staged").read_bytes() == data
+    assert progress[-1] == (len(data), len(data))
@@ -0,0 +1,81 @@
+import asyncio
+import errno
+import os
+import struct
+import subprocess
+
+import pytest
+
+from truenas_installer import install, wipe
+from truenas_installer.disks import Disk
+from truenas_installer.exception import InstallError
+from truenas_installer.install import prepare_disks
+
+
+def make_disks(count):
+    return [Disk(f"sd{chr(ord('a') + i)}", 1024 ** 3, "Model", "", [], False) for i in range(count)]
+
+
+def test_prepare_disks_concurrency(monkeypatch):
+    running = 0
+    peak = 0
+
+    async def prepare_disk(disk, *args):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return f"{disk.device}3"
+
+    monkeypatch.setattr(install, "prepare_disk", prepare_disk)
+    disks = make_disks(7)
+
+    parts = asyncio.run(prepare_disks(disks, "UEFI", 50, "8192m", lambda *args: None, concurrency=3))
+
+    assert parts == [f"/dev/{disk.name}3" for disk in disks]
+    assert peak == 3
+
+
+def test_prepare_disks_collects_errors(monkeypatch):
+    async def prepare_disk(disk, *args):
+        await asyncio.sleep(0)
+        if disk.name == "sdb":
+            raise subprocess.CalledProcessError(2, ["sgdisk", disk.device], stderr="sgdisk failed\n")
+        if disk.name == "sdd":
+            raise InstallError("Partitions did not appear")
+        return f"{disk.device}3"
+
+    monkeypatch.setattr(install, "prepare_disk", prepare_disk)
+
+    with pytest.raises(InstallError) as e:
+        asyncio.run(prepare_disks(make_disks(4), "UEFI", 50, "8192m", lambda *args: None))
+
+    assert e.value.message == (
+        "sdb: Command sgdisk /dev/sdb failed:\nsgdisk failed\n"
+        "sdd: Partitions did not appear"
+    )
+
+
+def test_prepare_disks_discard_failure(tmp_path, monkeypatch):
+    device = tmp_path / "disk"
+    device.write_bytes(bytes(4096))
+
+    def ioctl(fd, request, arg):
+        if request == wipe.BLKGETSIZE64:
+            return struct.pack("Q", 1024 ** 3)
+        if request == wipe.BLKSSZGET:
+            return struct.pack("i", 512)
+        raise OSError(errno.EIO, os.strerror(errno.EIO))
+
+    monkeypatch.setattr(wipe.fcntl, "ioctl", ioctl)
+    monkeypatch.setattr(install, "discard_max_bytes", lambda name: 2 ** 32)
+    monkeypatch.setattr(install, "discard_disk", lambda name, on_progress: wipe.discard_disk(str(device), on_progress))
+
+    with pytest.raises(InstallError) as e:
+        asyncio.run(prepare_disks(make_disks(2), "UEFI", 50, "8192m", lambda *args: None, discard=True))
+
+    assert e.value.message == (
+        "sda: Discard failed: [Errno 5] Input/output error\n"
+        "sdb: Discard failed: [Errno 5] Input/output error"
+    )
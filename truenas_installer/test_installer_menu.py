@@ -0,0 +1,84 @@
+import asyncio
+import gc
+import sys
+
+import pytest
+
+from truenas_installer import installer_menu, prepare
+from truenas_installer.installer import Installer
+from truenas_installer.inventory import DiskInventory, DiskSnapshot
+from truenas_installer.logger import flush_logging, logger
+from truenas_installer.installer_menu import InstallerMenu
+
+NAVIGATIONS = 100_000
+
+
+class Done(Exception):
+    pass
+
+
+class FakePreparation:
+    """
+    The test only measures the menu: no image is mounted or verified.
+    """
+
+    def __init__(self, image=None, verify=True):
+        pass
+
+    def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+def test_main_menu_navigation_uses_constant_memory(monkeypatch):
+    navigations = 0
+    depths = set()
+    blocks = {}
+
+    async def dialog_menu(title, items):
+        nonlocal navigations
+        navigations += 1
+        if navigations > NAVIGATIONS:
+            raise Done()
+
+        frame, depth = sys._getframe(), 0
+        while frame is not None:
+            frame, depth = frame.f_back, depth + 1
+        depths.add(depth)
+
+        if navigations in (NAVIGATIONS // 10, NAVIGATIONS):
+            # Log records still queued for the background writer are not part of the menu's memory
+            await asyncio.get_running_loop().run_in_executor(None, flush_logging)
+            gc.collect()
+            blocks[navigations] = sys.getallocatedblocks()
+
+        # Alternate between the language menu (cancelled) and an install attempt without disks
+        handlers = list(items.values())
+        if len(handlers) == 5:
+            return await handlers[0 if navigations % 3 == 0 else 4]()
+
+    async def dialog_msgbox(title, text):
+        pass
+
+    async def snapshot():
+        return DiskSnapshot(0, [])
+
+    # pytest keeps every record that reaches the root logger
+    monkeypatch.setattr(logger, "propagate", False)
+    monkeypatch.setattr(installer_menu, "dialog_menu", dialog_menu)
+    monkeypatch.setattr(installer_menu, "dialog_msgbox", dialog_msgbox)
+    monkeypatch.setattr(prepare, "BackgroundPreparation", FakePreparation)
+
+    menu = InstallerMenu(Installer("25.04", None, "OneNAS", None))
+    menu._disk_inventory = DiskInventory()
+    monkeypatch.setattr(menu._disk_inventory, "snapshot", snapshot)
+
+    with pytest.raises(Done):
+        asyncio.run(menu.run())
+
+    assert navigations == NAVIGATIONS + 1
+    # The main menu and the language menu are always called from the same depth
+    assert len(depths) == 2
+    assert blocks[NAVIGATIONS] - blocks[NAVIGATIONS // 10] < 1000
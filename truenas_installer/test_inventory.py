@@ -0,0 +1,107 @@
+import asyncio
+import dataclasses
+
+from truenas_installer import inventory
+from truenas_installer.disks import Disk
+from truenas_installer.inventory import DiskInventory
+from truenas_installer.uevent import FakeUeventSource
+
+DISKS = {
+    "sda": Disk("sda", 4000787030016, "ST4000NM000A-2HZ100", "", [], False),
+    "sdb": Disk("sdb", 4000787030016, "ST4000NM000A-2HZ100", "", [], False),
+}
+
+
+def uevent(action, name, parent=None, **env):
+    devpath = f"/devices/virtual/block/{parent}/{name}" if parent else f"/devices/virtual/block/{name}"
+    return dict(action=action, devpath=devpath, SUBSYSTEM="block", DEVTYPE="partition" if parent else "disk",
+                DEVNAME=name, **env)
+
+
+def run_inventory(monkeypatch, scenario):
+    disks = dict(DISKS)
+
+    async def list_disks():
+        return list(disks.values())
+
+    async def run(args):
+        pass
+
+    monkeypatch.setattr(inventory, "list_disks", list_disks)
+    monkeypatch.setattr(inventory, "run", run)
+    monkeypatch.setattr(inventory, "read_sysfs_blockdevices",
+                        lambda names: [{"name": name} for name in names if name in disks])
+    monkeypatch.setattr(inventory, "disk_from_blockdevice", lambda blockdevice, mount_index: disks[blockdevice["name"]])
+    monkeypatch.setattr(inventory.MountIndex, "build", classmethod(lambda cls: None))
+
+    async def main():
+        source = FakeUeventSource()
+        disk_inventory = DiskInventory(uevents=source)
+        disk_inventory.start()
+        try:
+            snapshot = await disk_inventory.snapshot()
+            await asyncio.sleep(0)
+            await scenario(source, disks)
+            for _ in range(5):
+                await asyncio.sleep(0)
+            return disk_inventory.is_current(snapshot), await disk_inventory.snapshot()
+        finally:
+            disk_inventory.stop()
+
+    return asyncio.run(main())
+
+
+def test_rescan_keeps_snapshot_current(monkeypatch):
+    async def scenario(source, disks):
+        source.emit(**uevent("change", "sda"))
+        source.emit(**uevent("remove", "sda1", "sda"))
+        source.emit(**uevent("add", "sda1", "sda"))
+
+    current, snapshot = run_inventory(monkeypatch, scenario)
+    assert current
+    assert [disk.name for disk in snapshot.disks] == ["sda", "sdb"]
+
+
+def test_size_change_invalidates_snapshot(monkeypatch):
+    async def scenario(source, disks):
+        disks["sdb"] = dataclasses.replace(disks["sdb"], size=1000204886016)
+        source.emit(**uevent("change", "sdb"))
+
+    current, snapshot = run_inventory(monkeypatch, scenario)
+    assert not current
+    assert snapshot.disks[1].size == 1000204886016
+
+
+def test_disk_removal_invalidates_snapshot(monkeypatch):
+    async def scenario(source, disks):
+        del disks["sdb"]
+        source.emit(**uevent("remove", "sdb"))
+
+    current, snapshot = run_inventory(monkeypatch, scenario)
+    assert not current
+    assert [disk.name for disk in snapshot.disks] == ["sda"]
+
+
+def test_full_rescan_only_invalidates_on_identity_change(monkeypatch):
+    disks = dict(DISKS)
+
+    async def list_disks():
+        return list(disks.values())
+
+    monkeypatch.setattr(inventory, "list_disks", list_disks)
+
+    async def main():
+        # Every snapshot is a full rescan
+        disk_inventory = DiskInventory(ttl=0, uevents=FakeUeventSource())
+        snapshot = await disk_inventory.snapshot()
+
+        disks["sda"] = dataclasses.replace(disks["sda"], label="ext4-data")
+        relabeled = await disk_inventory.snapshot()
+        assert disk_inventory.is_current(snapshot)
+        assert relabeled.disks[0].label == "ext4-data"
+
+        disks["sda"] = dataclasses.replace(disks["sda"], size=1000204886016)
+        await disk_inventory.snapshot()
+        assert not disk_inventory.is_current(snapshot)
+
+    asyncio.run(main())
@@ -0,0 +1,18 @@
+import json
+import logging
+
+from truenas_installer.logger import enable_json_log, flush_logging, get_file_logger
+
+
+def test_flush_and_json_log(tmp_path):
+    log_file, json_log_file = tmp_path / "installer.log", tmp_path / "installer.jsonl"
+    test_logger = get_file_logger("test-installer", str(log_file), logging.INFO)
+    test_logger.propagate = False
+
+    test_logger.info("before")
+    enable_json_log(str(json_log_file), "test-installer")
+    test_logger.info("after")
+    flush_logging()
+
+    assert [line.split(" - ")[1] for line in log_file.read_text().splitlines()] == ["before", "after"]
+    assert [json.loads(line)["message"] for line in json_log_file.read_text().splitlines()] == ["after"]
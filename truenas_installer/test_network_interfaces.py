@@ -0,0 +1,138 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("pyroute2")
+
+from truenas_installer import network_interfaces  # noqa: E402
+from truenas_installer.network_interfaces import (  # noqa: E402
+    get_available_ip_addresses, get_interface_ips, get_network_state_cache, list_network_interfaces,
+)
+
+
+class Message(dict):
+    def __init__(self, index, event=None, **attrs):
+        super().__init__(index=index)
+        if event is not None:
+            self["event"] = event
+        self.attrs = attrs
+
+    def get_attr(self, name):
+        return self.attrs.get(name)
+
+
+class FakeIPRoute:
+    """
+    `IPRoute` replacement: dumps return `links`/`addresses`, notifications sent with `notify()` are received by the
+    sockets that are bound to multicast groups.
+    """
+
+    links = []
+    addresses = []
+    sockets = []
+    # Called in the middle of every address dump
+    on_dump = None
+
+    def __init__(self):
+        self.groups = None
+        self.pending = []
+        self._pipe = os.pipe()
+        FakeIPRoute.sockets.append(self)
+
+    @classmethod
+    def notify(cls, *messages):
+        for ipr in cls.sockets:
+            if ipr.groups:
+                ipr.pending.extend(messages)
+                os.write(ipr._pipe[1], b"x")
+
+    def bind(self, groups):
+        self.groups = groups
+
+    def get_links(self):
+        return list(self.links)
+
+    def get_addr(self):
+        if FakeIPRoute.on_dump is not None:
+            FakeIPRoute.on_dump()
+        return list(self.addresses)
+
+    def fileno(self):
+        return self._pipe[0]
+
+    def get(self):
+        os.read(self._pipe[0], 1)
+        messages, self.pending = self.pending, []
+        return messages
+
+    def close(self):
+        for fd in self._pipe:
+            os.close(fd)
+        FakeIPRoute.sockets.remove(self)
+
+
+@pytest.fixture
+def ipr(monkeypatch):
+    monkeypatch.setattr(FakeIPRoute, "links", [Message(1, IFLA_IFNAME="lo"), Message(2, IFLA_IFNAME="eth0")])
+    monkeypatch.setattr(FakeIPRoute, "addresses", [
+        Message(1, IFA_ADDRESS="127.0.0.1"),
+        Message(2, IFA_ADDRESS="10.0.0.5"),
+        Message(2, IFA_ADDRESS="fe80::1"),
+        Message(2, IFA_ADDRESS="2001:db8::1"),
+    ])
+    monkeypatch.setattr(FakeIPRoute, "sockets", [])
+    monkeypatch.setattr(network_interfaces, "IPRoute", FakeIPRoute)
+    network_interfaces._close_ipr()
+    yield FakeIPRoute
+    network_interfaces._close_ipr()
+    if network_interfaces._cache is not None:
+        network_interfaces._cache.close()
+        network_interfaces._cache = None
+
+
+def test_queries_use_the_cache(ipr):
+    async def main():
+        interfaces = await list_network_interfaces()
+        addresses = await get_available_ip_addresses()
+        eth0 = await get_interface_ips(["eth0"])
+        # Further queries are answered from the cache
+        ipr.links, ipr.addresses = [], []
+        return interfaces, addresses, eth0, await get_available_ip_addresses()
+
+    interfaces, addresses, eth0, cached = asyncio.run(main())
+    assert [interface.name for interface in interfaces] == ["eth0"]
+    assert addresses == eth0 == cached == {"ipv4": ["10.0.0.5"], "ipv6": ["2001:db8::1"]}
+
+
+def test_notifications_update_the_cache(ipr):
+    async def main():
+        cache = get_network_state_cache()
+        with cache.subscribe() as states:
+            ipr.notify(
+                Message(3, "RTM_NEWLINK", IFLA_IFNAME="eth1"),
+                Message(3, "RTM_NEWADDR", IFA_ADDRESS="192.168.1.2"),
+                Message(2, "RTM_DELADDR", IFA_ADDRESS="10.0.0.5"),
+            )
+            state = await asyncio.wait_for(states.get(), 5)
+
+        return state, await get_available_ip_addresses(), await list_network_interfaces()
+
+    state, addresses, interfaces = asyncio.run(main())
+    assert state.generation == 2
+    assert addresses == {"ipv4": ["192.168.1.2"], "ipv6": ["2001:db8::1"]}
+    assert [interface.name for interface in interfaces] == ["eth0", "eth1"]
+
+
+def test_changes_during_the_dump_are_not_lost(ipr, monkeypatch):
+    # The address is added after the dump was produced but before it has been read
+    monkeypatch.setattr(ipr, "on_dump", lambda: ipr.notify(Message(2, "RTM_NEWADDR", IFA_ADDRESS="10.0.0.6")))
+
+    async def main():
+        cache = get_network_state_cache()
+        with cache.subscribe() as states:
+            await asyncio.wait_for(states.get(), 5)
+
+        return await get_available_ip_addresses()
+
+    assert asyncio.run(main())["ipv4"] == ["10.0.0.5", "10.0.0.6"]
@@ -0,0 +1,32 @@
+import asyncio
+
+from truenas_installer.partition import apply_layout, bios_layout, uefi_layout
+
+
+def test_uefi_layout_is_a_single_sgdisk_call():
+    args, script = asyncio.run(apply_layout(uefi_layout(50, 8192), "/dev/sda", dry_run=True))
+
+    assert args == [
+        "sgdisk",
+        "-n1:1m:+512m", "-t1:ef00",
+        "-n2:0:+8192m", "-t2:BF00",
+        "-n3:0:0", "-t3:BF01",
+        "/dev/sda",
+    ]
+    assert script is None
+    assert uefi_layout(100, 8192).render("/dev/sda")[0] == [
+        "sgdisk", "-n1:1m:+512m", "-t1:ef00", "-n2:0:0", "-t2:BF01", "/dev/sda",
+    ]
+
+
+def test_bios_layout_is_fed_to_sfdisk_stdin():
+    args, script = asyncio.run(apply_layout(bios_layout(50, 8192), "/dev/sda", dry_run=True))
+
+    assert args == ["sfdisk", "/dev/sda"]
+    assert script == (
+        "label: dos\n"
+        "start=1MiB, size=512MiB, type=83, bootable\n"
+        "start=513MiB, size=8192MiB, type=83\n"
+        "start=8705MiB, size=+, type=83\n"
+    )
+    assert bios_layout(100, 8192).numbers == [1, 2]
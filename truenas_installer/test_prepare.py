@@ -0,0 +1,97 @@
+import asyncio
+import contextlib
+import json
+import os
+
+from truenas_installer import prepare, verify
+from truenas_installer.image import STRATEGY_LOOP, STRATEGY_TMPFS, MountedImage
+from truenas_installer.prepare import BackgroundPreparation
+from truenas_installer.tracing import tracer
+
+
+def test_failed_preparation_falls_back(tmp_path):
+    async def main():
+        preparation = BackgroundPreparation(str(tmp_path / "missing.update"))
+        preparation.start()
+        image = await preparation.wait(lambda progress, message: None)
+        await preparation.close()
+        return preparation, image
+
+    preparation, image = asyncio.run(main())
+    assert image is None
+    assert preparation.boot_mode in ("UEFI", "BIOS")
+
+
+def test_cancelled_preparation(tmp_path):
+    async def main():
+        preparation = BackgroundPreparation(str(tmp_path / "missing.update"))
+        preparation.start()
+        await preparation.close()
+        # Waiting after `close()` does not raise
+        return await preparation.wait()
+
+    assert asyncio.run(main()) is None
+
+
+def test_image_is_read_sequentially(tmp_path, monkeypatch):
+    events = []
+
+    @contextlib.asynccontextmanager
+    async def mount_image(callback, image=None):
+        events.append("mount")
+        await asyncio.sleep(0.01)
+        events.append("mounted")
+        yield MountedImage(str(tmp_path), STRATEGY_LOOP, "/dev/loop7")
+
+    async def verify_image_async(callback, path=None):
+        events.append("verify")
+        await asyncio.sleep(0.01)
+        events.append("verified")
+        return True
+
+    monkeypatch.setattr(prepare, "mount_image", mount_image)
+    monkeypatch.setattr(prepare, "verify_image_async", verify_image_async)
+    monkeypatch.setattr(BackgroundPreparation, "_warm_page_cache", lambda self: events.append("warm"))
+
+    async def main():
+        preparation = BackgroundPreparation()
+        preparation.start()
+        try:
+            image = await preparation.wait()
+            verified = await preparation.verification
+        finally:
+            await preparation.close()
+
+        # The installation trace keeps what was done in the background
+        tracer.reset(preparation.started_at)
+        return image, verified
+
+    image, verified = asyncio.run(main())
+    assert image.loop_device == "/dev/loop7" and verified
+    assert events == ["mount", "mounted", "verify", "verified", "warm"]
+    assert {"background_preparation", "background_verify_image"} <= {event.name for event in tracer.events}
+
+
+def test_staged_copy_is_verified(tmp_path, monkeypatch):
+    source, staged = tmp_path / "TrueNAS-SCALE.update", tmp_path / "staged.update"
+    source.write_bytes(os.urandom(1024 ** 2))
+    with open(verify.manifest_path(str(source)), "w") as f:
+        json.dump(verify.build_manifest(str(source), 64 * 1024), f)
+    source.rename(staged)
+
+    @contextlib.asynccontextmanager
+    async def mount_image(callback, image=None):
+        yield MountedImage(str(tmp_path), STRATEGY_TMPFS, "/dev/loop7", source=str(source), backing=str(staged))
+
+    monkeypatch.setattr(prepare, "mount_image", mount_image)
+
+    async def main():
+        preparation = BackgroundPreparation(str(source))
+        preparation.start()
+        try:
+            return await preparation.verification
+        finally:
+            await preparation.close()
+
+    # The boot medium is not read again: only the staged copy exists
+    assert asyncio.run(main()) is True
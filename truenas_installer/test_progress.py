@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+from truenas_installer.progress import MAX_LINE_SIZE, READ_SIZE, ProgressReader, ProgressRenderer
+
+
+def read_progress(chunks, **kwargs):
+    calls = []
+
+    async def main():
+        reader = asyncio.StreamReader()
+        for chunk in chunks:
+            reader.feed_data(chunk)
+        reader.feed_eof()
+        return await ProgressReader(reader, lambda *args: calls.append(args), **kwargs).read()
+
+    return asyncio.run(main()), calls
+
+
+def test_frames_split_across_reads():
+    data = (
+        b'{"progress": 0.1, "message": "Copying"}\n'
+        b"Some warning\n"
+        b'{"error": "Disk full"}\n'
+        b"Traceback (most recent call last):"
+    )
+    result, calls = read_progress([data[:10], data[10:50], data[50:]])
+
+    assert calls == [(0.1, "Copying")]
+    assert result.error == "Disk full"
+    assert result.output == ["Some warning", "Traceback (most recent call last):"]
+
+
+def test_progress_is_coalesced_and_output_is_bounded():
+    frames = b"".join(
+        json.dumps({"progress": i / 1000, "message": f"File {i}"}).encode() + b"\ngarbage\n"
+        for i in range(1, 1001)
+    )
+    result, calls = read_progress([frames], rate=10, output_lines=5)
+
+    assert len(calls) == 2
+    assert calls[-1] == (1.0, "File 1000")
+    assert result.output == ["garbage"] * 5
+
+
+def test_carriage_returns_and_long_lines():
+    bar = b"".join(b"\r[%-50s] %d%%" % (b"#" * (i // 2), i) for i in range(101))
+    result, calls = read_progress(
+        [bar, b"\r\n", b'{"progress": 1, "message": "Done"}\r\n', b"x" * (MAX_LINE_SIZE * 3), b"\n"],
+        output_lines=1000,
+    )
+
+    assert calls == [(1, "Done")]
+    assert result.output[100] == "[" + "#" * 50 + "] 100%"
+    assert all(len(line) <= MAX_LINE_SIZE + READ_SIZE for line in result.output)
+    assert sum(len(line) for line in result.output[101:]) == MAX_LINE_SIZE * 3
+
+
+class FakeClock:
+    """
+    Replaces `asyncio.sleep`: sleeping tasks wake up once the test has advanced the clock past their deadline.
+    """
+
+    def __init__(self, sleep):
+        self.now = 0.0
+        self._sleep = sleep
+
+    async def sleep(self, delay):
+        deadline = self.now + delay
+        while self.now < deadline:
+            await self._sleep(0)
+
+
+class FakeStream:
+    def __init__(self, clock):
+        self.clock = clock
+        self.writes = []
+
+    def write(self, text):
+        self.writes.append((self.clock.now, text))
+
+    def flush(self):
+        pass
+
+
+def test_renderer_is_throttled(monkeypatch):
+    clock = FakeClock(asyncio.sleep)
+    stream = FakeStream(clock)
+
+    async def main():
+        monkeypatch.setattr(asyncio, "sleep", clock.sleep)
+        renderer = ProgressRenderer(stream, fps=10)
+        renderer.start()
+        # 1000 updates over 1 second
+        for i in range(1, 1001):
+            renderer.update(i / 1000, f"File {i}")
+            clock.now = i / 1000
+            for _ in range(3):
+                await clock._sleep(0)
+        await renderer.stop()
+
+    asyncio.run(main())
+
+    draws = [(time, text) for time, text in stream.writes if text != "\n"]
+    assert 5 <= len(draws) <= 12
+    assert all(b[0] - a[0] >= 0.1 - 1e-9 for a, b in zip(draws, draws[1:-1]))
+    # The final state is always drawn, followed by a newline
+    assert draws[-1][1] == ProgressRenderer.render(1.0, "File 1000")
+    assert "100% File 1000" in draws[-1][1]
+    assert stream.writes[-1][1] == "\n"
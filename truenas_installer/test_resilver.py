@@ -0,0 +1,59 @@
+import asyncio
+import os
+
+from truenas_installer import resilver
+from truenas_installer.resilver import (
+    RESILVER_DONE, RESILVER_IN_PROGRESS, ResilverMonitor, ResilverStatus, parse_resilver_status,
+)
+
+STATUS = """\
+  pool: one-pool
+ state: ONLINE
+status: One or more devices is currently being resilvered.
+  scan: resilver in progress since Fri Oct 17 10:00:00 2026
+        1234567 scanned at 123456/s, 234567 issued at 12345/s, 9876543 total
+        234567 resilvered, {percent}% done, 00:01:23 to go
+config:
+"""
+
+DONE = """\
+  pool: one-pool
+ state: ONLINE
+  scan: resilvered 9876543 in 00:00:12 with 0 errors on Fri Oct 17 10:00:12 2026
+config:
+"""
+
+
+def test_parse_resilver_status():
+    assert parse_resilver_status(STATUS.format(percent="12.34")) == ResilverStatus(RESILVER_IN_PROGRESS, 12.34)
+    assert parse_resilver_status(STATUS.split("        1234567")[0]) == ResilverStatus(RESILVER_IN_PROGRESS)
+    assert parse_resilver_status(DONE) == ResilverStatus(RESILVER_DONE, 100.0)
+
+
+def test_monitor(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    # Every `zpool status` call reports 50% more, `zpool export` is recorded
+    (bin_dir / "zpool").write_text(
+        "#!/bin/sh\n"
+        f"cd {tmp_path}\n"
+        'if [ "$1" = export ]; then echo "$@" > exported; exit 0; fi\n'
+        "n=$(cat calls 2>/dev/null || echo 0); echo $((n + 1)) > calls\n"
+        f"if [ $n -ge 2 ]; then cat <<'EOF'\n{DONE}EOF\n"
+        f"else cat <<EOF\n{STATUS.format(percent='$((n * 50))')}EOF\nfi\n"
+    )
+    (bin_dir / "zpool").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(resilver, "POLL_INTERVAL", 0.01)
+    calls = []
+
+    async def main():
+        monitor = ResilverMonitor("one-pool", "sda3", ["sdb3"])
+        monitor.start(lambda *args: calls.append(args))
+        await asyncio.wait_for(monitor.wait(), 5)
+        await monitor.close()
+
+    asyncio.run(main())
+
+    assert [progress for progress, message in calls] == [0.0, 0.5, 1.0]
+    assert (tmp_path / "exported").read_text() == "export -f one-pool\n"
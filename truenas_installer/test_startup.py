@@ -0,0 +1,36 @@
+from truenas_installer.startup import ENTRY_MODULE, measure_imports
+
+# Time spent importing the installer's own modules before the main menu is displayed. About 5 ms when this was
+# written: the ceiling is generous so that the test only fails when something heavy is imported eagerly, not on a
+# loaded CI machine.
+OWN_IMPORT_BUDGET_MS = 60
+# The installer's own modules imported before the main menu is displayed (11 when this was written)
+OWN_MODULES_LIMIT = 12
+# Only needed once the installation is configured
+LAZY_MODULES = [
+    "humanfriendly",
+    "pyroute2",
+    "truenas_installer.disks",
+    "truenas_installer.install",
+    "truenas_installer.inventory",
+    "truenas_installer.network_interfaces",
+    "truenas_installer.wipe",
+]
+
+
+def test_startup_imports(record_property):
+    imports = measure_imports()
+    names = {i.name for i in imports}
+
+    assert ENTRY_MODULE in names
+    assert [name for name in LAZY_MODULES if name in names] == []
+
+    assert len([name for name in names if name.split(".")[0] == "truenas_installer"]) <= OWN_MODULES_LIMIT
+
+    # The fastest of a few runs, to ignore a cold page cache
+    own = min(
+        sum(i.self for i in run if i.name.split(".")[0] == "truenas_installer")
+        for run in [imports] + [measure_imports() for _ in range(2)]
+    )
+    record_property("own_import_ms", round(own / 1000, 1))
+    assert own / 1000 < OWN_IMPORT_BUDGET_MS
@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+from truenas_installer.tracing import Tracer
+
+
+def test_chrome_trace(tmp_path):
+    tracer = Tracer()
+
+    async def disk(name):
+        with tracer.span("disk", disk=name):
+            await asyncio.sleep(0.01)
+            tracer.record_command(["sgdisk", "-Z", f"/dev/{name}"], 0, 0, 0, 10, 0)
+
+    async def main():
+        with tracer.span("install"):
+            await asyncio.gather(disk("sda"), disk("sdb"))
+
+    asyncio.run(main())
+    tracer.write(tmp_path / "trace.json")
+    trace = json.loads((tmp_path / "trace.json").read_text())
+
+    assert trace["displayTimeUnit"] == "ms"
+    events = trace["traceEvents"]
+    assert [event["name"] for event in events] == ["sgdisk", "sgdisk", "install", "disk", "disk"]
+    assert all(event["ph"] == "X" and event["ts"] >= 0 for event in events)
+    # The commands were recorded at time 0, the origin of the trace
+    assert [event["ts"] for event in events[:2]] == [0, 0]
+
+    install, sda, sdb = events[2:]
+    assert install["dur"] >= 10000
+    assert (sda["args"], sdb["args"]) == ({"disk": "sda", "parents": "install"}, {"disk": "sdb", "parents": "install"})
+    assert events[0]["args"]["parents"] == "install/disk"
+    # Concurrent tasks are displayed on different threads
+    assert len({install["tid"], sda["tid"], sdb["tid"]}) == 3
+
+
+def test_events_are_bounded():
+    tracer = Tracer(max_events=10)
+
+    async def screen(i):
+        with tracer.span("menu", i=i):
+            pass
+
+    async def main():
+        for i in range(100):
+            await asyncio.create_task(screen(i))
+
+    asyncio.run(main())
+
+    assert [event.args["i"] for event in tracer.events] == list(range(90, 100))
+    # Finished tasks are forgotten
+    assert len(tracer._tids) <= 1
@@ -0,0 +1,94 @@
+import asyncio
+import curses
+
+from truenas_installer import dialog
+from truenas_installer.tui import ENTER_KEYS, CursesTUI, LineEdit, display_width, wrap_text
+
+
+def test_wrap_text():
+    assert display_width("中文 ab") == 7
+    assert wrap_text("Proceed with erasing sda, sdb?\\nOK", 12) == ["Proceed with", "erasing sda,", "sdb?", "OK"]
+    assert wrap_text("磁盘已更改请重新选择", 8) == ["磁盘已更", "改请重新", "选择"]
+
+
+def test_line_edit():
+    edit = LineEdit("50", secret=True)
+    for key in [curses.KEY_BACKSPACE, "7", curses.KEY_HOME, "1", curses.KEY_LEFT]:
+        edit.handle(key)
+
+    assert edit.value == "157"
+    assert edit.render(10) == ("***", 0)
+
+
+def test_checklist_shows_tags():
+    class FakeTUI:
+        async def checklist(self, title, text, items):
+            self.items = items
+            return [1]
+
+    tui = FakeTUI()
+    dialog.use_tui(tui)
+    try:
+        selected = asyncio.run(dialog.dialog_checklist("Disks", "", {"sda": "ST4000NM  -- 3.6 TiB",
+                                                                     "nvme0n1": "ST4000NM  -- 3.6 TiB"}))
+    finally:
+        dialog.use_tui(None)
+
+    assert tui.items == [("sda      ST4000NM  -- 3.6 TiB", False), ("nvme0n1  ST4000NM  -- 3.6 TiB", False)]
+    assert selected == ["nvme0n1"]
+
+
+class FakeWindow:
+    def getmaxyx(self):
+        return 20, 60
+
+
+class FormTUI(CursesTUI):
+    """
+    `CursesTUI` that reads keys from a list and only records which button is highlighted.
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.focused_buttons = []
+
+    async def _key(self):
+        return self.keys.pop(0)
+
+    def _window(self, title, height, width):
+        return FakeWindow()
+
+    def _put(self, window, y, x, text, attr=0):
+        pass
+
+    def _buttons(self, window, labels, focused):
+        self.focused_buttons.append(focused)
+
+    def _show(self, window, cursor=None):
+        pass
+
+
+def test_form_buttons_can_be_focused():
+    fields = [("Password:", ""), ("Confirm:", "")]
+
+    # Tab through both fields to the OK button, then to Cancel
+    tui = FormTUI(["a", "\t", "b", "\t", "\t", ENTER_KEYS[0]])
+    assert asyncio.run(tui.form("Password", "", fields, secret=True)) is None
+    assert tui.focused_buttons[-1] == 1
+
+    # Up from the first field focuses Cancel, the arrow keys move between the buttons without editing the fields
+    tui = FormTUI(["a", curses.KEY_UP, curses.KEY_LEFT, curses.KEY_RIGHT, curses.KEY_LEFT, ENTER_KEYS[0]])
+    assert asyncio.run(tui.form("Password", "", fields, secret=True)) == ["a", ""]
+    assert tui.focused_buttons == [0, 0, 1, 0, 1, 0]
+
+
+def test_msgbox_size_counts_escaped_newlines(monkeypatch):
+    calls = []
+
+    async def fake_dialog(args, check=False):
+        calls.append(args)
+
+    monkeypatch.setattr(dialog, "dialog", fake_dialog)
+    asyncio.run(dialog.dialog_msgbox("Done", "\\n".join(f"Line {i}" for i in range(10))))
+
+    assert calls[0][-2:] == ["14", "60"]
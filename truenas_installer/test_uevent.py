@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from truenas_installer import uevent
+from truenas_installer.uevent import FakeUeventSource, Uevent, get_uevent_source
+from truenas_installer.utils import get_partitions
+
+
+def partition_uevent(disk, part, partn):
+    return dict(
+        action="add",
+        devpath=f"/devices/virtual/block/{disk}/{part}",
+        SUBSYSTEM="block",
+        DEVTYPE="partition",
+        DEVNAME=part,
+        PARTN=str(partn),
+    )
+
+
+def test_parse_kernel_uevent():
+    event = Uevent.parse(
+        b"add@/devices/pci0000:00/0000:00:17.0/ata1/host0/target0:0:0/0:0:0:0/block/sda/sda2\0"
+        b"ACTION=add\0DEVPATH=/devices/pci0000:00/0000:00:17.0/ata1/host0/target0:0:0/0:0:0:0/block/sda/sda2\0"
+        b"SUBSYSTEM=block\0MAJOR=8\0MINOR=2\0DEVNAME=sda2\0DEVTYPE=partition\0PARTN=2\0SEQNUM=4242\0"
+    )
+    assert (event.action, event.parent, event.devname, event.devtype, event.partn) == (
+        "add", "sda", "sda2", "partition", 2,
+    )
+    assert Uevent.parse(b"libudev\0\xfe\xed\xca\xfe") is None
+
+
+def test_get_partitions_resolves_on_uevents(tmp_path):
+    device = tmp_path / "tnitest0"
+    device.touch()
+    source = FakeUeventSource()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        task = asyncio.create_task(get_partitions(str(device), [1, 2], tries=30, uevents=source))
+        await asyncio.sleep(0)
+        source.emit(**partition_uevent("tnitest0", "tnitest0p1", 1))
+        source.emit(**partition_uevent("othertest0", "othertest0p2", 2))
+        await asyncio.sleep(0)
+        assert not task.done()
+        source.emit(**partition_uevent("tnitest0", "tnitest0p2", 2))
+        return await task, loop.time() - start
+
+    partitions, elapsed = asyncio.run(main())
+    assert partitions == {1: "/dev/tnitest0p1", 2: "/dev/tnitest0p2"}
+    assert elapsed < 0.5
+
+
+def test_uevent_source_follows_event_loop():
+    async def main():
+        return get_uevent_source()
+
+    first = asyncio.run(main())
+    if first is None:
+        pytest.skip("Kernel uevents are not available")
+
+    second = asyncio.run(main())
+    assert second is not first
+    assert first.sock is None
+    assert second.loop is not None
+    second.close()
+
+
+def test_uevent_source_failure_is_remembered(monkeypatch):
+    starts = []
+
+    def start(self):
+        starts.append(self)
+        raise PermissionError(1, "Operation not permitted")
+
+    monkeypatch.setattr(uevent.NetlinkUeventSource, "start", start)
+    monkeypatch.setattr(uevent, "_uevent_source", None)
+    monkeypatch.setattr(uevent, "_uevent_source_failed_loop", None)
+
+    async def main():
+        return [get_uevent_source() for _ in range(3)]
+
+    assert asyncio.run(main()) == [None, None, None]
+    assert len(starts) == 1
+    # A new event loop tries again
+    asyncio.run(main())
+    assert len(starts) == 2
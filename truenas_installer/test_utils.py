@@ -0,0 +1,52 @@
+import asyncio
+import subprocess
+
+import pytest
+
+from truenas_installer.utils import OutputTail, run_streaming, stream
+
+
+def test_output_tail():
+    tail = OutputTail(8)
+    tail.write(b"0123456789")
+    tail.write(b"abc")
+
+    assert tail.getvalue() == "56789abc"
+    assert tail.total == 13
+
+
+def test_run_streaming_lines():
+    stdout, stderr = [], []
+    result = asyncio.run(run_streaming(
+        ["sh", "-c", "echo one; echo warning >&2; printf 'two\\r\\nthree'"],
+        on_stdout=stdout.append, on_stderr=stderr.append,
+    ))
+
+    assert stdout == ["one", "two", "three"]
+    assert stderr == ["warning"]
+    assert result.returncode == 0
+    # The tail keeps the normalized lines
+    assert result.stdout == "one\ntwo\nthree\n"
+
+
+def test_run_streaming_failure_keeps_tail():
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        asyncio.run(run_streaming(
+            ["sh", "-c", "seq 1 100000 >&2; echo done >&2; exit 3"], tail_size=1024,
+        ))
+
+    assert e.value.returncode == 3
+    assert len(e.value.stderr) == 1024
+    assert e.value.stderr.endswith("99999\n100000\ndone\n")
+
+
+def test_stream():
+    async def main(args):
+        return [line async for line in stream(args)]
+
+    assert asyncio.run(main(["sh", "-c", "echo one; echo two"])) == ["one", "two"]
+
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        asyncio.run(main(["sh", "-c", "echo one; echo failed >&2; exit 1"]))
+
+    assert e.value.stderr == "failed\n"
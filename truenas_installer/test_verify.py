@@ -0,0 +1,51 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from truenas_installer.exception import InstallError
+from truenas_installer.i18n import _
+from truenas_installer.verify import build_manifest, manifest_path, verify_image, verify_image_async
+
+CHUNK_SIZE = 64 * 1024
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "TrueNAS-SCALE.update"
+    path.write_bytes(os.urandom(10 * CHUNK_SIZE + 123))
+    with open(manifest_path(str(path)), "w") as f:
+        json.dump(build_manifest(str(path), CHUNK_SIZE), f)
+
+    return path
+
+
+def test_verify_image(image):
+    progress = []
+
+    async def main():
+        return await verify_image_async(lambda *args: progress.append(args), str(image))
+
+    assert asyncio.run(main())
+    assert progress[0] == (0, _("verifying_image", percent=0))
+    assert progress[-1] == (0, _("verifying_image", percent=100))
+
+
+def test_corrupted_image(image):
+    with open(image, "r+b") as f:
+        f.seek(3 * CHUNK_SIZE + 5)
+        f.write(b"\xff")
+
+    with pytest.raises(InstallError, match=f"1 chunk\\(s\\) do not match the manifest \\(offsets {3 * CHUNK_SIZE}\\)"):
+        verify_image(str(image))
+
+    manifest = json.loads(open(manifest_path(str(image))).read())
+    manifest["chunks"][0] = "00" * 32
+    with open(manifest_path(str(image)), "w") as f:
+        json.dump(manifest, f)
+    with pytest.raises(InstallError, match="manifest .* is corrupted"):
+        verify_image(str(image))
+
+    os.unlink(manifest_path(str(image)))
+    assert verify_image(str(image)) is False
@@ -0,0 +1,32 @@
+from truenas_installer.wipe import METADATA_REGION_SIZE, fast_wipe, metadata_ranges
+
+MiB = 1024 * 1024
+
+
+def test_metadata_ranges_are_merged_and_aligned():
+    assert metadata_ranges(100 * MiB, [(1 * MiB, 512 * 1024), (2 * MiB, 50 * MiB + 100)], 4096) == [
+        (0, MiB + 512 * 1024),
+        (2 * MiB, MiB),
+        (51 * MiB, MiB + 4096),
+        (99 * MiB, MiB),
+    ]
+
+
+def test_fast_wipe_zeroes_only_metadata(tmp_path):
+    device = tmp_path / "disk"
+    size = 64 * MiB
+    partition = (8 * MiB, 32 * MiB)
+    with open(device, "wb") as f:
+        f.write(b"\xff" * size)
+
+    ranges = fast_wipe(str(device), [partition])
+
+    data = device.read_bytes()
+    assert len(data) == size
+    for offset, length in [(0, METADATA_REGION_SIZE), (size - METADATA_REGION_SIZE, METADATA_REGION_SIZE),
+                           (partition[0], METADATA_REGION_SIZE),
+                           (sum(partition) - METADATA_REGION_SIZE, METADATA_REGION_SIZE)]:
+        assert data[offset:offset + length] == bytes(length)
+
+    assert sum(length for offset, length in ranges) == 4 * METADATA_REGION_SIZE
+    assert data.count(0) == 4 * METADATA_REGION_SIZE
@@ -0,0 +1,154 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+from dataclasses import dataclass, field
+import json
+import os
+import time
+import weakref
+
+__all__ = ["Tracer", "tracer"]
+
+TRACE_FILE = "/var/log/onenas-installer-trace.json"
+# The tracer lives for the whole console session (every dialog screen is recorded), only the most recent events
+# are kept
+MAX_EVENTS = 10000
+
+_span_stack = contextvars.ContextVar("span_stack", default=())
+
+
+@dataclass
+class TraceEvent:
+    name: str
+    category: str
+    # `time.monotonic()` seconds
+    start: float
+    end: float
+    tid: int
+    args: dict = field(default_factory=dict)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class Tracer:
+    """
+    Records nested spans (`with tracer.span("wipe", disk="sda"):`) and every external command run inside them.
+
+    Spans opened in different asyncio tasks are recorded on different threads of the Chrome trace so that
+    concurrent work is displayed side by side.
+    """
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self.max_events = max_events
+        self.events = collections.deque(maxlen=max_events)
+        # Tasks are not kept alive by the tracer, and a new task never gets the thread of a finished one
+        self._tids = weakref.WeakKeyDictionary()
+        self._next_tid = 1
+        self._no_task_tid = None
+
+    def reset(self, since: float | None = None):
+        """
+        Forget the recorded events, except the ones that started at or after `since` (`time.monotonic()`).
+        """
+        kept = [event for event in self.events if event.start >= since] if since is not None else []
+        self.events = collections.deque(kept, maxlen=self.max_events)
+
+    @contextlib.contextmanager
+    def span(self, name, category="span", **args):
+        stack = _span_stack.get()
+        token = _span_stack.set(stack + (name,))
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            _span_stack.reset(token)
+            self._record(name, category, start, time.monotonic(), dict(args, parents="/".join(stack)))
+
+    def record_command(self, argv, start, end, returncode, stdout_size, stderr_size, category="command"):
+        self._record(
+            _command_name(argv),
+            category,
+            start,
+            end,
+            {
+                "argv": list(argv),
+                "returncode": returncode,
+                "stdout_size": stdout_size,
+                "stderr_size": stderr_size,
+                "parents": "/".join(_span_stack.get()),
+            },
+        )
+
+    def chrome_trace(self):
+        origin = min((event.start for event in self.events), default=0)
+        return {
+            "displayTimeUnit": "ms",
+            "traceEvents": [
+                {
+                    "name": event.name,
+                    "cat": event.category,
+                    "ph": "X",
+                    "ts": round((event.start - origin) * 1e6),
+                    "dur": round(event.duration * 1e6),
+                    "pid": os.getpid(),
+                    "tid": event.tid,
+                    "args": event.args,
+                }
+                for event in sorted(self.events, key=lambda x: x.start)
+            ],
+        }
+
+    def summary(self):
+        totals = {}
+        for event in self.events:
+            count, total, longest = totals.get((event.category, event.name), (0, 0, 0))
+            totals[(event.category, event.name)] = (count + 1, total + event.duration, max(longest, event.duration))
+
+        lines = [f"{'Category':<10} {'Name':<30} {'Count':>6} {'Total (s)':>10} {'Max (s)':>10}"]
+        for (category, name), (count, total, longest) in sorted(totals.items(), key=lambda x: -x[1][1]):
+            lines.append(f"{category:<10} {name[:30]:<30} {count:>6} {total:>10.3f} {longest:>10.3f}")
+
+        return "\n".join(lines)
+
+    def write(self, path=None):
+        with open(path or TRACE_FILE, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def _record(self, name, category, start, end, args):
+        self.events.append(TraceEvent(name, category, start, end, self._tid(), args))
+
+    def _tid(self):
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+
+        if task is None:
+            if self._no_task_tid is None:
+                self._no_task_tid = self._new_tid()
+            return self._no_task_tid
+
+        if (tid := self._tids.get(task)) is None:
+            tid = self._tids[task] = self._new_tid()
+
+        return tid
+
+    def _new_tid(self):
+        tid = self._next_tid
+        self._next_tid += 1
+        return tid
+
+
+def _command_name(argv):
+    # `zpool labelclear`, `udevadm settle`, `sgdisk`
+    name = os.path.basename(argv[0])
+    if len(argv) > 1 and argv[1].isalpha():
+        name += f" {argv[1]}"
+
+    return name
+
+
+tracer = Tracer()
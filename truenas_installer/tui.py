@@ -0,0 +1,442 @@
+import asyncio
+import contextlib
+import curses
+import locale
+import os
+import sys
+import unicodedata
+
+from .i18n import _
+from .logger import logger
+
+__all__ = ["CursesTUI", "display_width", "start_tui", "wrap_text"]
+
+# Color pairs, same scheme as dialog(1)
+SCREEN_COLOR = 1
+WINDOW_COLOR = 2
+SELECTED_COLOR = 3
+TITLE_COLOR = 4
+
+ENTER_KEYS = ("\n", "\r", curses.KEY_ENTER)
+ESCAPE_KEY = "\x1b"
+BACKSPACE_KEYS = ("\x7f", "\b", curses.KEY_BACKSPACE)
+
+
+def display_width(text: str):
+    """
+    Number of terminal cells `text` occupies (CJK characters are two cells wide).
+    """
+    width = 0
+    for char in text:
+        if unicodedata.combining(char):
+            continue
+        width += 2 if unicodedata.east_asian_width(char) in "WF" else 1
+
+    return width
+
+
+def truncate(text: str, width: int):
+    result = ""
+    for char in text:
+        if display_width(result + char) > width:
+            break
+        result += char
+
+    return result
+
+
+def wrap_text(text: str, width: int):
+    """
+    Wrap `text` to `width` cells. Lines are broken at the last space if there is one (English), anywhere
+    otherwise (Chinese).
+    """
+    lines = []
+    for paragraph in text.replace("\\n", "\n").splitlines() or [""]:
+        line = ""
+        for char in paragraph:
+            if display_width(line + char) <= width:
+                line += char
+                continue
+
+            if char == " ":
+                lines.append(line)
+                line = ""
+            elif " " in line.strip():
+                head, _sep, tail = line.rpartition(" ")
+                lines.append(head)
+                line = tail + char
+            else:
+                lines.append(line)
+                line = char
+
+        lines.append(line)
+
+    return lines
+
+
+class LineEdit:
+    def __init__(self, value="", secret=False):
+        self.value = value
+        self.pos = len(value)
+        self.secret = secret
+
+    def handle(self, key):
+        """
+        Returns `False` if `key` is not an editing key.
+        """
+        if key in BACKSPACE_KEYS:
+            if self.pos > 0:
+                self.value = self.value[:self.pos - 1] + self.value[self.pos:]
+                self.pos -= 1
+        elif key == curses.KEY_DC:
+            self.value = self.value[:self.pos] + self.value[self.pos + 1:]
+        elif key == curses.KEY_LEFT:
+            self.pos = max(0, self.pos - 1)
+        elif key == curses.KEY_RIGHT:
+            self.pos = min(len(self.value), self.pos + 1)
+        elif key == curses.KEY_HOME:
+            self.pos = 0
+        elif key == curses.KEY_END:
+            self.pos = len(self.value)
+        elif isinstance(key, str) and key.isprintable():
+            self.value = self.value[:self.pos] + key + self.value[self.pos:]
+            self.pos += 1
+        else:
+            return False
+
+        return True
+
+    def render(self, width):
+        """
+        Returns the visible text and the cursor column.
+        """
+        text = "*" * len(self.value) if self.secret else self.value
+        start = 0
+        while display_width(text[start:self.pos]) >= width:
+            start += 1
+
+        return truncate(text[start:], width), display_width(text[start:self.pos])
+
+
+class CursesTUI:
+    """
+    In-process replacement for dialog(1): every screen is drawn into the same curses session, keys are read from
+    an asyncio reader on stdin.
+
+    Screens are not cleared between each other. Each redraw only updates curses' virtual screen and
+    `curses.doupdate()` sends the differences to the terminal, so switching screens or moving the selection does
+    not flicker, even on slow consoles.
+    """
+
+    def __init__(self):
+        self.screen = None
+        self._keys = None
+        self._fd = sys.stdin.fileno()
+
+    def start(self):
+        if not os.isatty(self._fd):
+            raise RuntimeError("stdin is not a terminal")
+
+        locale.setlocale(locale.LC_ALL, "")
+        # Do not wait for one second after ESC to tell it apart from an escape sequence
+        os.environ.setdefault("ESCDELAY", "25")
+        self.screen = curses.initscr()
+        try:
+            curses.noecho()
+            curses.cbreak()
+            self.screen.keypad(True)
+            self.screen.nodelay(True)
+            try:
+                curses.curs_set(0)
+            except curses.error:
+                pass
+
+            if curses.has_colors():
+                curses.start_color()
+                curses.init_pair(SCREEN_COLOR, curses.COLOR_WHITE, curses.COLOR_BLUE)
+                curses.init_pair(WINDOW_COLOR, curses.COLOR_BLACK, curses.COLOR_WHITE)
+                curses.init_pair(SELECTED_COLOR, curses.COLOR_WHITE, curses.COLOR_BLUE)
+                curses.init_pair(TITLE_COLOR, curses.COLOR_BLUE, curses.COLOR_WHITE)
+        except Exception:
+            curses.endwin()
+            raise
+
+        self._keys = asyncio.Queue()
+        asyncio.get_running_loop().add_reader(self._fd, self._on_readable)
+
+    def close(self):
+        if self.screen is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            curses.endwin()
+            self.screen = None
+
+    @contextlib.contextmanager
+    def suspended(self):
+        """
+        Give the terminal back (i.e. to the install progress gauge or to a child process) and redraw everything
+        afterwards.
+        """
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(self._fd)
+        curses.endwin()
+        try:
+            yield
+        finally:
+            self.screen.clear()
+            self.screen.refresh()
+            loop.add_reader(self._fd, self._on_readable)
+
+    def _on_readable(self):
+        while True:
+            try:
+                key = self.screen.get_wch()
+            except curses.error:
+                break
+
+            self._keys.put_nowait(key)
+
+    async def _key(self):
+        key = await self._keys.get()
+        if key == curses.KEY_RESIZE:
+            curses.update_lines_cols()
+            self.screen.clear()
+
+        return key
+
+    # Drawing
+
+    def _window(self, title, height, width):
+        height = min(height, curses.LINES)
+        width = min(width, curses.COLS)
+        self.screen.bkgdset(" ", curses.color_pair(SCREEN_COLOR))
+        self.screen.erase()
+        self.screen.noutrefresh()
+
+        window = curses.newwin(height, width, (curses.LINES - height) // 2, (curses.COLS - width) // 2)
+        window.bkgdset(" ", curses.color_pair(WINDOW_COLOR))
+        window.erase()
+        window.box()
+        if title:
+            title = truncate(f" {title} ", width - 4)
+            self._put(window, 0, (width - display_width(title)) // 2, title,
+                      curses.color_pair(TITLE_COLOR) | curses.A_BOLD)
+
+        return window
+
+    def _put(self, window, y, x, text, attr=0):
+        height, width = window.getmaxyx()
+        if 0 <= y < height and 0 <= x < width:
+            try:
+                window.addstr(y, x, truncate(text, width - x), attr)
+            except curses.error:
+                # Writing the bottom right cell moves the cursor out of the window
+                pass
+
+    def _buttons(self, window, labels, focused):
+        height, width = window.getmaxyx()
+        texts = [f"<{label}>" for label in labels]
+        x = (width - sum(display_width(text) for text in texts) - 4 * (len(texts) - 1)) // 2
+        for i, text in enumerate(texts):
+            self._put(window, height - 2, x, text, curses.A_REVERSE if i == focused else 0)
+            x += display_width(text) + 4
+
+    def _text(self, window, text, width):
+        lines = wrap_text(text, width)
+        for y, line in enumerate(lines, start=1):
+            self._put(window, y, 2, line)
+
+        return len(lines)
+
+    def _show(self, window, cursor=None):
+        if cursor is not None:
+            window.move(*cursor)
+        try:
+            curses.curs_set(1 if cursor is not None else 0)
+        except curses.error:
+            pass
+
+        window.noutrefresh()
+        curses.doupdate()
+
+    # Screens
+
+    async def menu(self, title, labels, text=""):
+        """
+        Returns the selected index or `None`.
+        """
+        result = await self._list(title, text, [(f"{i}  {label}", False) for i, label in enumerate(labels, start=1)],
+                                  "menu")
+        return None if result is None else result[0]
+
+    async def checklist(self, title, text, items):
+        """
+        `items`: list of `(label, checked)`. Returns the list of checked indexes or `None`.
+        """
+        return await self._list(title, text, items, "checklist")
+
+    async def radiolist(self, title, text, items):
+        """
+        `items`: list of `(label, selected)`. Returns the selected index or `None`.
+        """
+        result = await self._list(title, text, items, "radiolist")
+        if result is None:
+            return None
+
+        return result[0] if result else None
+
+    async def _list(self, title, text, items, mode):
+        width = min(curses.COLS, max(60, max((display_width(label) for label, _checked in items), default=0) + 14))
+        text_lines = len(wrap_text(text, width - 4)) if text else 0
+        visible = max(1, min(len(items), curses.LINES - text_lines - 7))
+        height = text_lines + visible + 6
+
+        checked = {i for i, (_label, on) in enumerate(items) if on}
+        cursor = min(checked) if mode == "radiolist" and checked else 0
+        top = 0
+        button = 0
+        while True:
+            window = self._window(title, height, width)
+            height, width = window.getmaxyx()
+            visible = max(1, min(len(items), height - text_lines - 6))
+            if text:
+                self._text(window, text, width - 4)
+
+            top = min(max(top, cursor - visible + 1), cursor)
+            for row, i in enumerate(range(top, min(top + visible, len(items)))):
+                label = items[i][0]
+                if mode == "checklist":
+                    label = f"[{'X' if i in checked else ' '}] {label}"
+                elif mode == "radiolist":
+                    label = f"({'*' if i in checked else ' '}) {label}"
+                attr = curses.color_pair(SELECTED_COLOR) | curses.A_BOLD if i == cursor else 0
+                self._put(window, text_lines + 2 + row, 3, label.ljust(width - 6 - display_width(label) + len(label)),
+                          attr)
+
+            self._buttons(window, [_("ok"), _("cancel")], button)
+            self._show(window)
+
+            key = await self._key()
+            if key == curses.KEY_UP:
+                cursor = max(0, cursor - 1)
+            elif key == curses.KEY_DOWN:
+                cursor = min(len(items) - 1, cursor + 1)
+            elif key == curses.KEY_PPAGE:
+                cursor = max(0, cursor - visible)
+            elif key == curses.KEY_NPAGE:
+                cursor = min(len(items) - 1, cursor + visible)
+            elif key == curses.KEY_HOME:
+                cursor = 0
+            elif key == curses.KEY_END:
+                cursor = len(items) - 1
+            elif key in ("\t", curses.KEY_LEFT, curses.KEY_RIGHT):
+                button = 1 - button
+            elif key == " " and mode != "menu":
+                if mode == "radiolist":
+                    checked = {cursor}
+                else:
+                    checked ^= {cursor}
+            elif mode == "menu" and isinstance(key, str) and key.isdigit() and 0 < int(key) <= len(items):
+                cursor = int(key) - 1
+            elif key in ENTER_KEYS:
+                if button == 1:
+                    return None
+
+                return [cursor] if mode == "menu" else sorted(checked)
+            elif key == ESCAPE_KEY:
+                return None
+
+    async def msgbox(self, title, text):
+        lines = text.replace("\\n", "\n").splitlines()
+        width = min(80, max(60, max((display_width(line) for line in lines), default=0) + 10))
+        height = min(20, max(8, len(wrap_text(text, width - 4)) + 5))
+        while True:
+            window = self._window(title, height, width)
+            self._text(window, text, window.getmaxyx()[1] - 4)
+            self._buttons(window, [_("ok")], 0)
+            self._show(window)
+            if await self._key() in ENTER_KEYS + (ESCAPE_KEY, " "):
+                return
+
+    async def yesno(self, title, text):
+        button = 0
+        while True:
+            window = self._window(title, 13, 74)
+            self._text(window, text, window.getmaxyx()[1] - 4)
+            self._buttons(window, [_("yes"), _("no")], button)
+            self._show(window)
+
+            key = await self._key()
+            if key in ("\t", curses.KEY_LEFT, curses.KEY_RIGHT):
+                button = 1 - button
+            elif key in ENTER_KEYS:
+                return button == 0
+            elif key == ESCAPE_KEY:
+                return False
+
+    async def inputbox(self, title, text, init=""):
+        """
+        Returns the entered text or `None`.
+        """
+        values = await self.form(title, text, [("", init)])
+        return None if values is None else values[0]
+
+    async def form(self, title, text, fields, secret=False):
+        """
+        `fields`: list of `(label, initial value)`. Returns the list of entered values or `None`.
+        """
+        edits = [LineEdit(value, secret) for _label, value in fields]
+        label_width = max(display_width(label) for label, _value in fields)
+        text_lines = len(wrap_text(text, 56)) if text else 0
+        # The fields are followed by the OK and Cancel buttons in the focus cycle
+        focusable = len(edits) + 2
+        focused = 0
+        while True:
+            window = self._window(title, text_lines + 2 * len(fields) + 5, 60)
+            width = window.getmaxyx()[1]
+            if text:
+                self._text(window, text, width - 4)
+
+            cursor = None
+            for i, ((label, _value), edit) in enumerate(zip(fields, edits)):
+                y = text_lines + 2 + 2 * i
+                x = 2 + label_width + (1 if label_width else 0)
+                self._put(window, y, 2, label)
+                value, column = edit.render(width - x - 3)
+                self._put(window, y, x, value.ljust(width - x - 2), curses.A_REVERSE)
+                if i == focused:
+                    cursor = (y, x + column)
+
+            button = focused - len(edits)
+            self._buttons(window, [_("ok"), _("cancel")], max(button, 0))
+            self._show(window, cursor)
+
+            key = await self._key()
+            if key in ("\t", curses.KEY_DOWN):
+                focused = (focused + 1) % focusable
+            elif key in (curses.KEY_BTAB, curses.KEY_UP):
+                focused = (focused - 1) % focusable
+            elif key in (curses.KEY_LEFT, curses.KEY_RIGHT) and button >= 0:
+                focused = len(edits) + 1 - button
+            elif key in ENTER_KEYS:
+                if button == 1:
+                    return None
+
+                return [edit.value for edit in edits]
+            elif key == ESCAPE_KEY:
+                return None
+            elif button < 0:
+                edits[focused].handle(key)
+
+
+def start_tui():
+    """
+    Returns a started `CursesTUI` or `None` if the terminal does not support it.
+    """
+    tui = CursesTUI()
+    try:
+        tui.start()
+    except Exception as e:
+        logger.warning(f"Unable to start the curses interface, falling back to dialog: {e!r}")
+        return None
+
+    return tui
@@ -0,0 +1,177 @@
+import asyncio
+import contextlib
+from dataclasses import dataclass
+import os
+import socket
+
+from .logger import logger
+
+__all__ = ["FakeUeventSource", "NetlinkUeventSource", "Uevent", "UeventSource", "get_uevent_source"]
+
+NETLINK_KOBJECT_UEVENT = 15
+# Kernel uevents are multicast to group 1 (udev re-broadcasts its own, processed, events to group 2)
+UEVENT_KERNEL_GROUP = 1
+UEVENT_BUFFER_SIZE = 16 * 1024 * 1024
+
+
+@dataclass
+class Uevent:
+    action: str
+    devpath: str
+    env: dict[str, str]
+
+    @property
+    def subsystem(self):
+        return self.env.get("SUBSYSTEM")
+
+    @property
+    def devname(self):
+        return self.env.get("DEVNAME")
+
+    @property
+    def devtype(self):
+        return self.env.get("DEVTYPE")
+
+    @property
+    def parent(self):
+        """
+        Name of the parent kobject (i.e. `sda` for `/devices/.../block/sda/sda1`)
+        """
+        return self.devpath.rstrip("/").split("/")[-2] if self.devpath.count("/") > 1 else None
+
+    @property
+    def partn(self):
+        try:
+            return int(self.env["PARTN"])
+        except (KeyError, ValueError):
+            return None
+
+    @classmethod
+    def parse(cls, data: bytes):
+        """
+        Parse a raw kernel uevent message: `action@devpath\\0KEY=VALUE\\0...`
+        """
+        header, *fields = data.decode("utf-8", "ignore").split("\0")
+        if "@" not in header:
+            # Not a kernel message (i.e. a `libudev` broadcast)
+            return None
+
+        env = dict(field.split("=", 1) for field in fields if "=" in field)
+        action, devpath = header.split("@", 1)
+        return cls(env.get("ACTION", action), env.get("DEVPATH", devpath), env)
+
+
+class UeventSource:
+    """
+    Dispatches uevents to every active subscription.
+
+        with source.subscribe() as events:
+            event = await events.get()
+    """
+
+    def __init__(self):
+        self._subscriptions = set()
+
+    @contextlib.contextmanager
+    def subscribe(self):
+        queue = asyncio.Queue()
+        self._subscriptions.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscriptions.discard(queue)
+
+    def dispatch(self, event: Uevent):
+        for queue in list(self._subscriptions):
+            queue.put_nowait(event)
+
+
+class NetlinkUeventSource(UeventSource):
+    def __init__(self):
+        super().__init__()
+        self.sock = None
+        # Event loop the socket is read from
+        self.loop = None
+
+    def start(self):
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_NONBLOCK, NETLINK_KOBJECT_UEVENT)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UEVENT_BUFFER_SIZE)
+            sock.bind((os.getpid(), UEVENT_KERNEL_GROUP))
+        except OSError:
+            sock.close()
+            raise
+
+        self.sock = sock
+        self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(sock.fileno(), self._on_readable)
+
+    def close(self):
+        if self.sock is not None:
+            if not self.loop.is_closed():
+                self.loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+            self.loop = None
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self.sock.recv(UEVENT_BUFFER_SIZE)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                # ENOBUFS: we've been too slow and the kernel dropped some messages. Subscribers always
+                # fall back to rescanning sysfs, so it's safe to continue.
+                logger.debug(f"Error reading uevent socket: {e}")
+                return
+
+            if (event := Uevent.parse(data)) is not None:
+                self.dispatch(event)
+
+
+class FakeUeventSource(UeventSource):
+    """
+    Uevent source that is fed manually, used to test uevent consumers without real block devices.
+    """
+
+    def emit(self, action, devpath, **env):
+        env.setdefault("ACTION", action)
+        env.setdefault("DEVPATH", devpath)
+        self.dispatch(Uevent(action, devpath, env))
+
+
+_uevent_source = None
+# Event loop on which the uevent socket could not be bound: don't retry (and warn) on every call
+_uevent_source_failed_loop = None
+
+
+def get_uevent_source():
+    """
+    Returns a shared, started `NetlinkUeventSource` or `None` if uevents can't be received (i.e. running
+    without the required privileges), in which case the callers should fall back to polling.
+
+    The source is bound to the running event loop: a caller on another loop (i.e. after a new `asyncio.run`)
+    gets a new source and the previous one is closed. A failure is remembered for the running loop.
+    """
+    global _uevent_source, _uevent_source_failed_loop
+    loop = asyncio.get_running_loop()
+    if _uevent_source is not None and _uevent_source.loop is not loop:
+        _uevent_source.close()
+        _uevent_source = None
+
+    if _uevent_source is None:
+        if _uevent_source_failed_loop is loop:
+            return None
+
+        source = NetlinkUeventSource()
+        try:
+            source.start()
+        except OSError as e:
+            logger.warning(f"Unable to subscribe to kernel uevents: {e}")
+            _uevent_source_failed_loop = loop
+            return None
+
+        _uevent_source = source
+
+    return _uevent_source
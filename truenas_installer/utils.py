@@ -1,64 +1,87 @@
 import asyncio
+import contextlib
 import os
 import subprocess
+import time
 from .logger import logger
-__all__ = ["GiB", "get_partitions", "run"]
+from .tracing import tracer
+from .uevent import Uevent, UeventSource, get_uevent_source
+__all__ = ["GiB", "OutputTail", "get_partitions", "run", "run_streaming", "stream"]
 
 GiB = 1024 ** 3
+SYS_BLOCK = "/sys/block"
 MAX_PARTITION_WAIT_TIME_SECS = 300
+# How much of a streamed command output is kept for error messages
+STREAM_TAIL_SIZE = 64 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
 
 
 async def get_partitions(
     device: str,
     partitions: list[int],
-    tries: None | int = None
+    tries: None | int = None,
+    uevents: UeventSource | None = None,
 ) -> dict:
     """
     `device`: str (i.e. /dev/sda, /dev/nvme0n1)
     `partitions`: list of integers (i.e. [1, 2, 3])
     `tries`: None or int, defaults to None, if provided, will
-        sleep up to that time waiting on all `partitions` for `device`
-        to appear in sysfs. Maximum of `MAX_PARTITION_WAIT_TIME_SECS`.
+        wait up to that time (in seconds) for all `partitions` of `device`
+        to appear. Maximum of `MAX_PARTITION_WAIT_TIME_SECS`.
+    `uevents`: UeventSource to watch for partition uevents, defaults to the
+        shared kernel netlink source. Partitions are picked up as soon as
+        their uevent arrives; sysfs is rescanned once per second regardless
+        so that a missed event (or no uevent source at all) only costs time.
     """
     if not isinstance(tries, int) or tries < 2:
         tries = 1
     else:
         tries = min(tries, MAX_PARTITION_WAIT_TIME_SECS)
 
-    # by the time this function is called, partitions should have been
-    # written to the disk. However, it doesn't mean the kernel/udev has
-    # updated the various symlinks in sysfs. We'll open the block device
-    # in write mode. This should send a kernel and udev change event for
-    # the device and any partitions as well. Ideally, this will help bubble
-    # up the events so sysfs is populated before the logic below kicks in
-    with open(device, 'w'):
-        pass
+    if uevents is None:
+        uevents = get_uevent_source()
 
     disk_partitions = {i: None for i in partitions}
-    device = device.removeprefix('/dev/')
-    for _try in range(tries):
-        if all((disk_partitions[i] is not None for i in disk_partitions)):
-            # all partitions were found on disk
-            return disk_partitions
-
-        try:
-            with os.scandir(f"/sys/block/{device}") as dir_contents:
-                for partdir in filter(lambda x: x.is_dir() and x.name.startswith(device), dir_contents):
-                    with open(os.path.join(partdir.path, 'partition')) as f:
-                        try:
-                            _part = int(f.read().strip())
-                            if _part in partitions:
-                                # looks like {1: '/dev/sda1', 2: '/dev/nvme0n1p2'}
-                                disk_partitions[_part] = f'/dev/{partdir.name}'
-                        except (OSError, ValueError):
-                            # OSError: [Errno 19] No such device was seen on
-                            # our internal CI/CD infrastructure for reasons
-                            # not understood...
-                            continue
-        except FileNotFoundError:
-            continue
-
-        await asyncio.sleep(1)
+    device_name = os.path.basename(device)
+    # subscribe before touching the device so that we don't miss any of the events it triggers
+    with uevents.subscribe() if uevents is not None else contextlib.nullcontext() as events:
+        # by the time this function is called, partitions should have been
+        # written to the disk. However, it doesn't mean the kernel/udev has
+        # updated the various symlinks in sysfs. We'll open the block device
+        # in write mode. This should send a kernel and udev change event for
+        # the device and any partitions as well. Ideally, this will help bubble
+        # up the events so sysfs is populated before the logic below kicks in
+        with open(device, 'w'):
+            pass
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + tries
+        rescan = True
+        while True:
+            if rescan:
+                _scan_sysfs_partitions(device_name, disk_partitions)
+
+            if all((disk_partitions[i] is not None for i in disk_partitions)):
+                # all partitions were found on disk
+                return disk_partitions
+
+            if (timeout := min(1, deadline - loop.time())) <= 0:
+                break
+
+            if events is None:
+                await asyncio.sleep(timeout)
+                continue
+
+            try:
+                event = await asyncio.wait_for(events.get(), timeout)
+            except asyncio.TimeoutError:
+                rescan = True
+                continue
+
+            _apply_partition_uevent(device_name, event, disk_partitions)
+            while not events.empty():
+                _apply_partition_uevent(device_name, events.get_nowait(), disk_partitions)
+            rescan = False
 
     empty_parts = {k: v for k, v in disk_partitions.items() if v is None}
     if empty_parts:
@@ -68,7 +91,7 @@ async def get_partitions(
         # been populated after partition creation. As a last resort, we'll just
         # haphazardly check to see if the disk partitions block device exists
         with os.scandir('/dev/') as dir_contents:
-            for dev in filter(lambda x: x.name.startswith(device), dir_contents):
+            for dev in filter(lambda x: x.name.startswith(device_name), dir_contents):
                 for partnum in empty_parts:
                     part_str = str(partnum)
                     if dev.name[-len(part_str):] == part_str:
@@ -77,10 +100,52 @@ async def get_partitions(
     return disk_partitions
 
 
-async def run(args, check=True):
+def _scan_sysfs_partitions(device_name: str, disk_partitions: dict):
+    try:
+        with os.scandir(os.path.join(SYS_BLOCK, device_name)) as dir_contents:
+            for partdir in filter(lambda x: x.is_dir() and x.name.startswith(device_name), dir_contents):
+                try:
+                    with open(os.path.join(partdir.path, 'partition')) as f:
+                        _part = int(f.read().strip())
+                except (OSError, ValueError):
+                    # OSError: [Errno 19] No such device was seen on
+                    # our internal CI/CD infrastructure for reasons
+                    # not understood...
+                    continue
+
+                if _part in disk_partitions:
+                    # looks like {1: '/dev/sda1', 2: '/dev/nvme0n1p2'}
+                    disk_partitions[_part] = f'/dev/{partdir.name}'
+    except FileNotFoundError:
+        pass
+
+
+def _apply_partition_uevent(device_name: str, event: Uevent, disk_partitions: dict):
+    if (
+        event.action in ("add", "change") and
+        event.subsystem == "block" and
+        event.devtype == "partition" and
+        event.parent == device_name and
+        event.devname and
+        event.partn in disk_partitions
+    ):
+        disk_partitions[event.partn] = f'/dev/{event.devname.removeprefix("/dev/")}'
+
+
+async def run(args, check=True, input=None):
     logger.debug(" ".join(args))
-    process = await asyncio.create_subprocess_exec(*args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = await process.communicate()
+    if isinstance(input, str):
+        input = input.encode("utf-8")
+
+    start = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=subprocess.PIPE if input is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate(input)
+    tracer.record_command(args, start, time.monotonic(), process.returncode, len(stdout), len(stderr))
 
     stdout = stdout.decode("utf-8", "ignore")
     stderr = stderr.decode("utf-8", "ignore")
@@ -90,3 +155,112 @@ async def run(args, check=True):
             raise subprocess.CalledProcessError(process.returncode, args, stdout, stderr)
 
     return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+
+class OutputTail:
+    """
+    Keeps only the last `size` bytes written to it.
+    """
+
+    def __init__(self, size: int = STREAM_TAIL_SIZE):
+        self.size = size
+        # Total number of bytes written
+        self.total = 0
+        self._buffer = bytearray()
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        self._buffer += data
+        if len(self._buffer) > self.size:
+            del self._buffer[:len(self._buffer) - self.size]
+
+    def getvalue(self):
+        return self._buffer.decode("utf-8", "ignore")
+
+
+async def run_streaming(args, check=True, on_stdout=None, on_stderr=None, tail_size=STREAM_TAIL_SIZE):
+    """
+    Like `run` but the output is consumed as it is produced: `on_stdout`/`on_stderr` are called with every
+    output line (decoded, without the line terminator) and only the last `tail_size` bytes of each stream are
+    kept in the returned `CompletedProcess` (or `CalledProcessError`).
+    """
+    logger.debug(" ".join(args))
+    start = time.monotonic()
+    process = await asyncio.create_subprocess_exec(*args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = OutputTail(tail_size), OutputTail(tail_size)
+    try:
+        await asyncio.gather(
+            _pump(process.stdout, stdout, on_stdout),
+            _pump(process.stderr, stderr, on_stderr),
+        )
+        await process.wait()
+    finally:
+        await _reap(process)
+        tracer.record_command(args, start, time.monotonic(), process.returncode, stdout.total, stderr.total)
+
+    return _completed(args, process.returncode, stdout.getvalue(), stderr.getvalue(), check)
+
+
+async def stream(args, check=True, on_stderr=None, tail_size=STREAM_TAIL_SIZE):
+    """
+    Async iterator over the stdout lines of a command. stderr is consumed in the background, see `run_streaming`.
+    `CalledProcessError` is raised at the end of the iteration if the command failed.
+    """
+    logger.debug(" ".join(args))
+    start = time.monotonic()
+    process = await asyncio.create_subprocess_exec(*args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout_size = 0
+    stderr = OutputTail(tail_size)
+    stderr_task = asyncio.create_task(_pump(process.stderr, stderr, on_stderr))
+    try:
+        async for line in _iter_lines(process.stdout):
+            stdout_size += len(line) + 1
+            yield line.decode("utf-8", "ignore")
+
+        await stderr_task
+        await process.wait()
+    finally:
+        stderr_task.cancel()
+        await _reap(process)
+        tracer.record_command(args, start, time.monotonic(), process.returncode, stdout_size, stderr.total)
+
+    _completed(args, process.returncode, None, stderr.getvalue(), check)
+
+
+async def _iter_lines(reader: asyncio.StreamReader):
+    # Unlike `StreamReader.readline`, does not fail on overly long lines: they are split at `STREAM_CHUNK_SIZE`
+    pending = bytearray()
+    while chunk := await reader.read(STREAM_CHUNK_SIZE):
+        pending += chunk
+        start = 0
+        while (end := pending.find(b"\n", start)) != -1:
+            yield bytes(pending[start:end]).rstrip(b"\r")
+            start = end + 1
+
+        del pending[:start]
+        if len(pending) > STREAM_CHUNK_SIZE:
+            yield bytes(pending)
+            pending.clear()
+
+    if pending:
+        yield bytes(pending)
+
+
+async def _pump(reader: asyncio.StreamReader, tail: OutputTail, on_line):
+    async for line in _iter_lines(reader):
+        tail.write(line + b"\n")
+        if on_line is not None:
+            on_line(line.decode("utf-8", "ignore"))
+
+
+async def _reap(process):
+    if process.returncode is None:
+        process.kill()
+        await process.wait()
+
+
+def _completed(args, returncode, stdout, stderr, check):
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, args, stdout, stderr)
+
+    return subprocess.CompletedProcess(args, returncode, stdout, stderr)
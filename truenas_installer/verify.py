@@ -0,0 +1,199 @@
+"""
+Chunked, multi-threaded integrity check of the installation image.
+
+The manifest shipped next to the image (`TrueNAS-SCALE.update.manifest.json`) lists the hash of every
+`chunk_size` chunk of the image and the Merkle root of these hashes. Chunks are hashed in parallel from a
+memory map (`hashlib` releases the GIL while hashing large buffers). To build a manifest:
+
+    python3 -m truenas_installer.verify build /path/to/TrueNAS-SCALE.update
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import json
+import mmap
+import os
+import threading
+from typing import Callable
+
+from . import image
+from .exception import InstallError
+from .i18n import _
+from .logger import logger
+
+__all__ = ["VERIFY_BEFORE", "VERIFY_OFF", "VERIFY_OVERLAP", "build_manifest", "merkle_root", "verify_image",
+           "verify_image_async"]
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = ".manifest.json"
+DEFAULT_ALGORITHM = "sha256"
+DEFAULT_CHUNK_SIZE = 4 * 1024 ** 2
+
+# When the image is verified during the installation
+VERIFY_BEFORE = "before"
+VERIFY_OVERLAP = "overlap"
+VERIFY_OFF = "off"
+
+
+def manifest_path(image_path: str):
+    return image_path + MANIFEST_SUFFIX
+
+
+def merkle_root(hashes: list[bytes], algorithm: str = DEFAULT_ALGORITHM):
+    level = list(hashes) or [hashlib.new(algorithm).digest()]
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.new(algorithm, level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+
+    return level[0]
+
+
+def hash_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, algorithm: str = DEFAULT_ALGORITHM,
+                workers: int | None = None, on_progress: Callable | None = None,
+                cancelled: threading.Event | None = None):
+    """
+    Returns the hash of every `chunk_size` chunk of `path`.
+
+    `on_progress`: called with `(done_chunks, total_chunks)` from the worker threads.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return []
+
+        # The mapping is not closed explicitly as memoryviews of it may still be alive, the garbage collector
+        # unmaps it
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    data.madvise(mmap.MADV_SEQUENTIAL)
+    view = memoryview(data)
+    offsets = range(0, size, chunk_size)
+    hashes = [None] * len(offsets)
+    lock = threading.Lock()
+    done = 0
+
+    def hash_chunk(index):
+        nonlocal done
+        if cancelled is not None and cancelled.is_set():
+            raise InstallError("Image verification cancelled")
+
+        hashes[index] = hashlib.new(algorithm, view[offsets[index]:offsets[index] + chunk_size]).digest()
+        with lock:
+            done += 1
+            if on_progress is not None:
+                on_progress(done, len(offsets))
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for future in as_completed([executor.submit(hash_chunk, index) for index in range(len(offsets))]):
+            future.result()
+
+    return hashes
+
+
+def build_manifest(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, algorithm: str = DEFAULT_ALGORITHM):
+    hashes = hash_chunks(path, chunk_size, algorithm)
+    return {
+        "version": MANIFEST_VERSION,
+        "algorithm": algorithm,
+        "chunk_size": chunk_size,
+        "size": os.path.getsize(path),
+        "root": merkle_root(hashes, algorithm).hex(),
+        "chunks": [h.hex() for h in hashes],
+    }
+
+
+def load_manifest(path: str):
+    with open(path) as f:
+        manifest = json.load(f)
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise InstallError(f"Unsupported image manifest version in {path}: {manifest.get('version')!r}")
+
+    chunks = [bytes.fromhex(h) for h in manifest["chunks"]]
+    if merkle_root(chunks, manifest["algorithm"]).hex() != manifest["root"]:
+        raise InstallError(f"Image manifest {path} is corrupted")
+
+    return manifest
+
+
+def verify_image(path: str, manifest: str | None = None, on_progress: Callable | None = None,
+                 cancelled: threading.Event | None = None):
+    """
+    Check `path` against its manifest. Returns `False` if there is no manifest, raises `InstallError` if the image
+    does not match it.
+    """
+    manifest = manifest or manifest_path(path)
+    try:
+        expected = load_manifest(manifest)
+    except FileNotFoundError:
+        logger.warning(f"Image manifest {manifest} not found, {path} will not be verified")
+        return False
+    except (OSError, ValueError, KeyError) as e:
+        raise InstallError(f"Invalid image manifest {manifest}: {e}")
+
+    if (size := os.path.getsize(path)) != expected["size"]:
+        raise InstallError(f"{path} is corrupted: size is {size} bytes instead of {expected['size']}")
+
+    hashes = hash_chunks(path, expected["chunk_size"], expected["algorithm"], on_progress=on_progress,
+                         cancelled=cancelled)
+    if bad := [i for i, h in enumerate(hashes) if h.hex() != expected["chunks"][i]]:
+        offsets = ", ".join(str(i * expected["chunk_size"]) for i in bad[:10])
+        raise InstallError(f"{path} is corrupted: {len(bad)} chunk(s) do not match the manifest (offsets {offsets})")
+
+    logger.info(f"{path} matches its manifest (root {expected['root']})")
+    return True
+
+
+async def verify_image_async(callback: Callable, path: str | None = None, manifest: str | None = None):
+    """
+    `verify_image` in a thread, reporting progress every 10% through the install `callback`.
+
+    `manifest`: defaults to the manifest next to `path`, must be given to verify a copy of the image.
+    """
+    path = path or image.IMAGE_PATH
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+    reported = -1
+
+    def report(percent):
+        nonlocal reported
+        # Only report every 10%
+        if percent // 10 > reported:
+            reported = percent // 10
+            callback(0, _("verifying_image", percent=percent))
+
+    def on_progress(done, total):
+        loop.call_soon_threadsafe(report, done * 100 // total)
+
+    report(0)
+    try:
+        return await loop.run_in_executor(None, verify_image, path, manifest, on_progress, cancelled)
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or check the manifest of an installation image")
+    parser.add_argument("command", choices=["build", "verify"])
+    parser.add_argument("image")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        with open(manifest_path(args.image), "w") as f:
+            json.dump(build_manifest(args.image, args.chunk_size), f)
+        print(manifest_path(args.image))
+    else:
+        try:
+            if not verify_image(args.image):
+                raise SystemExit(f"{manifest_path(args.image)} not found")
+        except InstallError as e:
+            raise SystemExit(e.message)
+        print("OK")
+
+
+if __name__ == "__main__":
+    main()
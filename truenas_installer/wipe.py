@@ -0,0 +1,189 @@
+import errno
+import fcntl
+import mmap
+import os
+import stat
+import struct
+
+from . import utils
+from .logger import logger
+
+__all__ = ["discard_disk", "discard_max_bytes", "fast_wipe", "metadata_ranges", "read_partitions"]
+
+# Everything this close to the start or the end of the disk and of each of its partitions is zeroed. This covers
+# the MBR, the primary and backup GPT, all four ZFS labels (two 256 KiB labels at each end), md superblocks
+# (0.90/1.0 at the end, 1.1/1.2 at the start) and LVM/filesystem superblocks.
+METADATA_REGION_SIZE = 1024 * 1024
+
+BLKRRPART = 0x125f
+BLKSSZGET = 0x1268
+BLKDISCARD = 0x1277
+BLKZEROOUT = 0x127f
+BLKGETSIZE64 = 0x80081272
+
+# Whole-disk discards are issued in ranges of this size so that progress can be reported
+DISCARD_CHUNK_SIZE = 1024 ** 3
+
+
+def read_partitions(name: str):
+    """
+    Returns `(offset, size)` in bytes of every partition of disk `name`, as currently known by the kernel.
+    """
+    partitions = []
+    path = os.path.join(utils.SYS_BLOCK, name)
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, "partition")):
+                with open(os.path.join(entry.path, "start")) as f:
+                    start = int(f.read())
+                with open(os.path.join(entry.path, "size")) as f:
+                    size = int(f.read())
+                partitions.append((start * 512, size * 512))
+
+    return sorted(partitions)
+
+
+def metadata_ranges(disk_size: int, partitions: list[tuple[int, int]], block_size: int = 512):
+    """
+    Returns sorted, non-overlapping, `block_size`-aligned `(offset, length)` ranges to zero.
+    """
+    ranges = []
+    for start, size in [(0, disk_size)] + partitions:
+        end = start + size
+        ranges.append((start, min(end, start + METADATA_REGION_SIZE)))
+        ranges.append((max(start, end - METADATA_REGION_SIZE), end))
+
+    merged = []
+    for start, end in sorted(ranges):
+        start = max(0, start - start % block_size)
+        end = min(disk_size, end + (-end) % block_size)
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        elif start < end:
+            merged.append([start, end])
+
+    return [(start, end - start) for start, end in merged]
+
+
+def fast_wipe(device: str, partitions: list[tuple[int, int]] | None = None, verify: bool = True):
+    """
+    Zero every known metadata region of `device` (see `METADATA_REGION_SIZE`) in a single pass: the regions
+    are discarded first if the device supports it, then overwritten with aligned `O_DIRECT` writes and read back.
+    Finally, the kernel is asked to re-read the (now empty) partition table.
+
+    `partitions`: `(offset, size)` of the partitions on `device`, read from sysfs by default.
+
+    Raises `OSError` on failure, in which case the caller should fall back to the `wipefs`-based wipe.
+    """
+    name = os.path.basename(device)
+    if partitions is None:
+        partitions = read_partitions(name)
+
+    try:
+        fd = os.open(device, os.O_RDWR | os.O_DIRECT)
+    except OSError as e:
+        if e.errno != errno.EINVAL:
+            raise
+
+        # File system (i.e. tmpfs) does not support direct I/O
+        fd = os.open(device, os.O_RDWR)
+
+    try:
+        is_block_device = stat.S_ISBLK(os.fstat(fd).st_mode)
+        if is_block_device:
+            disk_size = struct.unpack("Q", fcntl.ioctl(fd, BLKGETSIZE64, b"\0" * 8))[0]
+            block_size = struct.unpack("i", fcntl.ioctl(fd, BLKSSZGET, b"\0" * 4))[0]
+        else:
+            disk_size = os.fstat(fd).st_size
+            block_size = 512
+
+        ranges = metadata_ranges(disk_size, partitions, block_size)
+
+        if is_block_device and discard_max_bytes(name) > 0:
+            for offset, length in ranges:
+                try:
+                    fcntl.ioctl(fd, BLKDISCARD, struct.pack("QQ", offset, length))
+                except OSError as e:
+                    logger.debug(f"BLKDISCARD {offset}+{length} failed on {device}: {e}")
+                    break
+
+        # Anonymous mappings are page-aligned and zero-filled, as `O_DIRECT` requires. They are not closed
+        # explicitly as memoryviews of them may still be alive, the garbage collector unmaps them.
+        zeroes = mmap.mmap(-1, METADATA_REGION_SIZE)
+        for offset, length in ranges:
+            for chunk_offset, chunk_length in _chunks(offset, length):
+                if os.pwrite(fd, memoryview(zeroes)[:chunk_length], chunk_offset) != chunk_length:
+                    raise OSError(errno.EIO, f"Short write at {chunk_offset} on {device}")
+
+        os.fsync(fd)
+
+        if verify:
+            buffer = mmap.mmap(-1, METADATA_REGION_SIZE)
+            for offset, length in ranges:
+                for chunk_offset, chunk_length in _chunks(offset, length):
+                    view = memoryview(buffer)[:chunk_length]
+                    if os.preadv(fd, [view], chunk_offset) != chunk_length or view != zeroes[:chunk_length]:
+                        raise OSError(errno.EIO, f"Verification of the wiped region at {chunk_offset} "
+                                                 f"failed on {device}")
+
+        if is_block_device:
+            try:
+                fcntl.ioctl(fd, BLKRRPART)
+            except OSError as e:
+                logger.debug(f"BLKRRPART failed on {device}: {e}")
+    finally:
+        os.close(fd)
+
+    logger.debug(f"Fast-wiped {sum(length for offset, length in ranges)} bytes in {len(ranges)} range(s) on {device}")
+    return ranges
+
+
+def _chunks(offset, length):
+    while length > 0:
+        chunk_length = min(length, METADATA_REGION_SIZE)
+        yield offset, chunk_length
+        offset += chunk_length
+        length -= chunk_length
+
+
+def discard_max_bytes(name: str):
+    """
+    Returns 0 if disk `name` does not support discard.
+    """
+    try:
+        with open(os.path.join(utils.SYS_BLOCK, name, "queue", "discard_max_bytes")) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return 0
+
+
+def discard_disk(device: str, on_progress=None, chunk_size: int = DISCARD_CHUNK_SIZE):
+    """
+    Discard every block of `device` with BLKDISCARD, falling back to BLKZEROOUT if the device rejects it.
+
+    `on_progress`: called with `(done_bytes, total_bytes)` after every `chunk_size` range.
+    """
+    fd = os.open(device, os.O_RDWR)
+    try:
+        disk_size = struct.unpack("Q", fcntl.ioctl(fd, BLKGETSIZE64, b"\0" * 8))[0]
+        block_size = struct.unpack("i", fcntl.ioctl(fd, BLKSSZGET, b"\0" * 4))[0]
+        chunk_size -= chunk_size % block_size
+        request = BLKDISCARD
+        offset = 0
+        while offset < disk_size:
+            length = min(chunk_size, disk_size - offset)
+            try:
+                fcntl.ioctl(fd, request, struct.pack("QQ", offset, length))
+            except OSError as e:
+                if request != BLKDISCARD or e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                    raise
+
+                logger.debug(f"BLKDISCARD is not supported by {device}, using BLKZEROOUT: {e}")
+                request = BLKZEROOUT
+                continue
+
+            offset += length
+            if on_progress is not None:
+                on_progress(offset, disk_size)
+    finally:
+        os.close(fd)